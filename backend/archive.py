@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config import settings
+from database import client, db, use_transactions
+
+logger = logging.getLogger(__name__)
+
+JOB_ID = "order_archive"
+COLD = "orders_archive"
+
+# Hot/cold split of order history. Orders older than ORDER_ARCHIVE_AFTER_DAYS move,
+# unchanged, to orders_archive (zstd block compression, same indexes), so the working
+# set of `orders` stays small. Reads go through find_recent_orders / aggregate_orders,
+# which only touch the archive when the query reaches back past cold_boundary().
+
+# Headroom for clock differences between the worker that archives and the one reading
+CLOCK_SKEW = timedelta(hours=1)
+
+def cold_boundary() -> datetime:
+    # Nothing created after this instant is ever archived, whichever worker ran the job
+    return datetime.now(timezone.utc) - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS) + CLOCK_SKEW
+
+def needs_cold(since: Optional[datetime]) -> bool:
+    return since is None or since < cold_boundary()
+
+_cold_has_orders = False
+
+async def cold_has_orders() -> bool:
+    # With archival off (the default) the archive stays empty and reads skip it. Once
+    # orders have been archived it never empties again, so only "empty" is re-checked,
+    # from collection metadata rather than a scan.
+    global _cold_has_orders
+    if not _cold_has_orders:
+        _cold_has_orders = await db[COLD].estimated_document_count() > 0
+    return _cold_has_orders
+
+def _recency(order: dict):
+    # Mongo's descending order puts dates before (legacy) ISO strings
+    created_at = order.get("created_at")
+    return (isinstance(created_at, datetime), created_at, order["_id"])
+
+async def find_recent_orders(query: dict, limit: int) -> List[dict]:
+    # Newest first by (created_at, _id). A full page of hot orders all newer than the
+    # boundary can't have archived orders in between, so the archive isn't read.
+    sort = [("created_at", -1), ("_id", -1)]
+    orders = await db.orders.find(query).sort(sort).limit(limit).to_list(length=limit)
+    last = orders[-1].get("created_at") if orders else None
+    if len(orders) == limit and isinstance(last, datetime) and last >= cold_boundary():
+        return orders
+
+    if not await cold_has_orders():
+        return orders
+    cold = await db[COLD].find(query).sort(sort).limit(limit).to_list(length=limit)
+    if not cold:
+        return orders
+    # Keyed by _id: an order caught mid-move may briefly be in both
+    merged = {order["_id"]: order for order in cold}
+    merged.update((order["_id"], order) for order in orders)
+    return sorted(merged.values(), key=_recency, reverse=True)[:limit]
+
+def with_cold(pipeline: list, since: Optional[datetime] = None) -> list:
+    # Pipelines must open with their $match; the archive gets the same filter (and
+    # indexes) through $unionWith before the remaining stages see either collection
+    if not needs_cold(since):
+        return pipeline
+    match = pipeline[0]
+    return [match, {"$unionWith": {"coll": COLD, "pipeline": [match]}}, *pipeline[1:]]
+
+async def aggregate_orders(pipeline: list, since: Optional[datetime] = None) -> List[dict]:
+    if not await cold_has_orders():
+        return await db.orders.aggregate(pipeline).to_list(length=None)
+    return await db.orders.aggregate(with_cold(pipeline, since)).to_list(length=None)
+
+async def estimated_count() -> int:
+    return await db.orders.estimated_document_count() + await db[COLD].estimated_document_count()
+
+async def ensure_indexes():
+    if COLD not in await db.list_collection_names():
+        try:
+            await db.create_collection(COLD, storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}})
+        except Exception as e:
+            # Already created by another worker, or zstd unavailable: default compression
+            logger.info("orders_archive created without zstd: %s", e)
+    await db[COLD].create_index("created_at")
+    await db[COLD].create_index([("buyer_id", 1), ("created_at", -1), ("_id", -1)])
+    await db[COLD].create_index([("items.storefront_id", 1), ("created_at", -1), ("_id", -1)])
+
+async def _acquire_lock() -> dict:
+    now = datetime.now(timezone.utc)
+    try:
+        return await db.job_state.find_one_and_update(
+            {"_id": JOB_ID, "$or": [{"locked_until": {"$exists": False}}, {"locked_until": {"$lte": now}}]},
+            {"$set": {"locked_until": now + timedelta(seconds=settings.ORDER_ARCHIVE_LOCK_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return None
+
+async def _release_lock():
+    await db.job_state.update_one({"_id": JOB_ID}, {"$unset": {"locked_until": ""}})
+
+async def _move(orders, session=None):
+    # Replace-upserts make a batch safe to repeat after a crash between the two writes
+    await db[COLD].bulk_write(
+        [ReplaceOne({"_id": order["_id"]}, order, upsert=True) for order in orders],
+        ordered=False,
+        session=session
+    )
+    await db.orders.delete_many({"_id": {"$in": [order["_id"] for order in orders]}}, session=session)
+
+async def move_batch(orders):
+    # With transactions an order is never visible in both collections
+    if await use_transactions():
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                return await _move(orders, session=session)
+    return await _move(orders)
+
+async def archive_orders(older_than_days: Optional[int] = None) -> int:
+    state = await _acquire_lock()
+    if state is None:
+        logger.info("Order archival already running elsewhere")
+        return 0
+
+    try:
+        days = settings.ORDER_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+        # Never past the readers' boundary, whatever the caller asked for
+        days = max(days, settings.ORDER_ARCHIVE_AFTER_DAYS)
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+        moved = 0
+        while True:
+            # Legacy orders with ISO-string dates don't match a date bound and stay hot
+            orders = await db.orders.find({"created_at": {"$lt": cutoff}}).sort("created_at", 1).limit(
+                settings.ORDER_ARCHIVE_BATCH_SIZE
+            ).to_list(length=None)
+            if not orders:
+                break
+            await move_batch(orders)
+            moved += len(orders)
+
+        await db.job_state.update_one(
+            {"_id": JOB_ID},
+            {"$set": {"archived_before": cutoff, "last_run_at": datetime.now(timezone.utc)}, "$inc": {"moved": moved}}
+        )
+        return moved
+    finally:
+        await _release_lock()
+
+async def run(interval_seconds: float):
+    while True:
+        try:
+            moved = await archive_orders()
+            if moved:
+                logger.info("Archived %d orders", moved)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Order archival failed: %s", e)
+        await asyncio.sleep(interval_seconds)
+
+if __name__ == "__main__":
+    # Usage: python archive.py [--older-than-days N]
+    parser = argparse.ArgumentParser(description="Move old orders into the compressed orders_archive collection")
+    parser.add_argument("--older-than-days", type=int, help="Defaults to ORDER_ARCHIVE_AFTER_DAYS (and can't be lower)")
+    args = parser.parse_args()
+
+    async def main():
+        await ensure_indexes()
+        return await archive_orders(args.older_than_days)
+
+    print(f"Archived {asyncio.run(main())} orders")
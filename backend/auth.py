@@ -3,9 +3,10 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from config import settings
-from database import db
+from cache import cached_db
 from models import TokenData, UserResponse
 
 # Password Hashing
@@ -17,6 +18,14 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# bcrypt is deliberately slow (~0.1-0.3s); request handlers use these so the hashing
+# runs in the threadpool instead of stalling every other request on the event loop
+async def verify_password_async(plain_password, hashed_password):
+    return await run_in_threadpool(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await run_in_threadpool(get_password_hash, password)
+
 # JWT
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
@@ -45,7 +54,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credentials_exception
     
-    user = await db.users.find_one({"email": token_data.email})
+    user = await cached_db.users.find_one_by("email", token_data.email)
     if user is None:
         raise credentials_exception
         
@@ -0,0 +1,72 @@
+import argparse
+import json
+import random
+import time
+from bson import ObjectId
+from compression import build_codecs
+
+# Bytes saved vs CPU spent for each available encoding, on JSON shaped like the
+# /products/marketplace and /orders/mine responses.
+# Usage: python bench_compression.py [--items 2000] [--repeat 20]
+
+def sample_products(count: int, rng: random.Random):
+    words = ["bracelet", "handmade", "beaded", "clay", "mug", "painted", "rock", "card", "knitted", "scarf", "bookmark", "slime"]
+    return [
+        {
+            "_id": str(ObjectId()),
+            "name": " ".join(rng.choice(words) for _ in range(3)).title(),
+            "description": " ".join(rng.choice(words) for _ in range(25)),
+            "price": round(rng.uniform(1, 40), 2),
+            "quantity": rng.randint(0, 20),
+            "images": [f"/static/uploads/{ObjectId()}.jpg"],
+            "image_names": ["photo.jpg"],
+            "size": rng.choice([None, "small", "medium", "large"]),
+            "materials": rng.choice([None, "beads, string", "clay", "yarn"]),
+            "time_required": rng.choice([None, "1 hour", "2 days"]),
+            "storefront_id": str(ObjectId()),
+            "status": "active",
+            "storefront_name": rng.choice(["Maya's Makes", "Leo Crafts", "Bright Beads"]),
+        }
+        for _ in range(count)
+    ]
+
+def sample_orders(count: int, rng: random.Random):
+    return [
+        {
+            "_id": str(ObjectId()),
+            "buyer_id": str(ObjectId()),
+            "items": [
+                {"product_id": str(ObjectId()), "quantity": rng.randint(1, 3), "price": round(rng.uniform(1, 40), 2),
+                 "product_name": "Handmade Bracelet", "storefront_id": str(ObjectId())}
+                for _ in range(rng.randint(1, 4))
+            ],
+            "total": round(rng.uniform(1, 120), 2),
+            "status": "completed",
+            "created_at": "2026-01-01T12:00:00.000Z",
+        }
+        for _ in range(count)
+    ]
+
+def bench(label: str, body: bytes, codecs: dict, repeat: int):
+    print(f"\n{label}: {len(body) / 1024:.1f} KiB uncompressed")
+    print(f"  {'encoding':<8} {'bytes':>10} {'ratio':>7} {'saved':>8} {'ms/op':>8} {'MB/s':>8}")
+    for name, codec in codecs.items():
+        codec(body)  # warm-up
+        started = time.perf_counter()
+        for _ in range(repeat):
+            compressed = codec(body)
+        elapsed = (time.perf_counter() - started) / repeat
+        saved = 1 - len(compressed) / len(body)
+        print(f"  {name:<8} {len(compressed):>10} {len(body) / len(compressed):>6.1f}x {saved:>7.1%} {elapsed * 1000:>8.2f} {len(body) / elapsed / 1e6:>8.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compression ratio and CPU cost per encoding")
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    codecs = build_codecs()
+    bench(f"marketplace ({args.items} products)", json.dumps(sample_products(args.items, rng)).encode(), codecs, args.repeat)
+    bench(f"order history ({args.items} orders)", json.dumps(sample_orders(args.items, rng)).encode(), codecs, args.repeat)
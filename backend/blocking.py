@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import List, Optional
+from config import settings
+
+# Debug/profiling aid: reports every event loop callback that runs longer than a
+# threshold, with the stack it was stuck in and the request route it belonged to.
+#
+# Every asyncio Handle is timed (a patched Handle._run). A watchdog thread samples the
+# loop thread's stack while a callback is over the threshold, because by the time the
+# callback returns the blocking frames are gone. Only the pure-Python asyncio loop can
+# be instrumented: run uvicorn with --loop asyncio (uvloop's handles are compiled).
+#
+# In the app: BLOCKING_DETECTOR_ENABLED=true. In tests:
+#     with detect_blocking(threshold_ms=20) as detector:
+#         client.get("/api/v1/...")
+#     detector.assert_no_blocking()
+
+logger = logging.getLogger(__name__)
+
+# The ASGI scope of the request a callback runs for; read from the handle's context
+current_scope: ContextVar[Optional[dict]] = ContextVar("blocking_current_scope", default=None)
+
+@dataclass
+class BlockingReport:
+    duration: float
+    callback: str
+    route: Optional[str]
+    stack: List[str] = field(default_factory=list)
+
+    def format(self) -> str:
+        where = f" on {self.route}" if self.route else ""
+        stack = "".join(self.stack) if self.stack else "  (finished before the stack could be sampled)\n"
+        return f"Event loop blocked for {self.duration * 1000:.1f} ms{where} by {self.callback}\n{stack}"
+
+def route_of(scope: Optional[dict]) -> Optional[str]:
+    if scope is None:
+        return None
+    # The router stores the matched route on the (shared) scope once it's resolved
+    route = scope.get("route")
+    return f"{scope.get('method', '')} {getattr(route, 'path', scope.get('path'))}".strip()
+
+def _scope_of(handle) -> Optional[dict]:
+    context = handle._context
+    return context.get(current_scope) if context is not None else None
+
+class _Running:
+    __slots__ = ("handle", "started", "thread_id", "stack", "route")
+
+    def __init__(self, handle, started: float, thread_id: int):
+        self.handle = handle
+        self.started = started
+        self.thread_id = thread_id
+        self.stack = None
+        self.route = None
+
+class BlockingDetector:
+    def __init__(self, threshold_ms: float, max_reports: int = 1000):
+        self.threshold = threshold_ms / 1000
+        self.max_reports = max_reports
+        self.reports: List[BlockingReport] = []
+        self._running = {} # loop thread id -> _Running
+        self._original_run = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def install(self):
+        if self._original_run is not None:
+            return
+        detector = self
+        original_run = self._original_run = asyncio.events.Handle._run
+
+        def timed_run(handle):
+            thread_id = threading.get_ident()
+            outer = detector._running.get(thread_id)
+            running = detector._running[thread_id] = _Running(handle, time.perf_counter(), thread_id)
+            try:
+                return original_run(handle)
+            finally:
+                duration = time.perf_counter() - running.started
+                if outer is None:
+                    detector._running.pop(thread_id, None)
+                else:
+                    detector._running[thread_id] = outer
+                if duration >= detector.threshold:
+                    detector._report(running, duration)
+
+        asyncio.events.Handle._run = timed_run
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="blocking-detector", daemon=True)
+        self._watchdog.start()
+
+        try:
+            loop = asyncio.get_running_loop()
+            if not isinstance(loop, asyncio.BaseEventLoop):
+                logger.warning("Blocking detector can't instrument %s; run with --loop asyncio", type(loop).__name__)
+        except RuntimeError:
+            pass
+
+    def uninstall(self):
+        if self._original_run is None:
+            return
+        asyncio.events.Handle._run = self._original_run
+        self._original_run = None
+        self._stop.set()
+        self._watchdog.join()
+        self._watchdog = None
+
+    def _watch(self):
+        # Sample often enough to catch a callback shortly after it crosses the threshold
+        interval = max(self.threshold / 4, 0.001)
+        while not self._stop.wait(interval):
+            now = time.perf_counter()
+            for running in list(self._running.values()):
+                if running.stack is None and now - running.started >= self.threshold:
+                    frame = sys._current_frames().get(running.thread_id)
+                    if frame is not None:
+                        running.stack = traceback.format_stack(frame)
+                        # Read now: the request may be finished by the time the callback returns
+                        running.route = route_of(_scope_of(running.handle))
+
+    def _report(self, running: _Running, duration: float):
+        route = running.route or route_of(_scope_of(running.handle))
+        report = BlockingReport(duration, repr(running.handle._callback), route, running.stack or [])
+        if len(self.reports) < self.max_reports:
+            self.reports.append(report)
+        logger.warning(report.format(), extra={"blocked_ms": round(duration * 1000, 1), "route": report.route})
+
+    def assert_no_blocking(self):
+        if self.reports:
+            raise AssertionError(
+                f"{len(self.reports)} blocking callback(s) over {self.threshold * 1000:.0f} ms:\n\n"
+                + "\n".join(report.format() for report in self.reports)
+            )
+
+class BlockingRouteMiddleware:
+    # Tags each request's context with its scope so reports can name the route
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
+
+@contextmanager
+def detect_blocking(threshold_ms: Optional[float] = None):
+    detector = BlockingDetector(settings.BLOCKING_THRESHOLD_MS if threshold_ms is None else threshold_ms)
+    detector.install()
+    try:
+        yield detector
+    finally:
+        detector.uninstall()
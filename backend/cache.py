@@ -0,0 +1,177 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+import changefeed
+from changefeed import Change
+from config import settings
+from database import db
+from singleflight import SingleFlight
+
+class ReadThroughCache:
+    # Caches single documents of one collection by any lookup field. Entries are
+    # evicted by document _id, which is all a change-stream delete event carries,
+    # so every lookup key is also indexed under the _id it resolved to.
+    def __init__(self, collection: str):
+        self.collection = collection
+        self._entries = OrderedDict() # (field, value) -> (expires_at, doc)
+        self._keys_by_id = {} # doc _id -> set of (field, value)
+        self._version = 0
+        self._flight = SingleFlight()
+        changefeed.subscribe(collection, self._on_change)
+
+    def _ttl(self) -> float:
+        # Without a change stream, other workers' writes are only bounded by the TTL
+        if changefeed.is_active():
+            return settings.CACHE_TTL_SECONDS
+        return settings.CACHE_FALLBACK_TTL_SECONDS
+
+    async def find_one_by(self, field: str, value) -> Optional[dict]:
+        key = (field, str(value))
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            return dict(entry[1])
+
+        if field == "_id":
+            try:
+                value = ObjectId(value)
+            except (InvalidId, TypeError):
+                return None
+
+        version = self._version
+        # Concurrent misses for one key share a single query. The version is part of the
+        # key so nobody joins a read that started before an eviction.
+        doc = await self._flight.do((key, version), lambda: db[self.collection].find_one({field: value}))
+        # An eviction that raced with this read means the result may already be stale
+        if doc is not None and version == self._version:
+            self._store(key, doc)
+        return dict(doc) if doc is not None else None
+
+    async def find_by_id(self, doc_id) -> Optional[dict]:
+        return await self.find_one_by("_id", doc_id)
+
+    def _store(self, key, doc: dict):
+        doc_id = str(doc["_id"])
+        self._entries[key] = (time.monotonic() + self._ttl(), doc)
+        self._entries.move_to_end(key)
+        self._keys_by_id.setdefault(doc_id, set()).add(key)
+
+        while len(self._entries) > settings.CACHE_MAX_ENTRIES:
+            old_key, (_, old_doc) = self._entries.popitem(last=False)
+            keys = self._keys_by_id.get(str(old_doc["_id"]))
+            if keys:
+                keys.discard(old_key)
+                if not keys:
+                    del self._keys_by_id[str(old_doc["_id"])]
+
+    def evict(self, doc_id):
+        self._version += 1
+        for key in self._keys_by_id.pop(str(doc_id), ()):
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._version += 1
+        self._entries.clear()
+        self._keys_by_id.clear()
+
+    def _on_change(self, change: Change):
+        if change.operation == "invalidate":
+            self.clear()
+        elif change.operation != "insert":
+            # A new document can't make a cached positive lookup stale
+            self.evict(change.document_id)
+
+class StorefrontPageCache:
+    # Caches rendered storefront pages (the storefront plus one page of its active
+    # products). A write to a storefront or to any of its products drops all of that
+    # storefront's pages; products are mapped back to their storefront so deletes,
+    # which carry no document over the change stream, can be attributed too.
+    def __init__(self):
+        self._entries = OrderedDict() # (storefront_id, cursor, limit) -> (expires_at, page)
+        self._keys_by_storefront = {} # storefront_id -> set of keys
+        self._products_by_storefront = {} # storefront_id -> product ids on its cached pages
+        self._storefront_by_product = {}
+        self._version = 0
+        changefeed.subscribe("storefronts", self._on_storefront_change)
+        changefeed.subscribe("products", self._on_product_change)
+
+    def version(self) -> int:
+        return self._version
+
+    def get(self, storefront_id: str, cursor: Optional[str], limit: int):
+        key = (storefront_id, cursor, limit)
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            return entry[1]
+        return None
+
+    def store(self, storefront_id: str, cursor: Optional[str], limit: int, page, product_ids, version: int):
+        # A write that raced with the read means the page may already be stale
+        if version != self._version:
+            return
+        key = (storefront_id, cursor, limit)
+        ttl = settings.CACHE_TTL_SECONDS if changefeed.is_active() else settings.CACHE_FALLBACK_TTL_SECONDS
+        self._entries[key] = (time.monotonic() + ttl, page)
+        self._entries.move_to_end(key)
+        self._keys_by_storefront.setdefault(storefront_id, set()).add(key)
+        products = self._products_by_storefront.setdefault(storefront_id, set())
+        for product_id in product_ids:
+            products.add(product_id)
+            self._storefront_by_product[product_id] = storefront_id
+
+        while len(self._entries) > settings.STOREFRONT_PAGE_CACHE_MAX_ENTRIES:
+            old_key, _ = self._entries.popitem(last=False)
+            keys = self._keys_by_storefront.get(old_key[0])
+            if keys:
+                keys.discard(old_key)
+                if not keys:
+                    self._forget(old_key[0])
+
+    def _forget(self, storefront_id: str):
+        for key in self._keys_by_storefront.pop(storefront_id, ()):
+            self._entries.pop(key, None)
+        for product_id in self._products_by_storefront.pop(storefront_id, ()):
+            self._storefront_by_product.pop(product_id, None)
+
+    def evict(self, storefront_id):
+        self._version += 1
+        self._forget(str(storefront_id))
+
+    def clear(self):
+        self._version += 1
+        self._entries.clear()
+        self._keys_by_storefront.clear()
+        self._products_by_storefront.clear()
+        self._storefront_by_product.clear()
+
+    def _on_storefront_change(self, change: Change):
+        if change.operation == "invalidate":
+            self.clear()
+        elif change.operation != "insert":
+            self.evict(change.document_id)
+
+    def _on_product_change(self, change: Change):
+        if change.operation == "invalidate":
+            self.clear()
+            return
+        cached_under = self._storefront_by_product.get(change.document_id)
+        if cached_under is not None:
+            self.evict(cached_under)
+        if change.document is not None and change.document.get("storefront_id"):
+            self.evict(change.document["storefront_id"])
+        elif cached_under is None and change.operation != "delete":
+            # A product we can't place may now belong on any cached page. (A delete
+            # can't affect pages that don't list the product.)
+            self.clear()
+
+class CachedDatabase:
+    def __init__(self):
+        self.users = ReadThroughCache("users")
+        self.storefronts = ReadThroughCache("storefronts")
+        self.products = ReadThroughCache("products")
+
+cached_db = CachedDatabase()
+storefront_pages = StorefrontPageCache()
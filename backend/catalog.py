@@ -0,0 +1,216 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+import numpy as np
+from bson import ObjectId
+from bson.errors import InvalidId
+import changefeed
+from changefeed import Change
+from database import db
+from models import ProductStatus
+
+logger = logging.getLogger(__name__)
+
+# Marketplace filtering/sorting over compact NumPy columns, one row per product. A query
+# is a handful of vectorized masks plus a sort over the matching rows; Mongo is only
+# asked for the documents on the final page. Imported by the lifespan (NumPy is kept
+# out of app creation) and only when CATALOG_ENABLED.
+
+FREE = 0 # status code of an unused row
+STATUS_CODES = {status.value: code for code, status in enumerate(ProductStatus, start=1)}
+ACTIVE = STATUS_CODES[ProductStatus.ACTIVE.value]
+
+# Fields whose change can move a product in or out of a listing, or reorder it
+CATALOG_FIELDS = {"price", "quantity", "status", "storefront_id"}
+PROJECTION = {field: 1 for field in CATALOG_FIELDS}
+
+def created_key(product_id: str) -> int:
+    # ObjectId timestamp then counter: newest-first order without keeping the whole id
+    binary = ObjectId(product_id).binary
+    return int.from_bytes(binary[:4], "big") << 24 | int.from_bytes(binary[9:], "big")
+
+class ColumnarCatalog:
+    # Rows are recycled through a free list, so removals never shift the arrays
+    def __init__(self, capacity: int = 1024):
+        self.ids: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.storefronts: Dict[str, int] = {} # storefront id -> code in the storefront column
+        self._free: List[int] = []
+        self.price = np.zeros(capacity, dtype=np.float64)
+        self.quantity = np.zeros(capacity, dtype=np.int64)
+        self.storefront = np.full(capacity, -1, dtype=np.int32)
+        self.status = np.zeros(capacity, dtype=np.int8)
+        self.created = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, docs) -> "ColumnarCatalog":
+        count = len(docs)
+        catalog = cls(capacity=max(1024, count))
+        catalog.ids = [str(doc["_id"]) for doc in docs]
+        catalog.rows = {product_id: row for row, product_id in enumerate(catalog.ids)}
+        catalog.price[:count] = [doc.get("price") or 0.0 for doc in docs]
+        catalog.quantity[:count] = [doc.get("quantity") or 0 for doc in docs]
+        catalog.storefront[:count] = [catalog._storefront_code(doc.get("storefront_id")) for doc in docs]
+        catalog.status[:count] = [STATUS_CODES.get(doc.get("status"), FREE) for doc in docs]
+        catalog.created[:count] = [created_key(product_id) for product_id in catalog.ids]
+        return catalog
+
+    def _storefront_code(self, storefront_id) -> int:
+        if storefront_id is None:
+            return -1
+        return self.storefronts.setdefault(str(storefront_id), len(self.storefronts))
+
+    def _grow(self):
+        capacity = len(self.price) * 2
+        for name in ("price", "quantity", "storefront", "status", "created"):
+            column = getattr(self, name)
+            grown = np.full(capacity, -1 if name == "storefront" else 0, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def upsert(self, product_id: str, doc: dict):
+        row = self.rows.get(product_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+                self.ids[row] = product_id
+            else:
+                row = len(self.ids)
+                if row == len(self.price):
+                    self._grow()
+                self.ids.append(product_id)
+            self.rows[product_id] = row
+            self.created[row] = created_key(product_id)
+        self.price[row] = doc.get("price") or 0.0
+        self.quantity[row] = doc.get("quantity") or 0
+        self.storefront[row] = self._storefront_code(doc.get("storefront_id"))
+        self.status[row] = STATUS_CODES.get(doc.get("status"), FREE)
+
+    def remove(self, product_id: str):
+        row = self.rows.pop(product_id, None)
+        if row is None:
+            return
+        self.ids[row] = None
+        self.status[row] = FREE
+        self._free.append(row)
+
+    def query(
+        self,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        storefront_id: Optional[str] = None,
+        sort: str = "newest",
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[str]:
+        used = len(self.ids)
+        mask = (self.status[:used] == ACTIVE) & (self.quantity[:used] > 0)
+        if min_price is not None:
+            mask &= self.price[:used] >= min_price
+        if max_price is not None:
+            mask &= self.price[:used] <= max_price
+        if storefront_id is not None:
+            code = self.storefronts.get(storefront_id)
+            if code is None:
+                return []
+            mask &= self.storefront[:used] == code
+
+        rows = np.flatnonzero(mask)
+        newest = -self.created[rows]
+        if sort == "price_asc":
+            order = np.lexsort((newest, self.price[rows]))
+        elif sort == "price_desc":
+            order = np.lexsort((newest, -self.price[rows]))
+        else:
+            end = skip + limit
+            if end < len(rows):
+                # Only the first `end` rows are needed: partition, then sort just those
+                top = np.argpartition(newest, end - 1)[:end]
+                order = top[np.argsort(newest[top], kind="stable")]
+            else:
+                order = np.argsort(newest, kind="stable")
+        return [self.ids[row] for row in rows[order[skip:skip + limit]]]
+
+class ProductCatalog:
+    def __init__(self):
+        self.columns = ColumnarCatalog()
+        self.ready = False
+        self._rebuild_task = None
+        self._fetches = set() # in-flight refresh tasks, referenced so they aren't collected
+        self._changed_during_rebuild = None # product ids, while a rebuild is scanning
+        changefeed.subscribe("products", self._on_change)
+
+    def query(self, **filters) -> List[str]:
+        return self.columns.query(**filters)
+
+    async def rebuild(self):
+        self._changed_during_rebuild = set()
+        try:
+            docs = await db.products.find({}, PROJECTION).to_list(length=None)
+            # Building is CPU-bound on a large catalog; keep it off the event loop
+            columns = await asyncio.to_thread(ColumnarCatalog.build, docs)
+            # The scan may have missed writes made while it ran; re-read those (and any
+            # made during the re-read) until nothing is left to catch up on
+            while self._changed_during_rebuild:
+                changed, self._changed_during_rebuild = self._changed_during_rebuild, set()
+                found = {
+                    str(doc["_id"]): doc
+                    async for doc in db.products.find({"_id": {"$in": [ObjectId(i) for i in changed]}}, PROJECTION)
+                }
+                for product_id in changed:
+                    if product_id in found:
+                        columns.upsert(product_id, found[product_id])
+                    else:
+                        columns.remove(product_id)
+            # Swap in the finished columns; queries never see a half-built catalog
+            self.columns = columns
+            self.ready = True
+        finally:
+            self._changed_during_rebuild = None
+        logger.info("Product catalog rebuilt with %d products", len(columns))
+
+    async def run(self, rebuild_seconds: float):
+        # Change events keep the columns current; the periodic rebuild repairs any drift
+        while True:
+            try:
+                await self.rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Product catalog rebuild failed: %s", e)
+            await asyncio.sleep(rebuild_seconds)
+
+    def _on_change(self, change: Change):
+        if change.operation == "invalidate":
+            if not self._rebuild_task or self._rebuild_task.done():
+                self._rebuild_task = asyncio.create_task(self.rebuild())
+            return
+        if self._changed_during_rebuild is not None:
+            self._changed_during_rebuild.add(change.document_id)
+
+        if change.operation == "delete":
+            self.columns.remove(change.document_id)
+        elif change.document is not None:
+            self.columns.upsert(change.document_id, change.document)
+        elif change.operation == "insert" or change.updated_fields & CATALOG_FIELDS:
+            task = asyncio.create_task(self._fetch_and_apply(change.document_id))
+            self._fetches.add(task)
+            task.add_done_callback(self._fetches.discard)
+
+    async def _fetch_and_apply(self, product_id: str):
+        try:
+            doc = await db.products.find_one({"_id": ObjectId(product_id)}, PROJECTION)
+        except (InvalidId, TypeError):
+            return
+        except Exception as e:
+            logger.warning("Product catalog refresh for %s failed: %s", product_id, e)
+            return
+        if doc is None:
+            self.columns.remove(product_id)
+        else:
+            self.columns.upsert(product_id, doc)
+
+product_catalog = ProductCatalog()
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Set
+from pymongo.errors import OperationFailure, PyMongoError
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Server error codes meaning change streams can never work on this deployment
+# (standalone mongod, or a storage engine without majority read concern)
+UNSUPPORTED_CODES = {40573, 40324}
+
+@dataclass
+class Change:
+    collection: str
+    operation: str # insert | update | replace | delete | invalidate
+    document_id: Optional[str] = None
+    document: Optional[dict] = None
+    updated_fields: Set[str] = field(default_factory=set)
+    local: bool = False # from notify() on this worker rather than the change stream
+
+_subscribers = defaultdict(list)
+_stream_active = False
+
+def subscribe(collection: str, callback: Callable[[Change], None]):
+    # Callbacks run on the event loop and must be cheap and idempotent: a local write
+    # is delivered once by notify() and again when its change-stream event arrives.
+    _subscribers[collection].append(callback)
+
+def is_active() -> bool:
+    return _stream_active
+
+def _dispatch(change: Change):
+    for callback in _subscribers.get(change.collection, []):
+        try:
+            callback(change)
+        except Exception:
+            logger.exception("Change subscriber failed for %s", change.collection)
+
+def notify(collection: str, operation: str, document_id, document: Optional[dict] = None, updated_fields=None):
+    # Called right after a local write so this worker never serves its own stale data
+    _dispatch(Change(
+        collection=collection,
+        operation=operation,
+        document_id=str(document_id) if document_id is not None else None,
+        document=document,
+        updated_fields=set(updated_fields or ()),
+        local=True
+    ))
+
+def _invalidate_all():
+    for collection in list(_subscribers):
+        _dispatch(Change(collection=collection, operation="invalidate"))
+
+async def watch(retry_delay: float = 1.0, max_retry_delay: float = 30.0):
+    global _stream_active
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": list(_subscribers)},
+        "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+    }}]
+    resume_token = None
+    delay = retry_delay
+
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup", resume_after=resume_token) as stream:
+                _stream_active = True
+                delay = retry_delay
+                # Anything written while we were not listening is unaccounted for
+                _invalidate_all()
+                async for event in stream:
+                    resume_token = stream.resume_token
+                    update = event.get("updateDescription") or {}
+                    _dispatch(Change(
+                        collection=event["ns"]["coll"],
+                        operation=event["operationType"],
+                        document_id=str(event["documentKey"]["_id"]),
+                        document=event.get("fullDocument"),
+                        updated_fields=set(update.get("updatedFields", {})) | set(update.get("removedFields", []))
+                    ))
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if e.code in UNSUPPORTED_CODES:
+                logger.warning("Change streams unavailable (%s); caches fall back to short TTLs", e)
+                return
+            logger.warning("Change stream failed, retrying in %.0fs: %s", delay, e)
+            if e.code == 286: # ChangeStreamHistoryLost: resume token aged out of the oplog
+                resume_token = None
+        except PyMongoError as e:
+            logger.warning("Change stream interrupted, retrying in %.0fs: %s", delay, e)
+        finally:
+            _stream_active = False
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_retry_delay)
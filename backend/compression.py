@@ -0,0 +1,138 @@
+import gzip
+from typing import Callable, Dict, Optional
+import anyio
+from config import settings
+
+# Response compression negotiated from Accept-Encoding. gzip is always available;
+# brotli and zstd are used when their packages are installed.
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+# Already incremental and long-lived; compressing would need per-frame flushing
+SKIPPED_TYPES = ("text/event-stream",)
+
+def build_codecs() -> Dict[str, Callable[[bytes], bytes]]:
+    # Server preference order: the first codec wins between equally acceptable encodings
+    codecs = {}
+    if zstandard is not None:
+        zstd_level = settings.COMPRESSION_ZSTD_LEVEL
+        # ZstdCompressor instances aren't thread-safe and bodies may compress in worker threads
+        codecs["zstd"] = lambda data: zstandard.ZstdCompressor(level=zstd_level).compress(data)
+    if brotli is not None:
+        brotli_quality = settings.COMPRESSION_BROTLI_QUALITY
+        codecs["br"] = lambda data: brotli.compress(data, quality=brotli_quality)
+    gzip_level = settings.COMPRESSION_GZIP_LEVEL
+    codecs["gzip"] = lambda data: gzip.compress(data, compresslevel=gzip_level, mtime=0)
+    return codecs
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+def choose_encoding(header: str, available) -> Optional[str]:
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for name in available:
+        q = accepted.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+class CompressionMiddleware:
+    # Pure ASGI. Only complete (single-message) bodies are compressed, which is what
+    # JSONResponse produces; streaming responses pass through untouched.
+    def __init__(self, app, minimum_size: int = None, thread_threshold: int = None):
+        self.app = app
+        self.codecs = build_codecs()
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self.thread_threshold = settings.COMPRESSION_THREAD_THRESHOLD if thread_threshold is None else thread_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept_encoding, self.codecs) if accept_encoding else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Hold the headers back until we know whether the body gets compressed
+                start_message = message
+                return
+            if start_message is None or message["type"] != "http.response.body":
+                return await send(message)
+
+            start, start_message = start_message, None
+            headers = [(k, v) for k, v in start.get("headers", [])]
+            body = message.get("body", b"")
+            if message.get("more_body", False) or not self._should_compress(headers, body):
+                if self._is_compressible(headers):
+                    headers.append((b"vary", b"Accept-Encoding"))
+                await send({**start, "headers": headers})
+                return await send(message)
+
+            codec = self.codecs[encoding]
+            if len(body) >= self.thread_threshold:
+                # zlib, brotli and zstd release the GIL, so big bodies compress in parallel
+                compressed = await anyio.to_thread.run_sync(codec, body)
+            else:
+                compressed = codec(body)
+
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _is_compressible(self, headers) -> bool:
+        content_type = ""
+        for name, value in headers:
+            if name.lower() == b"content-type":
+                content_type = value.decode("latin-1").lower()
+        if content_type.startswith(SKIPPED_TYPES):
+            return False
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _should_compress(self, headers, body: bytes) -> bool:
+        if len(body) < self.minimum_size:
+            return False
+        if any(name.lower() == b"content-encoding" for name, _ in headers):
+            return False
+        return self._is_compressible(headers)
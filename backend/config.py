@@ -1,5 +1,6 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     MONGODB_URI: str
@@ -18,8 +19,126 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-secret-key-here" # Change in production
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    BULK_APPROVAL_MAX_ITEMS: int = 500
+    # Parent approval queue, paged oldest first; stats cover at most this many storefronts
+    PARENT_APPROVALS_PAGE_SIZE: int = 50
+    PARENT_APPROVALS_MAX_PAGE_SIZE: int = 200
+    PARENT_MAX_STOREFRONTS: int = 100
+    # Login throttling: token buckets per account and per client IP.
+    # "memory" keeps buckets per worker; "mongo" adds a shared store across workers.
+    LOGIN_RATE_LIMIT_BACKEND: str = "memory"
+    LOGIN_ACCOUNT_BURST: int = 5
+    LOGIN_ACCOUNT_PER_MINUTE: float = 5
+    LOGIN_IP_BURST: int = 20
+    LOGIN_IP_PER_MINUTE: float = 30
+    LOGIN_RATE_LIMIT_MAX_KEYS: int = 100000
+    # Proxies (IPs or CIDRs) whose X-Forwarded-For is believed when resolving the client
+    # IP; "*" trusts any peer, for hosts like Render that are only reachable via their proxy
+    TRUSTED_PROXIES: List[str] = []
+    # Read-through document cache. Entries are evicted in every worker by the Mongo
+    # change stream; without one (standalone mongod) the fallback TTL bounds staleness.
+    CACHE_WATCH_CHANGES: bool = True
+    CACHE_TTL_SECONDS: float = 300
+    CACHE_FALLBACK_TTL_SECONDS: float = 5
+    CACHE_MAX_ENTRIES: int = 10000
+    # Server-sent product events (per worker)
+    SSE_MAX_CLIENTS: int = 10000
+    SSE_CLIENT_BUFFER_SIZE: int = 64
+    SSE_REPLAY_SIZE: int = 1000
+    SSE_HEARTBEAT_SECONDS: float = 15
+    # Post-checkout outbox. Transactions need a replica set (Atlas); unset, they're used
+    # when the deployment supports them (so a standalone dev mongod works as is)
+    OUTBOX_USE_TRANSACTIONS: Optional[bool] = None
+    OUTBOX_WORKERS: int = 4
+    OUTBOX_POLL_SECONDS: float = 1
+    OUTBOX_LEASE_SECONDS: float = 60
+    OUTBOX_MAX_ATTEMPTS: int = 10
+    OUTBOX_BASE_BACKOFF_SECONDS: float = 1
+    OUTBOX_MAX_BACKOFF_SECONDS: float = 300
+    OUTBOX_RETENTION_SECONDS: int = 7 * 24 * 3600
+    PRODUCT_IMPORT_MAX_ROWS: int = 5000
+    PRODUCT_IMPORT_BATCH_SIZE: int = 200
+    SUGGEST_REBUILD_SECONDS: float = 900
+    SUGGEST_MAX_RESULTS: int = 20
+    # Marketplace: in-memory columnar catalog for filter/sort (falls back to Mongo
+    # for text search and until the first build finishes)
+    CATALOG_ENABLED: bool = True
+    CATALOG_REBUILD_SECONDS: float = 900
+    MARKETPLACE_PAGE_SIZE: int = 100
+    MARKETPLACE_MAX_PAGE_SIZE: int = 200
+    # "Frequently bought together" tables; 0 disables the in-process refresher
+    # (run `python recommendations.py` from a scheduler instead)
+    RECOMMENDATIONS_REFRESH_SECONDS: float = 0
+    RECOMMENDATIONS_TOP_K: int = 10
+    RECOMMENDATIONS_MAX_TRACKED: int = 500
+    RECOMMENDATIONS_BATCH_SIZE: int = 10000
+    RECOMMENDATIONS_LOCK_SECONDS: float = 600
+    RECOMMENDATIONS_SETTLE_SECONDS: float = 60
+    # Admin overview: refreshed in the background, recomputed on read past the max age
+    ADMIN_OVERVIEW_REFRESH_SECONDS: float = 60
+    ADMIN_OVERVIEW_MAX_AGE_SECONDS: float = 300
+    ADMIN_OVERVIEW_DAYS: int = 30
+    # Count orders placed before the sales rollups existed, once, on the first startup
+    ROLLUP_BACKFILL_ON_STARTUP: bool = True
+    ORDER_HISTORY_PAGE_SIZE: int = 50
+    ORDER_HISTORY_MAX_PAGE_SIZE: int = 200
+    # Order archival: orders older than ORDER_ARCHIVE_AFTER_DAYS move to orders_archive.
+    # 0 disables the in-process job (run `python archive.py` from cron instead).
+    ORDER_ARCHIVE_INTERVAL_SECONDS: float = 0
+    ORDER_ARCHIVE_AFTER_DAYS: int = 365
+    ORDER_ARCHIVE_BATCH_SIZE: int = 1000
+    ORDER_ARCHIVE_LOCK_SECONDS: float = 600
+    # Public storefront page: storefront + its active products, cached per storefront
+    STOREFRONT_PAGE_SIZE: int = 24
+    STOREFRONT_PAGE_MAX_SIZE: int = 100
+    STOREFRONT_PAGE_CACHE_MAX_ENTRIES: int = 2000
+    # Image storage: "local" (backend/static) or "s3" (any S3-compatible store; needs boto3)
+    STORAGE_BACKEND: str = "local"
+    S3_BUCKET: str = ""
+    S3_ENDPOINT_URL: Optional[str] = None # e.g. http://localhost:9000 for MinIO
+    S3_REGION: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    STORAGE_PUBLIC_BASE_URL: Optional[str] = None # CDN/bucket URL images are served from
+    UPLOAD_URL_EXPIRES_SECONDS: int = 900
+    UPLOAD_MAX_BYTES: int = 5 * 1024 * 1024
+    UPLOAD_CONTENT_TYPES: List[str] = ["image/jpeg", "image/png", "image/webp", "image/gif"]
+    # Response compression (gzip always; br/zstd when brotli/zstandard are installed).
+    # Bodies past the thread threshold are compressed in a worker thread.
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_THREAD_THRESHOLD: int = 64 * 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    # Health probes are served from state refreshed by a background monitor
+    HEALTH_CHECK_INTERVAL_SECONDS: float = 5
+    HEALTH_LAG_INTERVAL_SECONDS: float = 0.5
+    HEALTH_DB_TIMEOUT_SECONDS: float = 2
+    HEALTH_LIVENESS_MAX_AGE_SECONDS: float = 10
+    HEALTH_READY_MAX_AGE_SECONDS: float = 15
+    HEALTH_MAX_LOOP_LAG_SECONDS: float = 1
+    # Debug: report event loop callbacks that block longer than the threshold (needs --loop asyncio)
+    BLOCKING_DETECTOR_ENABLED: bool = False
+    BLOCKING_THRESHOLD_MS: float = 50
+    # Logging: JSON lines written by a background thread; full error reports are
+    # rate limited per route, past that every Nth error is logged without a traceback
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_ERROR_BURST: int = 5
+    LOG_ERRORS_PER_MINUTE: float = 6
+    LOG_ERROR_SAMPLE_EVERY: int = 100
 
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+class LazySettings:
+    # Reads the environment/.env on first use rather than at import, so importing
+    # the app (or a single module in a test) doesn't require a configured environment
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+settings = LazySettings()
\ No newline at end of file
@@ -0,0 +1,2 @@
+# Manual scripts that drive a running server on localhost:8000; not part of the suite
+collect_ignore = ["test_signup.py", "test_workflow.py"]
@@ -0,0 +1,31 @@
+from typing import Optional
+from pymongo import ReturnDocument
+from database import db
+import changefeed
+
+# Write helpers shared by the routers: every write is a single round trip that
+# hands back the resulting document, and keeps local caches/indexes in sync.
+
+async def insert_one(collection: str, document: dict) -> dict:
+    # insert_one stamps the generated _id onto the document; no need to read it back
+    await db[collection].insert_one(document)
+    changefeed.notify(collection, "insert", document["_id"], document=document)
+    return document
+
+async def update_one(collection: str, filter: dict, update_data: dict) -> Optional[dict]:
+    # Put ownership conditions in the filter: None means "no such document for this
+    # caller", and the caller decides (on that slow path only) whether it's a 404 or 403
+    document = await db[collection].find_one_and_update(
+        filter,
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
+    )
+    if document is not None:
+        changefeed.notify(collection, "update", document["_id"], document=document, updated_fields=update_data)
+    return document
+
+async def delete_one(collection: str, filter: dict) -> Optional[dict]:
+    document = await db[collection].find_one_and_delete(filter)
+    if document is not None:
+        changefeed.notify(collection, "delete", document["_id"], document=document)
+    return document
@@ -1,6 +1,75 @@
-from motor.motor_asyncio import AsyncIOMotorClient
 from config import settings
 
-# Create a global client instance
-client = AsyncIOMotorClient(settings.MONGODB_URI, serverSelectionTimeoutMS=5000)
-db = client[settings.DB_NAME]
\ No newline at end of file
+_client = None
+_db = None
+_transactions = None
+
+def get_client():
+    # Created on first use (normally inside the app's lifespan), so importing a
+    # module that touches the database neither needs the URI nor starts monitor threads
+    global _client
+    if _client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from health import pool_monitor
+        # tz_aware so stored UTC datetimes come back (and serialize) as UTC, not naive
+        _client = AsyncIOMotorClient(
+            settings.MONGODB_URI,
+            serverSelectionTimeoutMS=5000,
+            tz_aware=True,
+            event_listeners=[pool_monitor]
+        )
+    return _client
+
+def get_db():
+    global _db
+    if _db is None:
+        _db = get_client()[settings.DB_NAME]
+    return _db
+
+def close_client():
+    global _client, _db, _transactions
+    if _client is not None:
+        _client.close()
+    _client = None
+    _db = None
+    _transactions = None
+
+async def use_transactions() -> bool:
+    # OUTBOX_USE_TRANSACTIONS forces it either way; otherwise ask the server once.
+    # Replica set members report a setName, mongos reports msg "isdbgrid".
+    global _transactions
+    if settings.OUTBOX_USE_TRANSACTIONS is not None:
+        return settings.OUTBOX_USE_TRANSACTIONS
+    if _transactions is None:
+        hello = await get_db().command("hello")
+        _transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+    return _transactions
+
+class LazyHandle:
+    # Stands in for the client/database at module level: `from database import db`
+    # keeps working everywhere while the real object is only built when used
+    def __init__(self, factory):
+        self._factory = factory
+
+    def __getattr__(self, name):
+        return getattr(self._factory(), name)
+
+    def __getitem__(self, name):
+        return self._factory()[name]
+
+client = LazyHandle(get_client)
+db = LazyHandle(get_db)
+
+async def ensure_indexes():
+    # Parent-facing queries filter on the denormalized parent_id stamped at write time
+    # (and the approval queue pages through it in _id order)
+    await db.products.create_index([("parent_id", 1), ("status", 1), ("_id", 1)])
+    # Storefront pages: a storefront's active products, newest first
+    await db.products.create_index([("storefront_id", 1), ("status", 1), ("_id", -1)])
+    await db.storefronts.create_index("kid_id")
+    await db.storefronts.create_index("parent_id")
+    await db.users.create_index("parent_id")
+    await db.orders.create_index("created_at")
+    # Order history: buyer and seller branches of one $or, each walked in created_at order
+    await db.orders.create_index([("buyer_id", 1), ("created_at", -1), ("_id", -1)])
+    await db.orders.create_index([("items.storefront_id", 1), ("created_at", -1), ("_id", -1)])
@@ -0,0 +1,138 @@
+import asyncio
+import itertools
+import json
+import os
+from collections import deque
+from typing import Optional
+import changefeed
+from changefeed import Change
+from config import settings
+from models import ProductResponse, ProductStatus
+
+class Subscriber:
+    # One connected client. Frames are pre-encoded by the broker, so a slow client
+    # only ever holds references to shared bytes; past buffer_size the oldest
+    # frames are dropped and the client is told to resync.
+    __slots__ = ("queue", "wakeup", "overflowed")
+
+    def __init__(self, buffer_size: int):
+        self.queue = deque(maxlen=buffer_size)
+        self.wakeup = asyncio.Event()
+        self.overflowed = False
+
+    def push(self, frame: bytes):
+        if len(self.queue) == self.queue.maxlen:
+            self.overflowed = True
+        self.queue.append(frame)
+        self.wakeup.set()
+
+class EventBroker:
+    def __init__(self, buffer_size: int, replay_size: int):
+        self.buffer_size = buffer_size
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        # Ids are "<epoch>-<n>". The epoch is new in every process, so a Last-Event-ID
+        # issued by another worker, or before a restart, is recognised as unknown
+        self._epoch = os.urandom(4).hex()
+        # Recent frames, replayed to clients reconnecting with Last-Event-ID
+        self._history = deque(maxlen=replay_size)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscriber:
+        subscriber = Subscriber(self.buffer_size)
+        if last_event_id:
+            epoch, _, last = last_event_id.partition("-")
+            if epoch != self._epoch or not last.isdigit():
+                # Not one of ours: what the client missed is unknown, so it refreshes
+                subscriber.overflowed = True
+            else:
+                missed = [frame for event_id, frame in self._history if event_id > int(last)]
+                # Gaps older than the replay window can't be filled; ask for a full refresh
+                if self._history and self._history[0][0] > int(last) + 1:
+                    subscriber.overflowed = True
+                for frame in missed:
+                    subscriber.push(frame)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event: str, data: dict):
+        event_id = next(self._ids)
+        frame = f"id: {self._epoch}-{event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode()
+        self._history.append((event_id, frame))
+        for subscriber in self._subscribers:
+            subscriber.push(frame)
+
+    async def stream(self, subscriber: Subscriber):
+        # Tell the browser how long to wait before reconnecting
+        yield b"retry: 3000\n\n"
+        while True:
+            if subscriber.overflowed:
+                subscriber.overflowed = False
+                subscriber.queue.clear()
+                yield b"event: resync\ndata: {}\n\n"
+            elif subscriber.queue:
+                frames = b"".join(subscriber.queue)
+                subscriber.queue.clear()
+                yield frames
+            else:
+                subscriber.wakeup.clear()
+                try:
+                    await asyncio.wait_for(subscriber.wakeup.wait(), settings.SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps idle connections alive through proxies
+                    yield b": keep-alive\n\n"
+
+STOCK_FIELDS = {"quantity"}
+
+def product_event(change: Change):
+    # Maps a product change to the (event, data) the marketplace feed sends, if any.
+    # Only active products are ever announced; leaving "active" is announced as removal.
+    if change.operation == "delete":
+        # Deletes carry no document from the change stream; clients ignore unknown ids
+        if change.document is None or change.document.get("status") == ProductStatus.ACTIVE.value:
+            return "product.deleted", {"_id": change.document_id}
+        return None
+    product = change.document
+    if product is None:
+        return None
+    if product.get("status") != ProductStatus.ACTIVE.value:
+        # Rejected or sent back to pending: live clients must drop it. The previous
+        # status isn't known here, so this also fires for products never listed.
+        if "status" in change.updated_fields or change.operation == "replace":
+            return "product.unlisted", {"_id": change.document_id, "status": product.get("status")}
+        return None
+    if change.operation == "update" and change.updated_fields and change.updated_fields <= STOCK_FIELDS:
+        return "product.stock", {
+            "_id": change.document_id,
+            "quantity": product.get("quantity", 0),
+            "sold_out": product.get("quantity", 0) <= 0
+        }
+    payload = ProductResponse(**product).model_dump(mode="json", by_alias=True)
+    if "status" in change.updated_fields:
+        return "product.approved", payload
+    return "product.updated", payload
+
+def _publish_product_change(broker: EventBroker, change: Change):
+    # With a change stream every worker hears every write (its own included) from
+    # Mongo, so notify()'s local copy is skipped; without one only local writes are seen
+    if change.operation == "invalidate" or change.local == changefeed.is_active():
+        return
+    event = product_event(change)
+    if event is not None:
+        broker.publish(*event)
+
+def __getattr__(name):
+    # product_events is built on first import of the name, once settings are loaded
+    if name == "product_events":
+        broker = globals()["product_events"] = EventBroker(
+            buffer_size=settings.SSE_CLIENT_BUFFER_SIZE,
+            replay_size=settings.SSE_REPLAY_SIZE
+        )
+        changefeed.subscribe("products", lambda change: _publish_product_change(broker, change))
+        return broker
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
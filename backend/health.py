@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+from pymongo import monitoring
+from config import settings
+from database import db
+
+# Probes are answered from state kept by one background task, so load-balancer
+# traffic never reaches Mongo and a slow database can't time a probe out.
+#   /livez:  the event loop is running (the monitor's heartbeat is fresh)
+#   /readyz: additionally, Mongo answered a ping recently and the loop isn't lagging
+
+DEFAULT_MAX_POOL_SIZE = 100 # pymongo's default
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    # Registered on the Mongo client. Callbacks run on driver threads, hence the lock.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.max_sizes = {} # server address -> that pool's maxPoolSize
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkout_failures = 0
+
+    def pool_created(self, event):
+        # options only lists non-default settings
+        with self._lock:
+            self.max_sizes[event.address] = event.options.get("maxPoolSize", DEFAULT_MAX_POOL_SIZE)
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.max_sizes.pop(event.address, None)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(0, self.open - 1)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            max_size = sum(self.max_sizes.values())
+            return {
+                "max_size": max_size,
+                "open": self.open,
+                "in_use": self.checked_out,
+                "waiting": self.waiting,
+                "utilisation": round(self.checked_out / max_size, 3) if max_size else 0.0,
+                "checkout_failures": self.checkout_failures,
+            }
+
+class HealthMonitor:
+    def __init__(self):
+        self.heartbeat_at = 0.0
+        self.loop_lag = 0.0
+        self.max_loop_lag = 0.0
+        self.db_ok_at: Optional[float] = None
+        self.db_rtt: Optional[float] = None
+        self.db_error: Optional[str] = None
+
+    async def _measure_lag(self, interval: float, window_end: float):
+        # How late a sleep wakes up is how long other callbacks hogged the loop
+        worst = 0.0
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - started - interval)
+            worst = max(worst, lag)
+            self.loop_lag = lag
+            self.heartbeat_at = time.monotonic()
+            if self.heartbeat_at >= window_end:
+                return worst
+
+    async def _ping(self):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(db.command("ping"), settings.HEALTH_DB_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.db_error = str(e) or type(e).__name__
+            return
+        self.db_rtt = time.perf_counter() - started
+        self.db_ok_at = time.monotonic()
+        self.db_error = None
+
+    async def run(self):
+        self.heartbeat_at = time.monotonic()
+        while True:
+            # Ping and sample lag concurrently; the ping never blocks the lag samples
+            ping = asyncio.create_task(self._ping())
+            window_end = time.monotonic() + settings.HEALTH_CHECK_INTERVAL_SECONDS
+            try:
+                self.max_loop_lag = await self._measure_lag(settings.HEALTH_LAG_INTERVAL_SECONDS, window_end)
+            finally:
+                if not ping.done():
+                    ping.cancel()
+
+    def is_live(self) -> bool:
+        return time.monotonic() - self.heartbeat_at <= settings.HEALTH_LIVENESS_MAX_AGE_SECONDS
+
+    def is_ready(self) -> bool:
+        return (
+            self.is_live()
+            and self.db_ok_at is not None
+            and time.monotonic() - self.db_ok_at <= settings.HEALTH_READY_MAX_AGE_SECONDS
+            and self.max_loop_lag <= settings.HEALTH_MAX_LOOP_LAG_SECONDS
+        )
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "status": "ok" if self.is_ready() else "degraded",
+            "live": self.is_live(),
+            "ready": self.is_ready(),
+            "loop_lag_ms": round(self.loop_lag * 1000, 2),
+            "max_loop_lag_ms": round(self.max_loop_lag * 1000, 2),
+            "db": {
+                "connected": self.db_ok_at is not None and self.db_error is None,
+                "rtt_ms": round(self.db_rtt * 1000, 2) if self.db_rtt is not None else None,
+                "last_ok_seconds_ago": round(now - self.db_ok_at, 1) if self.db_ok_at is not None else None,
+                "error": self.db_error,
+            },
+            "pool": pool_monitor.stats(),
+        }
+
+pool_monitor = PoolMonitor()
+health_monitor = HealthMonitor()
@@ -0,0 +1,116 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from database import db
+
+class DataLoader:
+    # Batches single-document lookups by one field: every load() issued in the same
+    # event loop tick is answered by a single {field: {"$in": [...]}} query, and each
+    # key is fetched at most once for the loader's lifetime (one request).
+    def __init__(self, collection: str, field: str = "_id", projection: Optional[dict] = None):
+        self.collection = collection
+        self.field = field
+        self.projection = projection
+        self._results: Dict[str, asyncio.Future] = {}
+        self._batch: Optional[Dict[str, asyncio.Future]] = None
+        self._tasks = set() # in-flight fetches, referenced so they aren't collected
+
+    def _query_value(self, key: str):
+        if self.field == "_id":
+            return ObjectId(key)
+        return key
+
+    def load(self, key) -> "asyncio.Future[Optional[dict]]":
+        key = str(key)
+        future = self._results.get(key)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._results[key] = future
+        try:
+            self._query_value(key)
+        except (InvalidId, TypeError):
+            future.set_result(None)
+            return future
+
+        if self._batch is None:
+            self._batch = {}
+            # Runs after the callbacks already queued, i.e. once the other coroutines
+            # scheduled in this tick have had the chance to add their keys
+            loop.call_soon(self._dispatch)
+        self._batch[key] = future
+        return future
+
+    async def load_many(self, keys: Iterable) -> List[Optional[dict]]:
+        return list(await asyncio.gather(*[self.load(key) for key in keys]))
+
+    def prime(self, document: dict):
+        # Seed the memo with a document the request already has in hand
+        key = str(document[self.field])
+        future = self._results.get(key)
+        if future is None or future.done():
+            future = asyncio.get_running_loop().create_future()
+            self._results[key] = future
+            future.set_result(document)
+
+    def clear(self, key):
+        self._results.pop(str(key), None)
+
+    def _dispatch(self):
+        batch, self._batch = self._batch, None
+        task = asyncio.ensure_future(self._fetch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, batch: Dict[str, asyncio.Future]):
+        try:
+            cursor = db[self.collection].find(
+                {self.field: {"$in": [self._query_value(key) for key in batch]}},
+                self.projection
+            )
+            found = {str(doc[self.field]): doc async for doc in cursor}
+        except Exception as e:
+            for key, future in batch.items():
+                # Don't memoize failures; a later load() in the request may retry
+                self._results.pop(key, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(found.get(key))
+
+class Loaders:
+    # One set per request (see get_loaders); loaders are created on first use
+    def __init__(self):
+        self._loaders: Dict[tuple, DataLoader] = {}
+
+    def _get(self, collection: str, field: str = "_id") -> DataLoader:
+        loader = self._loaders.get((collection, field))
+        if loader is None:
+            loader = self._loaders[(collection, field)] = DataLoader(collection, field)
+        return loader
+
+    @property
+    def users(self) -> DataLoader:
+        return self._get("users")
+
+    @property
+    def storefronts(self) -> DataLoader:
+        return self._get("storefronts")
+
+    @property
+    def storefronts_by_kid(self) -> DataLoader:
+        return self._get("storefronts", "kid_id")
+
+    @property
+    def products(self) -> DataLoader:
+        return self._get("products")
+
+def get_loaders() -> Loaders:
+    # FastAPI caches dependency results per request, so every Depends(get_loaders)
+    # in one request (handler and sub-dependencies alike) shares the same loaders
+    return Loaders()
@@ -0,0 +1,186 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+import traceback
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from config import settings
+from rate_limit import TokenBucketLimiter
+
+# Structured JSON logs, written off the event loop: handlers on the loop only put the
+# record on a bounded queue, and a listener thread formats (tracebacks included) and
+# writes it. When the queue is full records are dropped and counted rather than
+# blocking a request.
+
+logger = logging.getLogger(__name__)
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_type"] = record.exc_info[0].__name__
+            entry["traceback"] = "".join(traceback.format_exception(*record.exc_info))
+        return json.dumps(entry, default=str)
+
+class NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() formats the record, traceback and all, on the calling
+        # thread. Only merge the message args here; formatting is the listener's job.
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class ErrorSampler:
+    # Per-route budget for full error reports. Within the budget an error is logged with
+    # its traceback; past it, errors are only counted, and every Nth one is logged
+    # without a traceback together with how many were suppressed.
+    def __init__(self, burst: int, per_minute: float, sample_every: int, max_routes: int = 1000):
+        self.limiter = TokenBucketLimiter(burst, per_minute / 60, max_routes)
+        self.sample_every = sample_every
+        self.suppressed = {}
+
+    def report(self, route: str, exc: BaseException):
+        allowed, _ = self.limiter.consume(route)
+        if allowed:
+            suppressed = self.suppressed.pop(route, 0)
+            logger.error(
+                "Unhandled error on %s", route,
+                exc_info=(type(exc), exc, exc.__traceback__),
+                extra={"route": route, "suppressed": suppressed}
+            )
+            return
+
+        suppressed = self.suppressed[route] = self.suppressed.get(route, 0) + 1
+        if suppressed % self.sample_every == 0:
+            logger.error(
+                "Unhandled error on %s: %s: %s", route, type(exc).__name__, exc,
+                extra={"route": route, "suppressed": suppressed, "sampled": True}
+            )
+        if len(self.suppressed) > self.limiter.max_keys:
+            self.suppressed.pop(next(iter(self.suppressed)))
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_error_sampler: Optional[ErrorSampler] = None
+
+def configure_logging():
+    # Idempotent: route the root logger through the queue and start the writer thread
+    global _listener, _queue_handler, _error_sampler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(settings.LOG_LEVEL)
+
+    _error_sampler = ErrorSampler(
+        settings.LOG_ERROR_BURST,
+        settings.LOG_ERRORS_PER_MINUTE,
+        settings.LOG_ERROR_SAMPLE_EVERY
+    )
+
+def shutdown_logging():
+    # Flushes whatever is still queued
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        if _queue_handler.dropped:
+            sys.stdout.write(json.dumps({"level": "WARNING", "logger": __name__, "message": f"Dropped {_queue_handler.dropped} log records"}) + "\n")
+
+def log_error(route: str, exc: BaseException):
+    if _error_sampler is None:
+        logger.error("Unhandled error on %s", route, exc_info=(type(exc), exc, exc.__traceback__))
+    else:
+        _error_sampler.report(route, exc)
+
+def _valid_request_id(value: str) -> bool:
+    return 0 < len(value) <= 64 and all(c.isalnum() or c in "-_." for c in value)
+
+class RequestContextMiddleware:
+    # Pure ASGI (no BaseHTTPMiddleware) so streaming responses pass straight through.
+    # Tags every log record of the request with its id, echoes it as X-Request-ID, and
+    # turns unhandled errors into a sampled log entry plus a 500 carrying only the id.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not _valid_request_id(request_id):
+            request_id = uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        response_started = False
+
+        async def send_with_request_id(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except Exception as exc:
+            # The router stores the matched route on the scope; its template keeps
+            # the sampling key low-cardinality (/products/{product_id}, not every id)
+            route = scope.get("route")
+            log_error(f"{scope['method']} {getattr(route, 'path', scope['path'])}", exc)
+            if response_started:
+                return
+            body = json.dumps({"message": "Internal Server Error", "request_id": request_id}).encode()
+            await send_with_request_id({
+                "type": "http.response.start",
+                "status": 500,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+            })
+            await send({"type": "http.response.body", "body": body})
+        finally:
+            request_id_var.reset(token)
@@ -1,59 +1,188 @@
 # Trigger reload for env update
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from config import settings
-from database import db
+from contextlib import asynccontextmanager
+import asyncio
+import logging
 import os
-from routers import auth, storefronts, products, parent, orders, admin
-
-app = FastAPI(title="Future Makers Market Backend")
-
-@app.exception_handler(Exception)
-async def global_exception_handler(request: Request, exc: Exception):
-    import traceback
-    error_details = traceback.format_exc()
-    print(f"Global Error: {error_details}")
-    return JSONResponse(
-        status_code=500,
-        content={"message": "Internal Server Error", "details": str(exc), "traceback": error_details.split("\n")}
-    )
 
-app.include_router(auth.router, prefix="/api/v1")
-app.include_router(storefronts.router, prefix="/api/v1")
-app.include_router(products.router, prefix="/api/v1")
-app.include_router(parent.router, prefix="/api/v1")
-app.include_router(orders.router, prefix="/api/v1")
-app.include_router(admin.router, prefix="/api/v1")
-
-# Mount static files for image uploads
-# Use absolute path to avoid issues with working directory
-static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
-if not os.path.exists(static_dir):
-    os.makedirs(static_dir)
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.get("/healthz")
-async def health_check():
+# Importing this module is deliberately cheap: FastAPI, the routers, settings and the
+# Mongo client are only loaded by create_app() / the lifespan. `uvicorn main:app` still
+# works through the module __getattr__ below; prefer `uvicorn --factory main:create_app`.
+
+logger = logging.getLogger(__name__)
+
+async def ensure_all_indexes():
+    from database import ensure_indexes
+    from rate_limit import login_throttle
+    import outbox
+    import rollups
+    import archive
+
+    await ensure_indexes()
+    await login_throttle.ensure_indexes()
+    await outbox.ensure_indexes()
+    await rollups.ensure_indexes()
+    await archive.ensure_indexes()
+
+async def _ensure_indexes_in_background():
+    # Index builds are idempotent and can take a while on a cold database; the app
+    # serves requests meanwhile instead of blocking startup on them
     try:
-        # Ping the database to check connection
-        await db.command("ping")
-        return {"status": "ok", "db": "connected"}
+        await ensure_all_indexes()
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        # Log the error in a real app
-        print(f"Database connection error: {e}")
-        raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
+        logger.warning("Index creation failed: %s", e)
+
+async def _detect_transactions():
+    # Settled once at startup rather than on the first checkout; a standalone mongod
+    # (local dev) has no transactions
+    from database import use_transactions
+    try:
+        if not await use_transactions():
+            logger.warning("MongoDB transactions unavailable; checkout and its outbox entries are written separately")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning("Could not detect transaction support: %s", e)
+
+async def _backfill_rollups():
+    import rollups
+    try:
+        applied = await rollups.backfill_once()
+        if applied:
+            logger.info("Rolled up %d historical orders", applied)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning("Sales rollup backfill failed: %s", e)
+
+@asynccontextmanager
+async def lifespan(app):
+    from config import settings
+    from database import close_client
+    from storage import UPLOAD_DIR, get_storage
+    from suggest import suggest_index
+    from overview import admin_overview
+    from health import health_monitor
+    from blocking import BlockingDetector
+    import changefeed
+    import outbox
+
+    detector = None
+    if settings.BLOCKING_DETECTOR_ENABLED:
+        detector = BlockingDetector(settings.BLOCKING_THRESHOLD_MS)
+        detector.install()
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    # Fail fast on a misconfigured storage backend
+    get_storage()
+
+    tasks = [
+        asyncio.create_task(_ensure_indexes_in_background()),
+        asyncio.create_task(_detect_transactions()),
+        asyncio.create_task(suggest_index.run(settings.SUGGEST_REBUILD_SECONDS)),
+        asyncio.create_task(admin_overview.run(settings.ADMIN_OVERVIEW_REFRESH_SECONDS)),
+        asyncio.create_task(health_monitor.run()),
+    ]
+    outbox.outbox_workers.start(settings.OUTBOX_WORKERS)
+
+    if settings.RECOMMENDATIONS_REFRESH_SECONDS > 0:
+        # Imported lazily: NumPy/SciPy are only needed when the refresher runs here
+        import recommendations
+        tasks.append(asyncio.create_task(recommendations.run(settings.RECOMMENDATIONS_REFRESH_SECONDS)))
+
+    if settings.CATALOG_ENABLED:
+        # Imported lazily: NumPy is only needed when the catalog is served from here
+        from catalog import product_catalog
+        tasks.append(asyncio.create_task(product_catalog.run(settings.CATALOG_REBUILD_SECONDS)))
+
+    if settings.ORDER_ARCHIVE_INTERVAL_SECONDS > 0:
+        import archive
+        tasks.append(asyncio.create_task(archive.run(settings.ORDER_ARCHIVE_INTERVAL_SECONDS)))
+
+    if settings.ROLLUP_BACKFILL_ON_STARTUP:
+        tasks.append(asyncio.create_task(_backfill_rollups()))
+
+    if settings.CACHE_WATCH_CHANGES:
+        tasks.append(asyncio.create_task(changefeed.watch()))
+
+    yield
+
+    await outbox.outbox_workers.stop()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    close_client()
+    if detector:
+        detector.uninstall()
+
+def create_app():
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.staticfiles import StaticFiles
+    from config import settings
+    from health import health_monitor
+    from logs import configure_logging, RequestContextMiddleware
+    from compression import CompressionMiddleware
+    from blocking import BlockingRouteMiddleware
+    from storage import STATIC_DIR
+    from routers import auth, storefronts, products, parent, orders, admin, analytics
+    # Registers the "sales_rollups" outbox handler
+    import rollups  # noqa: F401
+
+    configure_logging()
+    app = FastAPI(title="Future Makers Market Backend", lifespan=lifespan)
+
+    app.include_router(auth.router, prefix="/api/v1")
+    app.include_router(storefronts.router, prefix="/api/v1")
+    app.include_router(products.router, prefix="/api/v1")
+    app.include_router(parent.router, prefix="/api/v1")
+    app.include_router(orders.router, prefix="/api/v1")
+    app.include_router(admin.router, prefix="/api/v1")
+    app.include_router(analytics.router, prefix="/api/v1")
+
+    # Mount static files for image uploads; the directory is created by the lifespan
+    app.mount("/static", StaticFiles(directory=STATIC_DIR, check_dir=False), name="static")
+
+    app.add_middleware(CompressionMiddleware)
+    # Lets blocking-call reports name the route; a contextvar set per request
+    app.add_middleware(BlockingRouteMiddleware)
+    # Request ids and unhandled errors; added before CORS so error responses get CORS headers too
+    app.add_middleware(RequestContextMiddleware)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Request-ID"],
+    )
+
+    # Probes read the monitor's cached state; none of them touches the database
+    @app.get("/livez")
+    async def liveness_check():
+        snapshot = health_monitor.snapshot()
+        return JSONResponse(snapshot, status_code=200 if snapshot["live"] else 503)
+
+    @app.get("/readyz")
+    async def readiness_check():
+        snapshot = health_monitor.snapshot()
+        return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+    # Kept for existing probes
+    app.add_api_route("/healthz", readiness_check, methods=["GET"])
+
+    return app
+
+def __getattr__(name):
+    # Backwards compatible `main:app`: built once, on first access
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port)
\ No newline at end of file
+    uvicorn.run("main:create_app", factory=True, host="0.0.0.0", port=port)
@@ -0,0 +1,63 @@
+import asyncio
+import sys
+from bson import ObjectId
+from pymongo import UpdateMany, UpdateOne
+from database import db, ensure_indexes
+
+BATCH_SIZE = 500
+
+# Invariant: a storefront's and its products' parent_id equal the kid's parent_id at
+# the time they were written (signup is the only place a kid's parent is set, and
+# nothing changes it afterwards). Any future way of re-linking a kid to another parent
+# must re-stamp that kid's storefront and products, e.g. by running this again.
+async def backfill_parent_ids():
+    # 1. Stamp parent_id onto storefronts from their kid's user document
+    storefronts = await db.storefronts.find({}, {"kid_id": 1}).to_list(length=None)
+    kid_ids = list(set(ObjectId(sf["kid_id"]) for sf in storefronts if ObjectId.is_valid(str(sf.get("kid_id")))))
+    kids = await db.users.find({"_id": {"$in": kid_ids}}, {"parent_id": 1}).to_list(length=None)
+    parent_by_kid = {str(kid["_id"]): kid.get("parent_id") for kid in kids}
+
+    storefront_ops = []
+    product_ops = []
+    for sf in storefronts:
+        kid_id = str(sf.get("kid_id"))
+        parent_id = parent_by_kid.get(kid_id)
+        storefront_ops.append(UpdateOne({"_id": sf["_id"]}, {"$set": {"parent_id": parent_id}}))
+        # 2. Stamp kid_id/parent_id onto every product of that storefront
+        product_ops.append(UpdateMany(
+            {"storefront_id": str(sf["_id"])},
+            {"$set": {"kid_id": kid_id, "parent_id": parent_id}}
+        ))
+
+    for i in range(0, len(storefront_ops), BATCH_SIZE):
+        await db.storefronts.bulk_write(storefront_ops[i:i + BATCH_SIZE], ordered=False)
+    for i in range(0, len(product_ops), BATCH_SIZE):
+        await db.products.bulk_write(product_ops[i:i + BATCH_SIZE], ordered=False)
+
+    print(f"Stamped parent_id on {len(storefront_ops)} storefronts and their products")
+
+async def convert_order_dates():
+    # Orders used to store created_at as an ISO string; $toDate parses it server-side
+    result = await db.orders.update_many(
+        {"created_at": {"$type": "string"}},
+        [{"$set": {"created_at": {"$toDate": "$created_at"}}}]
+    )
+    print(f"Converted created_at on {result.modified_count} orders")
+
+MIGRATIONS = {
+    "backfill_parent_ids": backfill_parent_ids,
+    "convert_order_dates": convert_order_dates,
+}
+
+async def main(names):
+    await ensure_indexes()
+    for name in names or MIGRATIONS:
+        if name not in MIGRATIONS:
+            print(f"Unknown migration: {name}")
+            sys.exit(1)
+        print(f"Running migration: {name}")
+        await MIGRATIONS[name]()
+
+if __name__ == "__main__":
+    # Usage: python migrations.py [migration_name ...]
+    asyncio.run(main(sys.argv[1:]))
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field, BeforeValidator
-from typing import Optional, Annotated, List
+from typing import Optional, Annotated, List, Dict
+from datetime import datetime
 from enum import Enum
 
 # Helper for MongoDB ObjectId handling in Pydantic v2
@@ -115,6 +116,84 @@ class ProductResponse(ProductBase):
         populate_by_name = True
         arbitrary_types_allowed = True
 
+class StorefrontPage(BaseModel):
+    storefront: StorefrontResponse
+    products: List[ProductResponse]
+    next_cursor: Optional[str] = None
+
+class BulkApprovalItem(BaseModel):
+    product_id: str
+    action: str # "approve" or "reject"
+
+class BulkApprovalRequest(BaseModel):
+    items: List[BulkApprovalItem]
+
+class BulkApprovalResult(BaseModel):
+    product_id: str
+    success: bool
+    status: Optional[ProductStatus] = None
+    detail: Optional[str] = None
+
+class SuggestionType(str, Enum):
+    PRODUCT = "product"
+    STOREFRONT = "storefront"
+
+class SuggestionResponse(BaseModel):
+    type: SuggestionType
+    id: str
+    name: str
+
+class ProductImportError(BaseModel):
+    row: int
+    error: str
+
+class ProductImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[ProductImportError]
+    truncated: bool = False # the row limit was reached; later rows were not read
+    notice: Optional[str] = None
+
+class UploadRequest(BaseModel):
+    filename: str
+    content_type: str
+    size: int
+
+class UploadTicket(BaseModel):
+    key: str
+    url: str # where the image is served from once uploaded; store this on the product
+    upload_url: str
+    method: str = "PUT"
+    headers: Dict[str, str] = {}
+    fields: Dict[str, str] = {} # for method POST: form fields to send before the file
+    expires_in: int
+
+class SalesBucket(BaseModel):
+    bucket: datetime
+    units: int
+    revenue: float
+    orders: int
+
+class SalesAnalyticsResponse(BaseModel):
+    storefront_id: str
+    product_id: Optional[str] = None
+    granularity: str
+    series: List[SalesBucket]
+
+class OrdersPerDay(BaseModel):
+    date: str # YYYY-MM-DD (UTC)
+    orders: int
+    gmv: float
+
+class AdminOverviewResponse(BaseModel):
+    counts: Dict[str, int]
+    products_by_status: Dict[str, int]
+    users_by_role: Dict[str, int]
+    gmv: float
+    orders_per_day: List[OrdersPerDay]
+    generated_at: datetime
+    age_seconds: float
+
 class OrderItem(BaseModel):
     product_id: str
     quantity: int
@@ -131,7 +210,7 @@ class OrderBase(BaseModel):
     items: List[OrderItem]
     total: float
     status: OrderStatus = OrderStatus.COMPLETED
-    created_at: Optional[str] = None
+    created_at: Optional[datetime] = None
 
 class OrderCreateItem(BaseModel):
     product_id: str
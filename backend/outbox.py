@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List
+from pymongo import ReturnDocument
+from config import settings
+from database import db
+
+logger = logging.getLogger(__name__)
+
+class OutboxStatus:
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+# topic -> {handler name -> coroutine function(payload)}
+_handlers: Dict[str, Dict[str, Callable[[dict], Awaitable[None]]]] = {}
+_wakeup = asyncio.Event()
+
+def handler(topic: str, name: str):
+    # Each (topic, handler) pair gets its own outbox entry so one failing consumer
+    # is retried without re-running the others. Delivery is at-least-once:
+    # handlers must be idempotent.
+    def register(func):
+        _handlers.setdefault(topic, {})[name] = func
+        return func
+    return register
+
+def build_entries(topic: str, payload: dict) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "topic": topic,
+            "handler": name,
+            "payload": payload,
+            "status": OutboxStatus.PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now
+        }
+        for name in _handlers.get(topic, {})
+    ]
+
+async def enqueue(topic: str, payload: dict, session=None):
+    entries = build_entries(topic, payload)
+    if entries:
+        await db.outbox.insert_many(entries, session=session)
+
+def wake():
+    # Let an idle local worker pick new entries up without waiting for the next poll
+    _wakeup.set()
+
+async def ensure_indexes():
+    await db.outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.outbox.create_index([("status", 1), ("lease_expires_at", 1)])
+    # Delivered entries are kept for a while for debugging, then dropped
+    await db.outbox.create_index("processed_at", expireAfterSeconds=settings.OUTBOX_RETENTION_SECONDS)
+
+def _backoff(attempts: int) -> float:
+    delay = min(settings.OUTBOX_MAX_BACKOFF_SECONDS, settings.OUTBOX_BASE_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+async def _claim():
+    now = datetime.now(timezone.utc)
+    return await db.outbox.find_one_and_update(
+        {"$or": [
+            {"status": OutboxStatus.PENDING, "next_attempt_at": {"$lte": now}},
+            # A worker that died mid-delivery leaves its lease to expire
+            {"status": OutboxStatus.PROCESSING, "lease_expires_at": {"$lte": now}}
+        ]},
+        {
+            "$set": {
+                "status": OutboxStatus.PROCESSING,
+                "lease_expires_at": now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def _deliver(entry: dict):
+    func = _handlers.get(entry["topic"], {}).get(entry["handler"])
+    try:
+        if func is None:
+            raise LookupError(f"No outbox handler {entry['handler']!r} for topic {entry['topic']!r}")
+        await func(entry["payload"])
+    except Exception as e:
+        attempts = entry["attempts"]
+        if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            logger.error("Outbox entry %s (%s/%s) failed permanently: %s", entry["_id"], entry["topic"], entry["handler"], e)
+            update = {"status": OutboxStatus.FAILED, "last_error": str(e)}
+        else:
+            logger.warning("Outbox entry %s (%s/%s) failed, attempt %d: %s", entry["_id"], entry["topic"], entry["handler"], attempts, e)
+            update = {
+                "status": OutboxStatus.PENDING,
+                "last_error": str(e),
+                "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=_backoff(attempts))
+            }
+        await db.outbox.update_one({"_id": entry["_id"]}, {"$set": update, "$unset": {"lease_expires_at": ""}})
+        return
+
+    await db.outbox.update_one(
+        {"_id": entry["_id"]},
+        {"$set": {"status": OutboxStatus.DONE, "processed_at": datetime.now(timezone.utc)}, "$unset": {"lease_expires_at": ""}}
+    )
+
+async def _worker_loop():
+    while True:
+        try:
+            entry = await _claim()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Outbox poll failed: %s", e)
+            entry = None
+
+        if entry is not None:
+            try:
+                await _deliver(entry)
+                continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # e.g. recording the outcome failed; the lease expires and the entry is retried
+                logger.exception("Outbox delivery of entry %s failed", entry["_id"])
+
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), settings.OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+class OutboxWorkerPool:
+    def __init__(self):
+        self._tasks = []
+
+    def start(self, concurrency: int):
+        self._tasks = [asyncio.create_task(_worker_loop()) for _ in range(concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        # Entries claimed by cancelled workers are picked up again once their lease expires
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+outbox_workers = OutboxWorkerPool()
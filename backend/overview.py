@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from config import settings
+from database import db
+import archive
+import rollups
+
+logger = logging.getLogger(__name__)
+
+async def compute_overview() -> dict:
+    now = datetime.now(timezone.utc)
+    since = (now - timedelta(days=settings.ADMIN_OVERVIEW_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # Collection sizes come from collection metadata, not a scan
+    counts = {}
+    for name in ("users", "storefronts", "products"):
+        counts[name] = await db[name].estimated_document_count()
+    counts["orders"] = await archive.estimated_count()
+
+    products_by_status = {
+        row["_id"]: row["count"]
+        async for row in db.products.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])
+    }
+    users_by_role = {
+        row["_id"]: row["count"]
+        async for row in db.users.aggregate([{"$group": {"_id": "$role", "count": {"$sum": 1}}}])
+    }
+
+    # Both from the marketplace-wide day rollups (one small document per day) rather
+    # than the orders. Orders older than the rollups are counted in by the startup
+    # backfill (rollups.backfill_once).
+    marketplace_days = {"granularity": "day", "storefront_id": rollups.MARKETPLACE, "product_id": None}
+    gmv_rows = await db.sales_rollups.aggregate([
+        {"$match": marketplace_days},
+        {"$group": {"_id": None, "gmv": {"$sum": "$revenue"}}}
+    ]).to_list(length=1)
+    orders_per_day = await db.sales_rollups.find(
+        {**marketplace_days, "bucket": {"$gte": since}}
+    ).sort("bucket", 1).to_list(length=None)
+
+    return {
+        "counts": counts,
+        "products_by_status": products_by_status,
+        "users_by_role": users_by_role,
+        "gmv": gmv_rows[0]["gmv"] if gmv_rows else 0.0,
+        "orders_per_day": [
+            {"date": rollups.as_datetime(row["bucket"]).strftime("%Y-%m-%d"), "orders": row["orders"], "gmv": row["revenue"]}
+            for row in orders_per_day
+        ],
+        "generated_at": now
+    }
+
+class OverviewCache:
+    def __init__(self):
+        self._snapshot: Optional[dict] = None
+        self._refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _age(self) -> float:
+        return time.monotonic() - self._refreshed_at
+
+    async def refresh(self):
+        async with self._lock:
+            self._snapshot = await compute_overview()
+            self._refreshed_at = time.monotonic()
+
+    async def get(self) -> dict:
+        # The background task normally keeps the snapshot fresh; if it has fallen
+        # behind the staleness bound, one caller recomputes while the others wait
+        if self._snapshot is None or self._age() > settings.ADMIN_OVERVIEW_MAX_AGE_SECONDS:
+            refreshed_at = self._refreshed_at
+            async with self._lock:
+                if self._refreshed_at == refreshed_at:
+                    self._snapshot = await compute_overview()
+                    self._refreshed_at = time.monotonic()
+        return {**self._snapshot, "age_seconds": round(self._age(), 3)}
+
+    async def run(self, interval_seconds: float):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Admin overview refresh failed: %s", e)
+            await asyncio.sleep(interval_seconds)
+
+admin_overview = OverviewCache()
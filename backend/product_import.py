@@ -0,0 +1,86 @@
+import codecs
+import csv
+import json
+import os
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from models import ProductCreate
+
+CSV_EXTENSIONS = {".csv"}
+JSONL_EXTENSIONS = {".jsonl", ".ndjson"}
+CSV_CONTENT_TYPES = {"text/csv", "application/csv"}
+JSONL_CONTENT_TYPES = {"application/jsonl", "application/x-ndjson", "application/x-jsonlines"}
+
+# CSV cells can't hold lists; these columns are "|"-separated
+LIST_COLUMNS = {"images", "image_names"}
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    extension = os.path.splitext(filename or "")[1].lower()
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if extension in CSV_EXTENSIONS or content_type in CSV_CONTENT_TYPES:
+        return "csv"
+    if extension in JSONL_EXTENSIONS or content_type in JSONL_CONTENT_TYPES:
+        return "jsonl"
+    return None
+
+def _lines(stream: BinaryIO) -> Iterator[str]:
+    # Decode incrementally so the upload is never materialized as one string
+    reader = codecs.getreader("utf-8-sig")(stream)
+    for line in reader:
+        yield line
+
+def _csv_rows(stream: BinaryIO) -> Iterator[Tuple[int, dict]]:
+    reader = csv.DictReader(_lines(stream))
+    for row in reader:
+        data = {}
+        for column, value in row.items():
+            if column is None:
+                continue
+            column = column.strip()
+            value = (value or "").strip()
+            if column in LIST_COLUMNS:
+                data[column] = [part.strip() for part in value.split("|") if part.strip()]
+            elif value != "":
+                data[column] = value
+        yield reader.line_num, data
+
+def _jsonl_rows(stream: BinaryIO) -> Iterator[Tuple[int, object]]:
+    for line_number, line in enumerate(_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e.msg}")
+
+def _format_error(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+        for error in e.errors()
+    )
+
+def parse_products(stream: BinaryIO, file_format: str) -> Iterator[Tuple[int, Optional[ProductCreate], Optional[str]]]:
+    # Yields (row number, product, error); exactly one of product/error is set
+    rows = _csv_rows(stream) if file_format == "csv" else _jsonl_rows(stream)
+    for row_number, data in rows:
+        if isinstance(data, Exception):
+            yield row_number, None, str(data)
+            continue
+        try:
+            yield row_number, ProductCreate.model_validate(data), None
+        except ValidationError as e:
+            yield row_number, None, _format_error(e)
+
+def read_batch(rows: Iterator, size: int) -> Tuple[List, Optional[Exception]]:
+    # Pulls up to `size` parsed rows. Meant for a worker thread, so a large upload is
+    # decoded and validated off the event loop; a file-level parse error ends the
+    # import but keeps the rows read before it.
+    batch = []
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= size:
+                break
+    except (csv.Error, UnicodeDecodeError) as e:
+        return batch, e
+    return batch, None
@@ -0,0 +1,143 @@
+import ipaddress
+import math
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+from pymongo import ReturnDocument
+from config import settings
+from database import db
+
+class TokenBucketLimiter:
+    # In-process buckets: key -> (tokens, last_refill). Least recently used keys are
+    # evicted past max_keys so a spray of random emails/IPs can't grow memory unbounded.
+    def __init__(self, capacity: int, refill_per_second: float, max_keys: int):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def consume(self, key: str) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - last) * self.refill_per_second)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+        retry_after = 0.0 if allowed else (1 - tokens) / self.refill_per_second
+        return allowed, retry_after
+
+class MongoTokenBucketStore:
+    # Shared buckets so every worker sees the same budget. The refill and the take
+    # happen in one atomic pipeline update keyed on the bucket id.
+    def __init__(self, collection, capacity: int, refill_per_second: float):
+        self.collection = collection
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+
+    async def ensure_indexes(self):
+        # Buckets idle long enough to be full again carry no information
+        await self.collection.create_index(
+            "updated_at",
+            expireAfterSeconds=math.ceil(self.capacity / self.refill_per_second)
+        )
+
+    async def consume(self, key: str) -> Tuple[bool, float]:
+        elapsed_seconds = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        pipeline = [
+            {"$set": {
+                "tokens": {"$min": [
+                    self.capacity,
+                    {"$add": [{"$ifNull": ["$tokens", self.capacity]}, {"$multiply": [elapsed_seconds, self.refill_per_second]}]}
+                ]},
+                "updated_at": "$$NOW"
+            }},
+            {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+            {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}}
+        ]
+        bucket = await self.collection.find_one_and_update(
+            {"_id": key},
+            pipeline,
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        allowed = bucket["allowed"]
+        retry_after = 0.0 if allowed else (1 - bucket["tokens"]) / self.refill_per_second
+        return allowed, retry_after
+
+class LoginThrottle:
+    def __init__(self):
+        self._configured = False
+
+    def _configure(self):
+        # Deferred to first use so the limits come from settings as loaded at runtime
+        if self._configured:
+            return
+        self._configured = True
+        per_account = (settings.LOGIN_ACCOUNT_BURST, settings.LOGIN_ACCOUNT_PER_MINUTE / 60)
+        per_ip = (settings.LOGIN_IP_BURST, settings.LOGIN_IP_PER_MINUTE / 60)
+
+        self.account_limiter = TokenBucketLimiter(*per_account, settings.LOGIN_RATE_LIMIT_MAX_KEYS)
+        self.ip_limiter = TokenBucketLimiter(*per_ip, settings.LOGIN_RATE_LIMIT_MAX_KEYS)
+
+        self.account_store: Optional[MongoTokenBucketStore] = None
+        self.ip_store: Optional[MongoTokenBucketStore] = None
+        if settings.LOGIN_RATE_LIMIT_BACKEND == "mongo":
+            self.account_store = MongoTokenBucketStore(db.login_buckets, *per_account)
+            self.ip_store = MongoTokenBucketStore(db.login_buckets, *per_ip)
+
+    async def ensure_indexes(self):
+        self._configure()
+        if self.account_store:
+            # Both stores share one collection; the longer refill window wins the TTL
+            store = max(self.account_store, self.ip_store, key=lambda s: s.capacity / s.refill_per_second)
+            await store.ensure_indexes()
+
+    async def check(self, email: str, client_ip: str) -> Tuple[bool, float]:
+        self._configure()
+        # Local buckets are checked first so a burst is rejected without any I/O.
+        # The shared store (if configured) only sees attempts that pass locally.
+        checks = [
+            (self.ip_limiter, self.ip_store, f"ip:{client_ip}"),
+            (self.account_limiter, self.account_store, f"account:{email.strip().lower()}"),
+        ]
+        for limiter, store, key in checks:
+            allowed, retry_after = limiter.consume(key)
+            if allowed and store:
+                allowed, retry_after = await store.consume(key)
+            if not allowed:
+                return False, retry_after
+        return True, 0.0
+
+@lru_cache(maxsize=1)
+def _trusted_networks():
+    return [ipaddress.ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXIES if proxy != "*"]
+
+def _is_trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_networks())
+
+def client_ip(request) -> str:
+    # Behind a proxy the socket peer is the proxy, shared by every user. Forwarded
+    # addresses are read right to left while they come from trusted proxies; the first
+    # untrusted one is the client (anything left of it is whatever the client sent).
+    # "*" trusts the peer itself, but never a hop named only in the header.
+    address = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get("x-forwarded-for", "")
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    if hops and ("*" in settings.TRUSTED_PROXIES or _is_trusted(address)):
+        address = hops.pop()
+        while hops and _is_trusted(address):
+            address = hops.pop()
+    return address
+
+login_throttle = LoginThrottle()
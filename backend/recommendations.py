@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from scipy import sparse
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from config import settings
+from database import db
+import archive
+
+logger = logging.getLogger(__name__)
+
+JOB_ID = "recommendations"
+
+# product_related documents:
+#   {_id: product_id, counts: {other_product_id: co-purchases}, related: [{product_id, score}], applied_through}
+# counts are the persisted item-item co-occurrence row; related is its precomputed top-K.
+# applied_through is the last order id of the batch that last added to counts.
+
+def cooccurrence(orders):
+    # Orders x products incidence matrix, binarized so buying two of an item counts once
+    vocabulary = {}
+    rows, cols = [], []
+    for row, order in enumerate(orders):
+        for item in order.get("items", []):
+            cols.append(vocabulary.setdefault(item["product_id"], len(vocabulary)))
+            rows.append(row)
+
+    if not vocabulary:
+        return [], sparse.coo_matrix((0, 0))
+
+    incidence = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+        shape=(len(orders), len(vocabulary))
+    )
+    incidence.data[:] = 1
+
+    # Item-item co-occurrence without the diagonal (an item with itself)
+    matrix = (incidence.T @ incidence).tocoo()
+    off_diagonal = matrix.row != matrix.col
+    matrix = sparse.coo_matrix(
+        (matrix.data[off_diagonal], (matrix.row[off_diagonal], matrix.col[off_diagonal])),
+        shape=matrix.shape
+    )
+    product_ids = [None] * len(vocabulary)
+    for product_id, index in vocabulary.items():
+        product_ids[index] = product_id
+    return product_ids, matrix
+
+def top_k(counts: dict, k: int):
+    if not counts:
+        return []
+    ids = np.array(list(counts.keys()))
+    scores = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    if len(scores) > k:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    ordered = candidates[np.lexsort((ids[candidates], -scores[candidates]))]
+    return [{"product_id": str(ids[i]), "score": int(scores[i])} for i in ordered]
+
+async def _apply_increments(product_ids, matrix, batch_end):
+    # One update per product, skipped if this batch already reached it: replaying a
+    # batch after a crash misses the filter, and the upsert's duplicate key is ignored
+    increments = defaultdict(dict)
+    for row, col, count in zip(matrix.row, matrix.col, matrix.data):
+        increments[product_ids[row]][f"counts.{product_ids[col]}"] = int(count)
+    operations = [
+        UpdateOne(
+            {"_id": product_id, "applied_through": {"$ne": batch_end}},
+            {"$inc": counts, "$set": {"applied_through": batch_end}},
+            upsert=True
+        )
+        for product_id, counts in increments.items()
+    ]
+    for i in range(0, len(operations), 1000):
+        try:
+            await db.product_related.bulk_write(operations[i:i + 1000], ordered=False)
+        except BulkWriteError as e:
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+async def _refresh_top_k(affected_ids):
+    k = settings.RECOMMENDATIONS_TOP_K
+    max_tracked = settings.RECOMMENDATIONS_MAX_TRACKED
+    affected_ids = list(affected_ids)
+    for i in range(0, len(affected_ids), 1000):
+        docs = await db.product_related.find({"_id": {"$in": affected_ids[i:i + 1000]}}).to_list(length=None)
+        operations = []
+        for doc in docs:
+            counts = doc.get("counts", {})
+            update = {"related": top_k(counts, k), "updated_at": datetime.now(timezone.utc)}
+            # Keep per-product rows bounded; the long tail never reaches the top K
+            if len(counts) > max_tracked:
+                update["counts"] = {entry["product_id"]: entry["score"] for entry in top_k(counts, max_tracked)}
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+        if operations:
+            await db.product_related.bulk_write(operations, ordered=False)
+
+async def _next_orders(query: dict, limit: int):
+    # The next orders by _id from the hot and archived collections, so a --full rebuild
+    # keeps the co-purchases of archived orders. Keyed by _id: an order caught mid-move
+    # may briefly be in both.
+    collections = [db.orders]
+    if await archive.cold_has_orders():
+        collections.append(db[archive.COLD])
+    merged = {}
+    for collection in collections:
+        async for order in collection.find(query, {"items.product_id": 1}).sort("_id", 1).limit(limit):
+            merged[order["_id"]] = order
+    return [merged[order_id] for order_id in sorted(merged)[:limit]]
+
+async def _acquire_lock() -> dict:
+    # Only one worker/process may advance the watermark at a time
+    now = datetime.now(timezone.utc)
+    try:
+        return await db.job_state.find_one_and_update(
+            {"_id": JOB_ID, "$or": [{"locked_until": {"$exists": False}}, {"locked_until": {"$lte": now}}]},
+            {"$set": {"locked_until": now + timedelta(seconds=settings.RECOMMENDATIONS_LOCK_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Upsert lost to an existing, still-locked document
+        return None
+
+async def _release_lock():
+    await db.job_state.update_one({"_id": JOB_ID}, {"$unset": {"locked_until": ""}})
+
+async def refresh(full: bool = False) -> int:
+    state = await _acquire_lock()
+    if state is None:
+        logger.info("Recommendations refresh already running elsewhere")
+        return 0
+
+    try:
+        if full:
+            await db.product_related.delete_many({})
+            state.pop("last_order_id", None)
+            state.pop("pending_through", None)
+
+        processed = 0
+        last_order_id = state.get("last_order_id")
+        # A batch interrupted by a crash is replayed with exactly the same bounds, so
+        # its marker in product_related matches and nothing is counted twice
+        pending_through = state.get("pending_through")
+        # Stay a little behind "now" so orders inserted concurrently with slightly
+        # older ObjectIds aren't skipped by the watermark
+        settled = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=settings.RECOMMENDATIONS_SETTLE_SECONDS))
+        while True:
+            query = {"status": "completed", "_id": {"$lt": settled}}
+            if pending_through is not None:
+                query["_id"] = {"$lte": pending_through}
+            if last_order_id is not None:
+                query["_id"]["$gt"] = last_order_id
+            orders = await _next_orders(query, settings.RECOMMENDATIONS_BATCH_SIZE)
+            if pending_through is not None:
+                batch_end = pending_through
+            elif orders:
+                # Recorded before any count is applied: this is the batch a restart replays
+                batch_end = orders[-1]["_id"]
+                await db.job_state.update_one({"_id": JOB_ID}, {"$set": {"pending_through": batch_end}})
+            else:
+                break
+
+            product_ids, matrix = cooccurrence(orders)
+            if matrix.nnz:
+                await _apply_increments(product_ids, matrix, batch_end)
+                await _refresh_top_k(set(product_ids[row] for row in np.unique(matrix.row)))
+
+            # Advance the watermark per batch so a crash only replays one batch
+            last_order_id, pending_through = batch_end, None
+            await db.job_state.update_one(
+                {"_id": JOB_ID},
+                {"$set": {"last_order_id": last_order_id}, "$unset": {"pending_through": ""}}
+            )
+            processed += len(orders)
+
+        return processed
+    finally:
+        await _release_lock()
+
+async def run(interval_seconds: float):
+    while True:
+        try:
+            processed = await refresh()
+            if processed:
+                logger.info("Recommendations refreshed from %d new orders", processed)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Recommendations refresh failed: %s", e)
+        await asyncio.sleep(interval_seconds)
+
+if __name__ == "__main__":
+    # Usage: python recommendations.py [--full]
+    parser = argparse.ArgumentParser(description="Build 'frequently bought together' tables from order history")
+    parser.add_argument("--full", action="store_true", help="Discard existing counts and rebuild from all orders")
+    args = parser.parse_args()
+    print(f"Processed {asyncio.run(refresh(full=args.full))} orders")
@@ -0,0 +1,200 @@
+import asyncio
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from database import db, client, use_transactions
+import outbox
+
+HOUR = "hour"
+DAY = "day"
+GRANULARITIES = (HOUR, DAY)
+MARKETPLACE = "*" # storefront_id of the marketplace-wide totals
+BACKFILL_JOB_ID = "rollup_backfill"
+BACKFILL_LOCK = timedelta(hours=1)
+
+# sales_rollups documents, one per (granularity, storefront, product or "*", bucket start):
+#   {granularity, storefront_id, product_id (None for the storefront total), bucket, units, revenue, orders}
+# Storefront "*" holds the marketplace totals, where an order counts once however many
+# storefronts it spans. rollup_applied holds one marker per order already counted,
+# which makes replays no-ops.
+
+def as_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    moment = moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+def rollup_id(granularity: str, storefront_id: str, product_id, bucket: datetime) -> str:
+    return f"{granularity}|{storefront_id}|{product_id or '*'}|{bucket.isoformat()}"
+
+def _increments(orders):
+    totals = defaultdict(lambda: {"units": 0, "revenue": 0.0, "orders": 0})
+    for order in orders:
+        created_at = as_datetime(order["created_at"])
+        for granularity in GRANULARITIES:
+            bucket = bucket_start(created_at, granularity)
+            marketplace = totals[(granularity, MARKETPLACE, None, bucket)]
+            marketplace["orders"] += 1
+            storefronts_seen = set()
+            products_seen = set()
+            for item in order["items"]:
+                revenue = item["price"] * item["quantity"]
+                keys = [(granularity, item["storefront_id"], None, bucket), (granularity, item["storefront_id"], item["product_id"], bucket)]
+                for key in keys:
+                    totals[key]["units"] += item["quantity"]
+                    totals[key]["revenue"] += revenue
+                marketplace["units"] += item["quantity"]
+                marketplace["revenue"] += revenue
+                # An order counts once per storefront and once per product
+                if item["storefront_id"] not in storefronts_seen:
+                    storefronts_seen.add(item["storefront_id"])
+                    totals[keys[0]]["orders"] += 1
+                if item["product_id"] not in products_seen:
+                    products_seen.add(item["product_id"])
+                    totals[keys[1]]["orders"] += 1
+    return totals
+
+async def _mark_applied(order_ids, session=None):
+    # Returns the ids not counted before
+    order_ids = list(dict.fromkeys(order_ids))
+    if not order_ids:
+        return set()
+    if session is not None:
+        # Any failed write aborts the whole transaction, so a duplicate key can't be
+        # caught and skipped here: read the existing markers and insert only the rest.
+        # A concurrent transaction marking the same order is a write conflict, which
+        # with_transaction retries against the committed marker.
+        cursor = db.rollup_applied.find({"_id": {"$in": order_ids}}, {"_id": 1}, session=session)
+        seen = {doc["_id"] async for doc in cursor}
+        fresh = [oid for oid in order_ids if oid not in seen]
+        if fresh:
+            await db.rollup_applied.insert_many([{"_id": oid} for oid in fresh], session=session)
+        return set(fresh)
+    # Without a session the unique _id turns a replay into a duplicate key error
+    try:
+        await db.rollup_applied.insert_many([{"_id": oid} for oid in order_ids], ordered=False, session=session)
+        return set(order_ids)
+    except BulkWriteError as e:
+        duplicates = {order_ids[error["index"]] for error in e.details.get("writeErrors", []) if error.get("code") == 11000}
+        if len(duplicates) != len(e.details.get("writeErrors", [])):
+            raise
+        return set(order_ids) - duplicates
+
+async def _apply(orders, session=None):
+    orders = list({str(order["_id"]): order for order in orders}.values())
+    fresh = await _mark_applied([str(order["_id"]) for order in orders], session=session)
+    totals = _increments([order for order in orders if str(order["_id"]) in fresh])
+    operations = [
+        UpdateOne(
+            {"_id": rollup_id(*key)},
+            {
+                "$inc": values,
+                "$setOnInsert": {"granularity": key[0], "storefront_id": key[1], "product_id": key[2], "bucket": key[3]}
+            },
+            upsert=True
+        )
+        for key, values in totals.items()
+    ]
+    if operations:
+        await db.sales_rollups.bulk_write(operations, ordered=False, session=session)
+    return len(fresh)
+
+async def apply_orders(orders) -> int:
+    # With transactions the marker and the increments commit together (exactly once);
+    # without, the marker goes first and a crash in between loses that order's counts
+    if await use_transactions():
+        async with await client.start_session() as session:
+            # with_transaction retries transient errors (e.g. a write conflict with a
+            # concurrent checkout rolling up the same order) from the top
+            return await session.with_transaction(lambda s: _apply(orders, session=s))
+    return await _apply(orders)
+
+async def ensure_indexes():
+    await db.sales_rollups.create_index([("storefront_id", 1), ("granularity", 1), ("product_id", 1), ("bucket", 1)])
+
+@outbox.handler("order.created", "sales_rollups")
+async def rollup_order(event: dict):
+    if event.get("status", "completed") != "completed":
+        return
+    await apply_orders([{**event, "_id": event["order_id"]}])
+
+async def query_series(storefront_id: str, granularity: str, start: datetime, end: datetime, product_id=None):
+    cursor = db.sales_rollups.find({
+        "storefront_id": storefront_id,
+        "granularity": granularity,
+        "product_id": product_id,
+        "bucket": {"$gte": bucket_start(start, granularity), "$lte": end}
+    }).sort("bucket", 1)
+    found = {as_datetime(doc["bucket"]): doc async for doc in cursor}
+
+    # Dense series so charts don't have to fill gaps
+    step = timedelta(hours=1) if granularity == HOUR else timedelta(days=1)
+    series = []
+    bucket = bucket_start(start, granularity)
+    while bucket <= end:
+        doc = found.get(bucket, {})
+        series.append({
+            "bucket": bucket,
+            "units": doc.get("units", 0),
+            "revenue": doc.get("revenue", 0.0),
+            "orders": doc.get("orders", 0)
+        })
+        bucket += step
+    return series
+
+async def backfill(batch_size: int = 1000) -> int:
+    await ensure_indexes()
+    applied = 0
+    batch = []
+    for collection in ("orders", "orders_archive"):
+        async for order in db[collection].find({"status": "completed"}, {"items": 1, "created_at": 1}):
+            batch.append(order)
+            if len(batch) >= batch_size:
+                applied += await apply_orders(batch)
+                batch = []
+    if batch:
+        applied += await apply_orders(batch)
+    return applied
+
+async def backfill_once() -> int:
+    # Orders placed before rollups existed are only counted by a backfill. The first
+    # worker to start runs it; others skip it while it runs and once it has finished.
+    # A failed run is retried by a later start once the lock expires.
+    now = datetime.now(timezone.utc)
+    try:
+        state = await db.job_state.find_one_and_update(
+            {
+                "_id": BACKFILL_JOB_ID,
+                "completed_at": {"$exists": False},
+                "$or": [{"locked_until": {"$exists": False}}, {"locked_until": {"$lte": now}}]
+            },
+            {"$set": {"locked_until": now + BACKFILL_LOCK}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        state = None
+    if state is None:
+        return 0
+
+    applied = await backfill()
+    await db.job_state.update_one(
+        {"_id": BACKFILL_JOB_ID},
+        {"$set": {"completed_at": datetime.now(timezone.utc), "applied": applied}, "$unset": {"locked_until": ""}}
+    )
+    return applied
+
+if __name__ == "__main__":
+    # Usage: python rollups.py backfill
+    if sys.argv[1:] != ["backfill"]:
+        print("Usage: python rollups.py backfill")
+        sys.exit(1)
+    print(f"Rolled up {asyncio.run(backfill())} historical orders")
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from database import db
-from models import UserResponse, StorefrontResponse, ProductResponse, OrderResponse, UserRole
+from models import UserResponse, StorefrontResponse, ProductResponse, OrderResponse, UserRole, AdminOverviewResponse
+from overview import admin_overview
+import archive
 from auth import get_current_user
 from typing import List
 
@@ -14,6 +16,11 @@ async def check_admin(current_user: UserResponse = Depends(get_current_user)):
         )
     return current_user
 
+@router.get("/overview", response_model=AdminOverviewResponse)
+async def get_overview(admin: UserResponse = Depends(check_admin)):
+    # Totals for the dashboard without pulling the full lists below
+    return await admin_overview.get()
+
 @router.get("/users", response_model=List[UserResponse])
 async def list_all_users(admin: UserResponse = Depends(check_admin)):
     users_cursor = db.users.find({})
@@ -34,6 +41,5 @@ async def list_all_products(admin: UserResponse = Depends(check_admin)):
 
 @router.get("/orders", response_model=List[OrderResponse])
 async def list_all_orders(admin: UserResponse = Depends(check_admin)):
-    cursor = db.orders.find({})
-    orders = await cursor.to_list(length=1000)
+    orders = await archive.find_recent_orders({}, 1000)
     return [OrderResponse(**o) for o in orders]
\ No newline at end of file
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from models import UserResponse, UserRole, SalesAnalyticsResponse
+from auth import get_current_user
+from cache import cached_db
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import rollups
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+# Keep dense series bounded
+MAX_BUCKETS = {rollups.HOUR: 24 * 31, rollups.DAY: 366 * 3}
+DEFAULT_RANGE = {rollups.HOUR: timedelta(hours=48), rollups.DAY: timedelta(days=30)}
+
+@router.get("/storefront/{id}", response_model=SalesAnalyticsResponse)
+async def get_storefront_sales(
+    id: str,
+    start: Optional[datetime] = Query(default=None, alias="from"),
+    end: Optional[datetime] = Query(default=None, alias="to"),
+    granularity: str = rollups.DAY,
+    product_id: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    if granularity not in rollups.GRANULARITIES:
+        raise HTTPException(status_code=400, detail="Granularity must be 'hour' or 'day'")
+
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+
+    storefront = await cached_db.storefronts.find_by_id(id)
+    if not storefront:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Storefront not found"
+        )
+
+    # Sellers see their own store, parents their kids' stores, admins everything
+    allowed = (
+        current_user.role == UserRole.ADMIN
+        or str(storefront["kid_id"]) == str(current_user.id)
+        or str(storefront.get("parent_id")) == str(current_user.id)
+    )
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only view analytics for your own storefronts"
+        )
+
+    end = rollups.as_datetime(end) if end else datetime.now(timezone.utc)
+    start = rollups.as_datetime(start) if start else end - DEFAULT_RANGE[granularity]
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+    step = timedelta(hours=1) if granularity == rollups.HOUR else timedelta(days=1)
+    if (end - start) / step > MAX_BUCKETS[granularity]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range too large for {granularity} granularity (max {MAX_BUCKETS[granularity]} buckets)"
+        )
+
+    series = await rollups.query_series(id, granularity, start, end, product_id=product_id)
+    return {
+        "storefront_id": id,
+        "product_id": product_id,
+        "granularity": granularity,
+        "series": series
+    }
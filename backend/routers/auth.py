@@ -1,11 +1,16 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 from database import db
 from models import UserCreate, UserResponse, UserInDB, Token, UserRole, UserUpdate
-from auth import get_password_hash, verify_password, create_access_token, get_current_user
+from auth import get_password_hash_async, verify_password_async, create_access_token, get_current_user
 from config import settings
+from rate_limit import client_ip, login_throttle
+from cache import cached_db
+from logs import log_error
+import crud
 from bson import ObjectId
+import math
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -39,7 +44,7 @@ async def signup(user: UserCreate):
                 )
             parent_id = str(parent["_id"])
         
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
         
         user_data = {
             "email": user.email,
@@ -50,24 +55,32 @@ async def signup(user: UserCreate):
             "birthday": user.birthday
         }
 
-        new_user = await db.users.insert_one(user_data)
-        created_user = await db.users.find_one({"_id": new_user.inserted_id})
+        created_user = await crud.insert_one("users", user_data)
         return UserResponse(**created_user)
     except HTTPException as he:
         raise he
     except Exception as e:
-        print(f"Signup Error: {str(e)}") # Simple logging
+        log_error("POST /api/v1/auth/signup", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Internal Server Error: {str(e)}"
         )
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    # Throttle before the user lookup and bcrypt so rejected attempts cost next to nothing
+    allowed, retry_after = await login_throttle.check(form_data.username, client_ip(request))
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts. Please try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
     # OAuth2PasswordRequestForm expects 'username' and 'password' fields.
     # We are using email as username.
-    user = await db.users.find_one({"email": form_data.username})
-    if not user or not verify_password(form_data.password, user["password_hash"]):
+    user = await cached_db.users.find_one_by("email", form_data.username)
+    if not user or not await verify_password_async(form_data.password, user["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -89,15 +102,10 @@ async def update_user_me(user_update: UserUpdate, current_user: UserResponse = D
     update_data = {k: v for k, v in user_update.model_dump().items() if v is not None}
     
     if "password" in update_data:
-        update_data["password_hash"] = get_password_hash(update_data.pop("password"))
+        update_data["password_hash"] = await get_password_hash_async(update_data.pop("password"))
         
     if not update_data:
         return current_user
         
-    await db.users.update_one(
-        {"_id": ObjectId(current_user.id)},
-        {"$set": update_data}
-    )
-    
-    updated_user = await db.users.find_one({"_id": ObjectId(current_user.id)})
+    updated_user = await crud.update_one("users", {"_id": ObjectId(current_user.id)}, update_data)
     return UserResponse(**updated_user)
\ No newline at end of file
@@ -1,48 +1,82 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from database import db
+from fastapi import APIRouter, HTTPException, status, Depends, Response
+from database import db, client, use_transactions
 from models import OrderCreate, OrderResponse, OrderItem, UserResponse, UserRole
 from auth import get_current_user
+from loaders import Loaders, get_loaders
+from pymongo import ReturnDocument
+from config import settings
+from cache import cached_db
+from typing import Optional
+import base64
+import archive
+import changefeed
+import outbox
 from datetime import datetime, timezone
 from bson import ObjectId
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
+def _order_event(order_id, order_data: dict) -> dict:
+    # insert_one stamps _id onto order_data; the event carries it as a string instead
+    event = {k: v for k, v in order_data.items() if k != "_id"}
+    event["order_id"] = str(order_id)
+    return event
+
+@outbox.handler("order.created", "seller_notifications")
+async def notify_sellers(event: dict):
+    # One notification per storefront in the order; upserting on a deterministic
+    # _id keeps redelivery of the same event idempotent
+    items_by_storefront = {}
+    for item in event["items"]:
+        items_by_storefront.setdefault(item["storefront_id"], []).append(item)
+
+    for storefront_id, items in items_by_storefront.items():
+        await db.seller_notifications.update_one(
+            {"_id": f"{event['order_id']}:{storefront_id}"},
+            {"$setOnInsert": {
+                "type": "sale",
+                "order_id": event["order_id"],
+                "storefront_id": storefront_id,
+                "items": items,
+                "total": sum(item["price"] * item["quantity"] for item in items),
+                "read": False,
+                "created_at": event["created_at"]
+            }},
+            upsert=True
+        )
+
 @router.post("/", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
 async def create_order(
     order_create: OrderCreate,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserResponse = Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
 ):
     # 1. Validate items and calculate total
     order_items = []
     total_amount = 0.0
     
     for item in order_create.items:
-        try:
-            product = await db.products.find_one({"_id": ObjectId(item.product_id)})
-        except:
+        if not ObjectId.is_valid(item.product_id):
              raise HTTPException(status_code=400, detail=f"Invalid Product ID: {item.product_id}")
-             
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Product not found: {item.product_id}")
-            
-        if product["quantity"] < item.quantity:
-             raise HTTPException(
-                status_code=400, 
-                detail=f"Not enough stock for product: {product['name']}"
-            )
             
-        # Deduct inventory immediately (Optimistic locking for MVP)
+        # Check stock and deduct inventory in one conditional update (Optimistic locking for MVP)
         # In a real high-concurrency app, we'd use transactions or more robust checks
-        result = await db.products.update_one(
+        product = await db.products.find_one_and_update(
             {"_id": ObjectId(item.product_id), "quantity": {"$gte": item.quantity}},
-            {"$inc": {"quantity": -item.quantity}}
+            {"$inc": {"quantity": -item.quantity}},
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.modified_count == 0:
-             raise HTTPException(
+        if product is None:
+            # Slow path: tell a missing product apart from one without enough stock
+            existing = await loaders.products.load(item.product_id)
+            if not existing:
+                raise HTTPException(status_code=404, detail=f"Product not found: {item.product_id}")
+            raise HTTPException(
                 status_code=400, 
-                detail=f"Failed to secure stock for product: {product['name']}. Please try again."
+                detail=f"Not enough stock for product: {existing['name']}"
             )
+        changefeed.notify("products", "update", product["_id"], document=product, updated_fields=["quantity"])
 
         item_total = product["price"] * item.quantity
         total_amount += item_total
@@ -56,47 +90,88 @@ async def create_order(
         ))
         
     # 2. Create Order
+    # Native datetime (Mongo keeps millisecond precision) so history sorts and pages server-side
+    now = datetime.now(timezone.utc)
     order_data = {
         "buyer_id": str(current_user.id),
         "items": [item.model_dump() for item in order_items],
         "total": total_amount,
         "status": "completed", # Simulating immediate success for MVP
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": now.replace(microsecond=now.microsecond // 1000 * 1000)
     }
     
-    new_order = await db.orders.insert_one(order_data)
-    created_order = await db.orders.find_one({"_id": new_order.inserted_id})
-    
-    return OrderResponse(**created_order)
+    # 3. Commit the order together with its outbox entries; everything that follows
+    # checkout (notifications, rollups...) runs in the background outbox workers
+    if await use_transactions():
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                new_order = await db.orders.insert_one(order_data, session=session)
+                await outbox.enqueue("order.created", _order_event(new_order.inserted_id, order_data), session=session)
+    else:
+        new_order = await db.orders.insert_one(order_data)
+        await outbox.enqueue("order.created", _order_event(new_order.inserted_id, order_data))
+    outbox.wake()
+
+    # insert_one stamped _id onto order_data, which is exactly what was stored
+    return OrderResponse(**order_data)
+
+def _encode_cursor(order: dict) -> str:
+    # Opaque and URL-safe: "<created_at>|<_id>" in base64url. Legacy orders still hold
+    # ISO strings (see migrations.convert_order_dates) and are marked "s:", since Mongo
+    # sorts them apart from, and after, every real date.
+    created_at = order["created_at"]
+    value = created_at.isoformat() if isinstance(created_at, datetime) else f"s:{created_at}"
+    raw = f"{value}|{order['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if created_at.startswith("s:"):
+            return created_at[2:], ObjectId(order_id)
+        return datetime.fromisoformat(created_at), ObjectId(order_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _after_cursor(created_at, order_id) -> dict:
+    # Orders after the cursor in (created_at, _id) descending order. A comparison only
+    # matches values of its own BSON type, so past a date every string-dated order follows.
+    following = [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": order_id}}
+    ]
+    if isinstance(created_at, datetime):
+        following.append({"created_at": {"$type": "string"}})
+    return {"$or": following}
 
 @router.get("/mine", response_model=list[OrderResponse])
-async def get_my_orders(current_user: UserResponse = Depends(get_current_user)):
-    # If user is a buyer (or acting as one), show purchases
-    # If user is a seller, show sales? 
-    # The requirement says "Get orders for current user (Buyer view or Seller view)"
-    # Let's try to return both or merge them, or decide based on query param?
-    # For simplicity:
-    # 1. Find orders where I am the buyer
-    buyer_orders_cursor = db.orders.find({"buyer_id": str(current_user.id)})
-    buyer_orders = await buyer_orders_cursor.to_list(length=100)
-    
-    seller_orders = []
+async def get_my_orders(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    # Purchases (buyer view) and, for kid sellers, sales of their storefront (seller view),
+    # newest first. The next page's cursor comes back in the X-Next-Cursor header.
+    limit = max(1, min(limit or settings.ORDER_HISTORY_PAGE_SIZE, settings.ORDER_HISTORY_MAX_PAGE_SIZE))
+
+    branches = [{"buyer_id": str(current_user.id)}]
     if current_user.role == UserRole.KID_SELLER:
-        # Find orders that contain items from my storefront
-        storefront = await db.storefronts.find_one({"kid_id": str(current_user.id)})
+        storefront = await cached_db.storefronts.find_one_by("kid_id", str(current_user.id))
         if storefront:
-            storefront_id = str(storefront["_id"])
-            seller_orders_cursor = db.orders.find({"items.storefront_id": storefront_id})
-            seller_orders = await seller_orders_cursor.to_list(length=100)
-    
-    # Merge and deduplicate (though unlikely to overlap unless I buy my own stuff)
-    all_orders = {str(o["_id"]): o for o in buyer_orders + seller_orders}
-    
-    # Sort by date desc
-    sorted_orders = sorted(
-        all_orders.values(), 
-        key=lambda x: x.get("created_at", ""), 
-        reverse=True
-    )
-    
-    return [OrderResponse(**o) for o in sorted_orders]
\ No newline at end of file
+            branches.append({"items.storefront_id": str(storefront["_id"])})
+
+    # One query: Mongo merges the indexed $or branches already sorted by (created_at, _id)
+    query = {"$or": branches}
+    if cursor:
+        created_at, order_id = _decode_cursor(cursor)
+        query = {"$and": [query, _after_cursor(created_at, order_id)]}
+
+    # Archived history is only read once a page reaches back past the hot orders
+    orders = await archive.find_recent_orders(query, limit + 1)
+
+    if len(orders) > limit:
+        orders = orders[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(orders[-1])
+
+    return [OrderResponse(**o) for o in orders]
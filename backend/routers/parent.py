@@ -1,10 +1,16 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Body
+from fastapi import APIRouter, HTTPException, status, Depends, Body, Response
 from database import db
-from models import ProductResponse, UserRole, UserResponse, ProductStatus, UserBase, UserInDB
+from models import ProductResponse, UserRole, UserResponse, ProductStatus, UserBase, UserInDB, BulkApprovalRequest, BulkApprovalResult
 from auth import get_current_user
-from typing import List
+from config import settings
+from loaders import Loaders, get_loaders
+import changefeed
+import crud
+from typing import List, Optional
 from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime, timezone
+from pymongo import UpdateMany
 
 router = APIRouter(prefix="/parent", tags=["parent"])
 
@@ -22,42 +28,41 @@ async def get_my_children(current_user: UserResponse = Depends(get_current_user)
     return [UserResponse(**child) for child in children]
 
 @router.get("/approvals", response_model=List[ProductResponse])
-async def get_pending_approvals(current_user: UserResponse = Depends(get_current_user)):
+async def get_pending_approvals(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
+):
     if current_user.role != UserRole.PARENT_GUARDIAN:
          raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only parents can view pending approvals"
         )
-    
-    # 1. Get all children IDs
-    children_cursor = db.users.find({"parent_id": str(current_user.id)})
-    children = await children_cursor.to_list(length=100)
-    kid_ids = [str(child["_id"]) for child in children]
-    
-    if not kid_ids:
-        return []
+    limit = max(1, min(limit or settings.PARENT_APPROVALS_PAGE_SIZE, settings.PARENT_APPROVALS_MAX_PAGE_SIZE))
 
-    # 2. Get all storefronts for these kids
-    storefronts_cursor = db.storefronts.find({"kid_id": {"$in": kid_ids}})
-    storefronts = await storefronts_cursor.to_list(length=100)
-    storefront_ids = [str(sf["_id"]) for sf in storefronts]
-    
-    if not storefront_ids:
+    # 1. Products carry the denormalized parent_id, so the queue is one indexed query,
+    # oldest first. The next page's cursor (the last product id) is in X-Next-Cursor.
+    query = {"parent_id": str(current_user.id), "status": ProductStatus.PENDING_APPROVAL.value}
+    if cursor:
+        if not ObjectId.is_valid(cursor):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query["_id"] = {"$gt": ObjectId(cursor)}
+    products = await db.products.find(query).sort("_id", 1).limit(limit + 1).to_list(length=None)
+    if len(products) > limit:
+        products = products[:limit]
+        response.headers["X-Next-Cursor"] = str(products[-1]["_id"])
+
+    if not products:
         return []
 
-    # 3. Get pending products from these storefronts
-    products_cursor = db.products.find({
-        "storefront_id": {"$in": storefront_ids},
-        "status": ProductStatus.PENDING_APPROVAL.value
-    })
-    products = await products_cursor.to_list(length=100)
+    # 2. Enrich with storefront name (one batched query for all distinct storefronts)
+    storefronts = await loaders.storefronts.load_many(p["storefront_id"] for p in products)
 
-    # 4. Enrich with storefront name
-    storefront_map = {str(sf["_id"]): sf["display_name"] for sf in storefronts}
-    
     results = []
-    for p in products:
-        p["storefront_name"] = storefront_map.get(str(p["storefront_id"]), "Unknown Store")
+    for p, sf in zip(products, storefronts):
+        p["storefront_name"] = sf["display_name"] if sf else "Unknown Store"
         results.append(ProductResponse(**p))
     
     return results
@@ -70,52 +75,31 @@ async def get_parent_stats(current_user: UserResponse = Depends(get_current_user
             detail="Only parents can view stats"
         )
         
+    parent_id = str(current_user.id)
+
     # 1. Get Children count
-    children_cursor = db.users.find({"parent_id": str(current_user.id)})
-    children = await children_cursor.to_list(length=100)
-    kid_ids = [str(child["_id"]) for child in children]
-    linked_kid_sellers = len(children)
+    linked_kid_sellers = await db.users.count_documents({"parent_id": parent_id})
     
-    pending_approvals_count = 0
+    # 2. Get Pending Approvals count
+    pending_approvals_count = await db.products.count_documents({
+        "parent_id": parent_id,
+        "status": ProductStatus.PENDING_APPROVAL.value
+    })
+
+    # 3. Calculate Total Earnings
     total_child_earnings = 0.0
+    storefronts_cursor = db.storefronts.find({"parent_id": parent_id}, {"_id": 1})
+    storefront_ids = [str(sf["_id"]) for sf in await storefronts_cursor.to_list(length=settings.PARENT_MAX_STOREFRONTS)]
     
-    if kid_ids:
-        # 2. Get Pending Approvals count
-        # Get storefronts for kids
-        storefronts_cursor = db.storefronts.find({"kid_id": {"$in": kid_ids}})
-        storefronts = await storefronts_cursor.to_list(length=100)
-        storefront_ids = [str(sf["_id"]) for sf in storefronts]
-        
-        if storefront_ids:
-            # Count pending products
-            pending_approvals_count = await db.products.count_documents({
-                "storefront_id": {"$in": storefront_ids},
-                "status": ProductStatus.PENDING_APPROVAL.value
-            })
-            
-            # 3. Calculate Total Earnings
-            # Find orders where items.storefront_id is in our storefront_ids
-            # Since orders have items, and items have storefront_id, we need to aggregate or filter
-            # Simplified approach: Find orders that contain items from these storefronts
-            
-            pipeline = [
-                # Unwind items to process each item individually
-                {"$unwind": "$items"},
-                # Match items belonging to the kids' storefronts
-                {"$match": {
-                    "items.storefront_id": {"$in": storefront_ids},
-                    "status": "completed" # Only count completed orders
-                }},
-                # Group to sum the total earnings
-                {"$group": {
-                    "_id": None,
-                    "total_earnings": {"$sum": {"$multiply": ["$items.price", "$items.quantity"]}}
-                }}
-            ]
-            
-            result = await db.orders.aggregate(pipeline).to_list(length=1)
-            if result:
-                total_child_earnings = result[0]["total_earnings"]
+    if storefront_ids:
+        # All-time earnings from the storefronts' daily rollups (archived orders included),
+        # one small document per storefront and day instead of every order
+        result = await db.sales_rollups.aggregate([
+            {"$match": {"granularity": "day", "storefront_id": {"$in": storefront_ids}, "product_id": None}},
+            {"$group": {"_id": None, "total_earnings": {"$sum": "$revenue"}}}
+        ]).to_list(length=1)
+        if result:
+            total_child_earnings = result[0]["total_earnings"]
 
     return {
         "linked_kid_sellers": linked_kid_sellers,
@@ -123,11 +107,102 @@ async def get_parent_stats(current_user: UserResponse = Depends(get_current_user
         "total_child_earnings": total_child_earnings
     }
 
+@router.post("/approvals/bulk", response_model=List[BulkApprovalResult])
+async def bulk_approve_reject_products(
+    request: BulkApprovalRequest,
+    current_user: UserResponse = Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
+):
+    if current_user.role != UserRole.PARENT_GUARDIAN:
+         raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only parents can approve/reject products"
+        )
+
+    if len(request.items) > settings.BULK_APPROVAL_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BULK_APPROVAL_MAX_ITEMS} items can be processed per request"
+        )
+
+    # 1. Validate items locally before touching the database
+    errors = {}
+    object_ids = {}
+    seen = set()
+    for index, item in enumerate(request.items):
+        if item.product_id in seen:
+            errors[index] = "Duplicate product ID in request"
+            continue
+        seen.add(item.product_id)
+
+        if item.action not in ["approve", "reject"]:
+            errors[index] = "Action must be 'approve' or 'reject'"
+            continue
+
+        try:
+            object_ids[item.product_id] = ObjectId(item.product_id)
+        except (InvalidId, TypeError):
+            errors[index] = "Invalid Product ID"
+
+    # 2. Fetch the whole set (with its denormalized parent_id) in one query
+    docs = await loaders.products.load_many(object_ids)
+    resolved = {product_id: doc for product_id, doc in zip(object_ids, docs) if doc}
+
+    # 3. Verify parental relationship per item and group the updates by action
+    approve_ids = []
+    reject_ids = []
+    for index, item in enumerate(request.items):
+        if index in errors:
+            continue
+        doc = resolved.get(item.product_id)
+        if not doc:
+            errors[index] = "Product not found"
+        elif str(doc.get("parent_id")) != str(current_user.id):
+            errors[index] = "You are not the parent of this seller"
+        elif item.action == "approve":
+            approve_ids.append(object_ids[item.product_id])
+        else:
+            reject_ids.append(object_ids[item.product_id])
+
+    # 4. Apply every change in a single round trip
+    approval_fields = {
+        "parent_approved_by_user_id": str(current_user.id),
+        "parent_approval_date": datetime.now(timezone.utc).isoformat()
+    }
+    operations = []
+    if approve_ids:
+        operations.append(UpdateMany(
+            {"_id": {"$in": approve_ids}},
+            {"$set": {**approval_fields, "status": ProductStatus.ACTIVE.value}}
+        ))
+    if reject_ids:
+        operations.append(UpdateMany(
+            {"_id": {"$in": reject_ids}},
+            {"$set": {**approval_fields, "status": ProductStatus.REJECTED.value}}
+        ))
+    if operations:
+        await db.products.bulk_write(operations, ordered=False)
+        for product_ids, new_status in ((approve_ids, ProductStatus.ACTIVE), (reject_ids, ProductStatus.REJECTED)):
+            for product_id in product_ids:
+                document = {**resolved[str(product_id)], **approval_fields, "status": new_status.value}
+                changefeed.notify("products", "update", product_id, document=document, updated_fields=["status"])
+
+    results = []
+    for index, item in enumerate(request.items):
+        if index in errors:
+            results.append(BulkApprovalResult(product_id=item.product_id, success=False, detail=errors[index]))
+        else:
+            new_status = ProductStatus.ACTIVE if item.action == "approve" else ProductStatus.REJECTED
+            results.append(BulkApprovalResult(product_id=item.product_id, success=True, status=new_status))
+
+    return results
+
 @router.post("/approvals/{product_id}")
 async def approve_reject_product(
     product_id: str, 
     action: str = Body(..., embed=True), # Expects {"action": "approve"} or {"action": "reject"}
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserResponse = Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
 ):
     if current_user.role != UserRole.PARENT_GUARDIAN:
          raise HTTPException(
@@ -141,28 +216,8 @@ async def approve_reject_product(
             detail="Action must be 'approve' or 'reject'"
         )
 
-    try:
-        product = await db.products.find_one({"_id": ObjectId(product_id)})
-    except:
+    if not ObjectId.is_valid(product_id):
         raise HTTPException(status_code=400, detail="Invalid Product ID")
-    
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-
-    # Verify parental relationship
-    storefront = await db.storefronts.find_one({"_id": ObjectId(product["storefront_id"])})
-    if not storefront:
-        raise HTTPException(status_code=404, detail="Storefront not found")
-    
-    kid = await db.users.find_one({"_id": ObjectId(storefront["kid_id"])})
-    if not kid:
-        raise HTTPException(status_code=404, detail="Kid account not found")
-        
-    if str(kid.get("parent_id")) != str(current_user.id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You are not the parent of this seller"
-        )
 
     new_status = ProductStatus.ACTIVE.value if action == "approve" else ProductStatus.REJECTED.value
     
@@ -172,9 +227,18 @@ async def approve_reject_product(
         "parent_approval_date": datetime.now(timezone.utc).isoformat()
     }
 
-    await db.products.update_one(
-        {"_id": ObjectId(product_id)},
-        {"$set": update_data}
+    # The parental relationship (via the denormalized parent_id) is part of the filter
+    product = await crud.update_one(
+        "products",
+        {"_id": ObjectId(product_id), "parent_id": str(current_user.id)},
+        update_data
     )
-    
+    if not product:
+        if not await loaders.products.load(product_id):
+            raise HTTPException(status_code=404, detail="Product not found")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not the parent of this seller"
+        )
+
     return {"message": f"Product {action}d successfully"}
\ No newline at end of file
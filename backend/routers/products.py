@@ -1,48 +1,175 @@
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from database import db
-from models import ProductCreate, ProductResponse, ProductUpdate, UserRole, UserResponse, ProductStatus
+from models import ProductCreate, ProductResponse, ProductUpdate, UserRole, UserResponse, ProductStatus, ProductImportResult, ProductImportError, SuggestionResponse, UploadRequest, UploadTicket
 from auth import get_current_user
+from cache import cached_db
+from config import settings
+from events import product_events
+from product_import import detect_format, parse_products, read_batch
+from loaders import Loaders, get_loaders
+from storage import LocalStorage, get_storage, new_upload_key
+from suggest import suggest_index
+from pydantic import TypeAdapter
+from pymongo.errors import BulkWriteError
+from singleflight import SingleFlight
+import changefeed
+import crud
 from typing import List, Optional
 from bson import ObjectId
-import shutil
-import os
-import uuid
 
 router = APIRouter(prefix="/products", tags=["products"])
 
-# Get the absolute path to the backend directory
-BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-UPLOAD_DIR = os.path.join(BACKEND_DIR, "static", "uploads")
+# Identical concurrent marketplace queries share one query and one serialized body.
+# Listings show product and storefront fields, so a write to either starts fresh calls.
+marketplace_flight = SingleFlight()
+changefeed.subscribe("products", lambda change: marketplace_flight.forget())
+changefeed.subscribe("storefronts", lambda change: marketplace_flight.forget())
+_product_list = TypeAdapter(List[ProductResponse])
 
-# Ensure the upload directory exists
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
-
-@router.post("/upload")
-async def upload_image(file: UploadFile = File(...), current_user: UserResponse = Depends(get_current_user)):
+def _require_kid(current_user: UserResponse):
     if current_user.role != UserRole.KID_SELLER:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only kids can upload product images"
         )
-    
+
+@router.post("/upload")
+async def upload_image(file: UploadFile = File(...), current_user: UserResponse = Depends(get_current_user)):
+    # Proxied upload, kept for older clients; new clients ask /uploads for a presigned URL
+    _require_kid(current_user)
+    if file.content_type not in settings.UPLOAD_CONTENT_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image type")
+    if file.size is not None and file.size > settings.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image is too large")
     try:
-        # Generate unique filename
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        # Return the relative URL
-        # In production this would be a full URL or cloud storage path
-        # The 'static' mount in main.py maps /static to backend/static
-        url = f"/static/uploads/{unique_filename}"
-        return {"url": url, "filename": file.filename}
+        storage = get_storage()
+        key = new_upload_key(file.content_type)
+        # The copy is blocking file/network I/O: keep it off the event loop
+        await run_in_threadpool(storage.save, key, file.file, file.content_type)
+        return {"url": storage.public_url(key), "filename": file.filename}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Could not upload image: {str(e)}")
 
+@router.post("/uploads", response_model=UploadTicket)
+async def create_upload(upload: UploadRequest, current_user: UserResponse = Depends(get_current_user)):
+    # The browser sends the file straight to storage with the returned ticket, then saves
+    # `url` in the product's images; no image bytes pass through the API
+    _require_kid(current_user)
+    if upload.content_type not in settings.UPLOAD_CONTENT_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image type")
+    if upload.size > settings.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image is too large")
+
+    storage = get_storage()
+    key = new_upload_key(upload.content_type)
+    return UploadTicket(
+        key=key,
+        url=storage.public_url(key),
+        expires_in=settings.UPLOAD_URL_EXPIRES_SECONDS,
+        **storage.presign_upload(key, upload.content_type, settings.UPLOAD_URL_EXPIRES_SECONDS)
+    )
+
+@router.put("/uploads/{key:path}", status_code=status.HTTP_204_NO_CONTENT)
+async def receive_upload(key: str, request: Request, expires: int, signature: str):
+    # Target of the local backend's presigned URLs; the signature stands in for auth
+    storage = get_storage()
+    content_type = request.headers.get("content-type", "")
+    if not isinstance(storage, LocalStorage) or not storage.verify(key, content_type, expires, signature):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired upload URL")
+
+    received = 0
+    buffer = await run_in_threadpool(storage.open_for_write, key)
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > settings.UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image is too large")
+            await run_in_threadpool(buffer.write, chunk)
+    except BaseException:
+        await run_in_threadpool(buffer.close)
+        await run_in_threadpool(storage.delete, key)
+        raise
+    await run_in_threadpool(buffer.close)
+
+@router.post("/import", response_model=ProductImportResult)
+async def import_products(file: UploadFile = File(...), current_user: UserResponse = Depends(get_current_user)):
+    if current_user.role != UserRole.KID_SELLER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only kids can create products"
+        )
+
+    file_format = detect_format(file.filename, file.content_type)
+    if not file_format:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload a .csv or .jsonl file"
+        )
+
+    storefront = await cached_db.storefronts.find_one_by("kid_id", str(current_user.id))
+    if not storefront:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You must create a storefront before adding products"
+        )
+
+    defaults = {
+        "storefront_id": str(storefront["_id"]),
+        "kid_id": str(current_user.id),
+        "parent_id": current_user.parent_id,
+        "status": ProductStatus.PENDING_APPROVAL.value
+    }
+    inserted = 0
+    errors = []
+    batch = [] # (row number, document)
+
+    async def flush():
+        nonlocal inserted
+        if not batch:
+            return
+        documents = [doc for _, doc in batch]
+        try:
+            result = await db.products.insert_many(documents, ordered=False)
+            inserted_ids = result.inserted_ids
+        except BulkWriteError as e:
+            # Unordered: everything except the reported rows was written
+            failed = {error["index"]: error["errmsg"] for error in e.details.get("writeErrors", [])}
+            for index, message in failed.items():
+                errors.append(ProductImportError(row=batch[index][0], error=message))
+            inserted_ids = [doc["_id"] for index, doc in enumerate(documents) if index not in failed]
+        inserted += len(inserted_ids)
+        for product_id in inserted_ids:
+            changefeed.notify("products", "insert", product_id)
+        batch.clear()
+
+    rows = parse_products(file.file, file_format)
+    rows_seen = 0
+    while True:
+        # Parsing is CPU-bound; one batch at a time in a worker thread. One row past
+        # the limit is read to tell a truncated file from one that fits exactly.
+        size = min(settings.PRODUCT_IMPORT_BATCH_SIZE, settings.PRODUCT_IMPORT_MAX_ROWS + 1 - rows_seen)
+        parsed, parse_error = await run_in_threadpool(read_batch, rows, size)
+        truncated = rows_seen + len(parsed) > settings.PRODUCT_IMPORT_MAX_ROWS
+        for row_number, product, error in parsed[:settings.PRODUCT_IMPORT_MAX_ROWS - rows_seen]:
+            if error:
+                errors.append(ProductImportError(row=row_number, error=error))
+            else:
+                batch.append((row_number, {**product.model_dump(), **defaults}))
+        rows_seen += len(parsed)
+        await flush()
+        if parse_error:
+            errors.append(ProductImportError(row=rows_seen + 1, error=f"Could not parse file: {parse_error}"))
+        if truncated or parse_error or len(parsed) < size:
+            break
+
+    errors.sort(key=lambda e: e.row)
+    notice = None
+    if truncated:
+        notice = f"Import limit of {settings.PRODUCT_IMPORT_MAX_ROWS} rows reached; remaining rows were skipped"
+    return ProductImportResult(inserted=inserted, failed=len(errors), errors=errors, truncated=truncated, notice=notice)
+
 @router.post("/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(
     product: ProductCreate,
@@ -55,7 +182,7 @@ async def create_product(
         )
     
     # Get kid's storefront
-    storefront = await db.storefronts.find_one({"kid_id": str(current_user.id)})
+    storefront = await cached_db.storefronts.find_one_by("kid_id", str(current_user.id))
     if not storefront:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -64,11 +191,11 @@ async def create_product(
         
     product_data = product.model_dump()
     product_data["storefront_id"] = str(storefront["_id"])
+    product_data["kid_id"] = str(current_user.id)
+    product_data["parent_id"] = current_user.parent_id
     product_data["status"] = ProductStatus.PENDING_APPROVAL.value
     
-    new_product = await db.products.insert_one(product_data)
-    created_product = await db.products.find_one({"_id": new_product.inserted_id})
-    
+    created_product = await crud.insert_one("products", product_data)
     return ProductResponse(**created_product)
 
 @router.get("/", response_model=List[ProductResponse])
@@ -86,7 +213,7 @@ async def list_products(
 
     if seller_id and seller_id != "me":
         # Check if it's a kid_id
-        storefront = await db.storefronts.find_one({"kid_id": seller_id})
+        storefront = await cached_db.storefronts.find_one_by("kid_id", seller_id)
         if storefront:
              query["storefront_id"] = str(storefront["_id"])
         else:
@@ -106,37 +233,123 @@ async def list_products(
     products = await products_cursor.to_list(length=100)
     return [ProductResponse(**p) for p in products]
 
+# Marketplace orderings; newest first matches the catalog's ObjectId-time order
+MARKETPLACE_SORTS = {
+    "newest": [("_id", -1)],
+    "price_asc": [("price", 1), ("_id", -1)],
+    "price_desc": [("price", -1), ("_id", -1)]
+}
+
+def _catalog():
+    # The catalog pulls in NumPy, so it's only imported (by the lifespan) when enabled
+    if not settings.CATALOG_ENABLED:
+        return None
+    from catalog import product_catalog
+    return product_catalog if product_catalog.ready else None
+
+async def _marketplace_json(search: Optional[str], filters: dict, loaders: Loaders) -> bytes:
+    catalog = None if search else _catalog()
+    if catalog is not None:
+        # Filtered, sorted and paged in memory; Mongo only hydrates the page
+        ids = catalog.query(**filters)
+        found = {str(p["_id"]): p async for p in db.products.find({"_id": {"$in": [ObjectId(i) for i in ids]}})}
+        # A row can trail a write by one change event; don't list what no longer qualifies
+        products = [
+            found[i] for i in ids
+            if i in found and found[i].get("status") == ProductStatus.ACTIVE.value and found[i].get("quantity", 0) > 0
+        ]
+    else:
+        query = {
+            "status": ProductStatus.ACTIVE.value,
+            "quantity": {"$gt": 0}
+        }
+        if filters["min_price"] is not None or filters["max_price"] is not None:
+            query["price"] = {}
+            if filters["min_price"] is not None:
+                query["price"]["$gte"] = filters["min_price"]
+            if filters["max_price"] is not None:
+                query["price"]["$lte"] = filters["max_price"]
+        if filters["storefront_id"]:
+            query["storefront_id"] = filters["storefront_id"]
+
+        if search:
+            query["$or"] = [
+                {"name": {"$regex": search, "$options": "i"}},
+                {"description": {"$regex": search, "$options": "i"}}
+            ]
+
+        products_cursor = db.products.find(query).sort(MARKETPLACE_SORTS[filters["sort"]])
+        products = await products_cursor.skip(filters["skip"]).limit(filters["limit"]).to_list(length=filters["limit"])
+
+    # Enrich with storefront name; the loader fetches all distinct storefronts in one query
+    storefronts = await loaders.storefronts.load_many(p["storefront_id"] for p in products)
+    for p, sf in zip(products, storefronts):
+        p["storefront_name"] = sf["display_name"] if sf else "Unknown Store"
+
+    # Serialized once for every caller sharing the result, as the response_model would
+    return _product_list.dump_json([ProductResponse(**p) for p in products], by_alias=True)
+
 @router.get("/marketplace", response_model=List[ProductResponse])
-async def list_marketplace_products(search: Optional[str] = None):
+async def list_marketplace_products(
+    search: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    storefront_id: Optional[str] = None,
+    sort: str = "newest",
+    skip: int = 0,
+    limit: Optional[int] = None,
+    loaders: Loaders = Depends(get_loaders)
+):
     # Treat empty string as None
     if search is not None and search.strip() == "":
         search = None
+    if sort not in MARKETPLACE_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(MARKETPLACE_SORTS)}")
+    if skip < 0:
+        raise HTTPException(status_code=400, detail="skip must not be negative")
 
-    query = {
-        "status": ProductStatus.ACTIVE.value,
-        "quantity": {"$gt": 0}
+    filters = {
+        "min_price": min_price,
+        "max_price": max_price,
+        "storefront_id": storefront_id or None,
+        "sort": sort,
+        "skip": skip,
+        "limit": max(1, min(limit or settings.MARKETPLACE_PAGE_SIZE, settings.MARKETPLACE_MAX_PAGE_SIZE))
     }
-    
-    if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
-        
-    products_cursor = db.products.find(query)
-    products = await products_cursor.to_list(length=100)
-    
-    # Enrich with storefront name efficiently
-    if products:
-        storefront_ids = list(set([p["storefront_id"] for p in products]))
-        storefronts_cursor = db.storefronts.find({"_id": {"$in": [ObjectId(sid) for sid in storefront_ids]}})
-        storefronts = await storefronts_cursor.to_list(length=len(storefront_ids))
-        storefront_map = {str(sf["_id"]): sf["display_name"] for sf in storefronts}
-        
-        for p in products:
-            p["storefront_name"] = storefront_map.get(str(p["storefront_id"]), "Unknown Store")
-            
-    return [ProductResponse(**p) for p in products]
+    key = (search, *filters.values())
+    body = await marketplace_flight.do(key, lambda: _marketplace_json(search, filters, loaders))
+    return Response(content=body, media_type="application/json")
+
+@router.get("/suggest", response_model=List[SuggestionResponse])
+async def suggest_products(q: str = "", limit: int = 8):
+    # Search-as-you-type: served from the in-memory prefix index, never from Mongo
+    limit = max(1, min(limit, settings.SUGGEST_MAX_RESULTS))
+    return suggest_index.suggest(q, limit)
+
+@router.get("/events")
+async def stream_product_events(last_event_id: Optional[str] = Header(default=None)):
+    # Live marketplace feed: product.approved, product.stock, product.updated,
+    # product.unlisted (no longer active), product.deleted
+    if len(product_events) >= settings.SSE_MAX_CLIENTS:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live connections, please retry later"
+        )
+
+    subscriber = product_events.subscribe(last_event_id)
+
+    async def event_stream():
+        try:
+            async for chunk in product_events.stream(subscriber):
+                yield chunk
+        finally:
+            product_events.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/mine", response_model=List[ProductResponse])
 async def list_my_products(current_user: UserResponse = Depends(get_current_user)):
@@ -146,7 +359,7 @@ async def list_my_products(current_user: UserResponse = Depends(get_current_user
             detail="Only kids have products"
         )
         
-    storefront = await db.storefronts.find_one({"kid_id": str(current_user.id)})
+    storefront = await cached_db.storefronts.find_one_by("kid_id", str(current_user.id))
     if not storefront:
         return []
 
@@ -156,68 +369,77 @@ async def list_my_products(current_user: UserResponse = Depends(get_current_user
 
 @router.get("/{id}", response_model=ProductResponse)
 async def get_product(id: str):
-    try:
-        product = await db.products.find_one({"_id": ObjectId(id)})
-    except:
+    if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID")
+
+    product = await cached_db.products.find_by_id(id)
         
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
         
     return ProductResponse(**product)
 
+@router.get("/{id}/related", response_model=List[ProductResponse])
+async def get_related_products(id: str, limit: int = 6):
+    # Served from the table precomputed by recommendations.py
+    related = await db.product_related.find_one({"_id": id}, {"related": 1})
+    if not related or not related.get("related"):
+        return []
+
+    related_ids = [entry["product_id"] for entry in related["related"][:max(1, min(limit, settings.RECOMMENDATIONS_TOP_K))]]
+    products_cursor = db.products.find({
+        "_id": {"$in": [ObjectId(pid) for pid in related_ids if ObjectId.is_valid(pid)]},
+        "status": ProductStatus.ACTIVE.value,
+        "quantity": {"$gt": 0}
+    })
+    products = {str(p["_id"]): p for p in await products_cursor.to_list(length=len(related_ids))}
+    # Keep the ranking order
+    return [ProductResponse(**products[pid]) for pid in related_ids if pid in products]
+
+async def _ownership_error(id: str, action: str, loaders: Loaders):
+    # Slow path after an owner-filtered write matched nothing: missing or not yours?
+    if not await loaders.products.load(id):
+        return HTTPException(status_code=404, detail="Product not found")
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"You can only {action} your own products"
+    )
+
 @router.patch("/{id}", response_model=ProductResponse)
 async def update_product(
     id: str,
     product_update: ProductUpdate,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserResponse = Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
 ):
-    try:
-        product = await db.products.find_one({"_id": ObjectId(id)})
-    except:
+    if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID")
         
-    if not product:
-         raise HTTPException(status_code=404, detail="Product not found")
-         
-    # Check ownership via storefront
-    storefront = await db.storefronts.find_one({"_id": ObjectId(product["storefront_id"])})
-    if not storefront or str(storefront["kid_id"]) != str(current_user.id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only edit your own products"
-        )
-        
     update_data = {k: v for k, v in product_update.model_dump().items() if v is not None}
     
+    # Products carry their seller's kid_id, so ownership is part of the filter
+    owned = {"_id": ObjectId(id), "kid_id": str(current_user.id)}
     if update_data:
         # If important fields are changed, maybe reset status to pending_approval?
         # For now, let's keep it simple.
-        await db.products.update_one(
-            {"_id": ObjectId(id)},
-            {"$set": update_data}
-        )
-        
-    updated_product = await db.products.find_one({"_id": ObjectId(id)})
+        updated_product = await crud.update_one("products", owned, update_data)
+    else:
+        # Nothing to change: one read, memoized for the ownership check below
+        product = await loaders.products.load(id)
+        updated_product = product if product and product.get("kid_id") == str(current_user.id) else None
+
+    if not updated_product:
+        raise await _ownership_error(id, "edit", loaders)
+
     return ProductResponse(**updated_product)
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_product(id: str, current_user: UserResponse = Depends(get_current_user)):
-    try:
-        product = await db.products.find_one({"_id": ObjectId(id)})
-    except:
+async def delete_product(id: str, current_user: UserResponse = Depends(get_current_user), loaders: Loaders = Depends(get_loaders)):
+    if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID")
 
+    product = await crud.delete_one("products", {"_id": ObjectId(id), "kid_id": str(current_user.id)})
     if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-
-    # Check ownership via storefront
-    storefront = await db.storefronts.find_one({"_id": ObjectId(product["storefront_id"])})
-    if not storefront or str(storefront["kid_id"]) != str(current_user.id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only delete your own products"
-        )
+        raise await _ownership_error(id, "delete", loaders)
 
-    await db.products.delete_one({"_id": ObjectId(id)})
-    return None
\ No newline at end of file
+    return None
@@ -1,12 +1,22 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Body
-from database import db
-from models import StorefrontCreate, StorefrontResponse, StorefrontUpdate, UserRole, UserResponse
+from models import (
+    ProductResponse, ProductStatus, StorefrontCreate, StorefrontPage, StorefrontResponse,
+    StorefrontUpdate, UserRole, UserResponse
+)
 from auth import get_current_user
-from typing import List
+from cache import cached_db, storefront_pages
+from config import settings
+from database import db
+from loaders import Loaders, get_loaders
+from singleflight import SingleFlight
+import crud
+from typing import Optional
 from bson import ObjectId
 
 router = APIRouter(prefix="/storefronts", tags=["storefronts"])
 
+page_flight = SingleFlight()
+
 @router.post("/", response_model=StorefrontResponse, status_code=status.HTTP_201_CREATED)
 async def create_storefront(
     storefront: StorefrontCreate,
@@ -19,7 +29,7 @@ async def create_storefront(
         )
     
     # Check if kid already has a storefront
-    existing_storefront = await db.storefronts.find_one({"kid_id": str(current_user.id)})
+    existing_storefront = await cached_db.storefronts.find_one_by("kid_id", str(current_user.id))
     if existing_storefront:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -28,10 +38,9 @@ async def create_storefront(
 
     storefront_data = storefront.model_dump()
     storefront_data["kid_id"] = str(current_user.id)
+    storefront_data["parent_id"] = current_user.parent_id
     
-    new_storefront = await db.storefronts.insert_one(storefront_data)
-    created_storefront = await db.storefronts.find_one({"_id": new_storefront.inserted_id})
-    
+    created_storefront = await crud.insert_one("storefronts", storefront_data)
     return StorefrontResponse(**created_storefront)
 
 @router.get("/mine", response_model=StorefrontResponse)
@@ -42,7 +51,7 @@ async def get_my_storefront(current_user: UserResponse = Depends(get_current_use
              detail="Only kids have storefronts"
         )
         
-    storefront = await db.storefronts.find_one({"kid_id": str(current_user.id)})
+    storefront = await cached_db.storefronts.find_one_by("kid_id", str(current_user.id))
     if not storefront:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -53,11 +62,11 @@ async def get_my_storefront(current_user: UserResponse = Depends(get_current_use
 
 @router.get("/{id}", response_model=StorefrontResponse)
 async def get_storefront(id: str):
-    try:
-        storefront = await db.storefronts.find_one({"_id": ObjectId(id)})
-    except:
+    if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
 
+    storefront = await cached_db.storefronts.find_by_id(id)
+
     if not storefront:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -66,37 +75,93 @@ async def get_storefront(id: str):
     
     return StorefrontResponse(**storefront)
 
+async def _load_storefront_page(id: str, cursor: Optional[str], limit: int, version: int) -> StorefrontPage:
+    product_match = {"storefront_id": id, "status": ProductStatus.ACTIVE.value}
+    if cursor:
+        product_match["_id"] = {"$lt": ObjectId(cursor)}
+    pipeline = [
+        {"$match": {"_id": ObjectId(id)}},
+        # The storefront id is known up front, so the sub-pipeline is uncorrelated and
+        # walks the (storefront_id, status, _id) index directly
+        {"$lookup": {
+            "from": "products",
+            "pipeline": [
+                {"$match": product_match},
+                {"$sort": {"_id": -1}},
+                {"$limit": limit + 1}
+            ],
+            "as": "products"
+        }}
+    ]
+    docs = await db.storefronts.aggregate(pipeline).to_list(length=1)
+    if not docs:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Storefront not found"
+        )
+
+    storefront = docs[0]
+    products = storefront.pop("products")
+    next_cursor = str(products[limit - 1]["_id"]) if len(products) > limit else None
+    products = products[:limit]
+    for p in products:
+        p["storefront_name"] = storefront.get("display_name")
+
+    page = StorefrontPage(
+        storefront=StorefrontResponse(**storefront),
+        products=[ProductResponse(**p) for p in products],
+        next_cursor=next_cursor
+    )
+    storefront_pages.store(id, cursor, limit, page, [str(p["_id"]) for p in products], version)
+    return page
+
+@router.get("/{id}/page", response_model=StorefrontPage)
+async def get_storefront_page(id: str, cursor: Optional[str] = None, limit: Optional[int] = None):
+    # Everything a public storefront page renders, from one aggregation. Products are
+    # newest first; pass next_cursor back as cursor for the following page.
+    if not ObjectId.is_valid(id) or (cursor is not None and not ObjectId.is_valid(cursor)):
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+    limit = min(max(limit or settings.STOREFRONT_PAGE_SIZE, 1), settings.STOREFRONT_PAGE_MAX_SIZE)
+
+    page = storefront_pages.get(id, cursor, limit)
+    if page is not None:
+        return page
+
+    # A burst of misses for the same page (popular storefront, after an eviction)
+    # shares one aggregation
+    version = storefront_pages.version()
+    return await page_flight.do((id, cursor, limit, version), lambda: _load_storefront_page(id, cursor, limit, version))
+
 @router.patch("/{id}", response_model=StorefrontResponse)
 async def update_storefront(
     id: str,
     storefront_update: StorefrontUpdate,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserResponse = Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
 ):
-    try:
-        storefront = await db.storefronts.find_one({"_id": ObjectId(id)})
-    except:
+    if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
 
-    if not storefront:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Storefront not found"
-        )
-        
-    # Ensure ownership
-    if str(storefront["kid_id"]) != str(current_user.id):
+    update_data = {k: v for k, v in storefront_update.model_dump().items() if v is not None}
+
+    # Ownership is part of the filter, so the update and the check are one round trip
+    owned = {"_id": ObjectId(id), "kid_id": str(current_user.id)}
+    if update_data:
+        updated_storefront = await crud.update_one("storefronts", owned, update_data)
+    else:
+        # Nothing to change: one read, memoized for the ownership check below
+        storefront = await loaders.storefronts.load(id)
+        updated_storefront = storefront if storefront and storefront.get("kid_id") == str(current_user.id) else None
+
+    if not updated_storefront:
+        if not await loaders.storefronts.load(id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Storefront not found"
+            )
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You can only edit your own storefront"
         )
 
-    update_data = {k: v for k, v in storefront_update.model_dump().items() if v is not None}
-
-    if update_data:
-        await db.storefronts.update_one(
-            {"_id": ObjectId(id)},
-            {"$set": update_data}
-        )
-        
-    updated_storefront = await db.storefronts.find_one({"_id": ObjectId(id)})
     return StorefrontResponse(**updated_storefront)
\ No newline at end of file
@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import bisect
+import itertools
+import random
+import struct
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from database import db
+from models import ProductStatus, StorefrontStatus, UserRole
+
+# Bulk synthetic data for scale testing: users with parent/kid links, storefronts,
+# products across every status and orders with realistic sizes and timestamps.
+# Same arguments + same --seed (+ same --end) => the same documents, _ids included.
+#
+# Usage: python seed.py [--scale 0.01] [--drop] [--users N] [--orders N] ...
+# Every seeded account's password is "password123".
+
+PASSWORD = "password123"
+
+WORDS = [
+    "bracelet", "beaded", "clay", "mug", "painted", "rock", "card", "knitted", "scarf", "bookmark",
+    "slime", "keychain", "sticker", "candle", "soap", "pouch", "origami", "lanyard", "charm", "coaster",
+]
+ADJECTIVES = ["handmade", "sparkly", "tiny", "cosy", "rainbow", "glow-in-the-dark", "custom", "upcycled", "mini", "giant"]
+FIRST_NAMES = ["Maya", "Leo", "Ava", "Noah", "Zara", "Eli", "Mila", "Omar", "Ivy", "Kai", "Nina", "Sam"]
+
+# Share of products per status; sold_out products get quantity 0
+STATUS_WEIGHTS = [
+    (ProductStatus.ACTIVE, 70),
+    (ProductStatus.PENDING_APPROVAL, 15),
+    (ProductStatus.REJECTED, 5),
+    (ProductStatus.SOLD_OUT, 10),
+]
+# Items per order: mostly single-item checkouts with a tail of bigger baskets
+ITEMS_PER_ORDER = [(1, 60), (2, 25), (3, 10), (4, 4), (6, 1)]
+# Relative order volume per hour of day (UTC): quiet nights, after-school peak
+HOURLY_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 4, 5, 5, 6, 6, 7, 7, 8, 10, 12, 12, 11, 10, 8, 5, 3, 2]
+HOURLY_CUMULATIVE = list(itertools.accumulate(HOURLY_WEIGHTS))
+
+class Generator:
+    def __init__(self, seed: int, end: datetime):
+        self.rng = random.Random(seed)
+        self.end = end
+
+    def object_id(self, moment: datetime) -> ObjectId:
+        # Deterministic ObjectIds that still embed (and sort by) their creation time
+        return ObjectId(struct.pack(">I", int(moment.timestamp())) + self.rng.randbytes(8))
+
+    def name(self, i: int) -> str:
+        return f"{self.rng.choice(FIRST_NAMES)} {i}"
+
+    def product_name(self) -> str:
+        return f"{self.rng.choice(ADJECTIVES)} {self.rng.choice(WORDS)}".title()
+
+    def sentence(self, words: int) -> str:
+        return " ".join(self.rng.choice(WORDS + ADJECTIVES) for _ in range(words)).capitalize() + "."
+
+def weighted_picker(rng: random.Random, weighted):
+    values = [value for value, _ in weighted]
+    cumulative = list(itertools.accumulate(weight for _, weight in weighted))
+    return lambda: values[bisect.bisect(cumulative, rng.random() * cumulative[-1])]
+
+def skewed_index(rng: random.Random, size: int, skew: float = 1.2) -> int:
+    # Popularity skew: low indexes (the "bestsellers") are picked far more often
+    return min(size - 1, int(size * rng.random() ** (1 + skew)))
+
+class BatchWriter:
+    # Unordered insert_many batches with a few in flight while the next one is generated
+    def __init__(self, collection: str, batch_size: int, concurrency: int):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.pending = set()
+        self.batch = []
+        self.inserted = 0
+
+    async def add(self, document: dict):
+        self.batch.append(document)
+        if len(self.batch) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        await self.semaphore.acquire()
+        task = asyncio.create_task(self._insert(batch))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _insert(self, batch):
+        try:
+            await db[self.collection].insert_many(batch, ordered=False)
+            self.inserted += len(batch)
+        finally:
+            self.semaphore.release()
+
+    async def close(self) -> int:
+        await self.flush()
+        if self.pending:
+            await asyncio.gather(*self.pending)
+        return self.inserted
+
+async def seed_users(gen: Generator, count: int, password_hash: str, writer_args):
+    # 30% parents, 30% kids (each linked to a parent), the rest buyers, plus one admin
+    parents = max(1, count * 3 // 10)
+    kids = max(1, count * 3 // 10)
+    buyers = max(0, count - parents - kids - 1)
+    created = gen.end - timedelta(days=400)
+    writer = BatchWriter("users", *writer_args)
+
+    parent_ids, kid_parents, buyer_ids = [], [], []
+    await writer.add({
+        "_id": gen.object_id(created), "email": "admin@seed.example.com", "display_name": "Admin",
+        "role": UserRole.ADMIN.value, "password_hash": password_hash, "parent_id": None, "birthday": None
+    })
+    for i in range(parents):
+        _id = gen.object_id(created)
+        parent_ids.append(str(_id))
+        await writer.add({
+            "_id": _id, "email": f"parent{i}@seed.example.com", "display_name": gen.name(i),
+            "role": UserRole.PARENT_GUARDIAN.value, "password_hash": password_hash, "parent_id": None, "birthday": None
+        })
+    for i in range(kids):
+        _id = gen.object_id(created)
+        parent_id = gen.rng.choice(parent_ids)
+        kid_parents.append((str(_id), parent_id))
+        birthday = f"{gen.rng.randint(2008, 2018)}-{gen.rng.randint(1, 12):02d}-{gen.rng.randint(1, 28):02d}"
+        await writer.add({
+            "_id": _id, "email": f"kid{i}@seed.example.com", "display_name": gen.name(i),
+            "role": UserRole.KID_SELLER.value, "password_hash": password_hash, "parent_id": parent_id, "birthday": birthday
+        })
+    for i in range(buyers):
+        _id = gen.object_id(created)
+        buyer_ids.append(str(_id))
+        await writer.add({
+            "_id": _id, "email": f"buyer{i}@seed.example.com", "display_name": gen.name(i),
+            "role": UserRole.BUYER.value, "password_hash": password_hash, "parent_id": None, "birthday": None
+        })
+    await writer.close()
+    # Parents shop too
+    return kid_parents, buyer_ids + parent_ids
+
+async def seed_storefronts(gen: Generator, count: int, kid_parents, writer_args):
+    # At most one storefront per kid, like the API enforces
+    writer = BatchWriter("storefronts", *writer_args)
+    storefronts = []
+    for i, (kid_id, parent_id) in enumerate(kid_parents[:count]):
+        _id = gen.object_id(gen.end - timedelta(days=gen.rng.randint(30, 400)))
+        storefronts.append((str(_id), kid_id, parent_id))
+        await writer.add({
+            "_id": _id,
+            "display_name": f"{gen.rng.choice(FIRST_NAMES)}'s {gen.rng.choice(WORDS).title()} Shop {i}",
+            "description": gen.sentence(12),
+            "status": StorefrontStatus.ACTIVE.value if gen.rng.random() < 0.9 else StorefrontStatus.DRAFT.value,
+            "kid_id": kid_id,
+            "parent_id": parent_id
+        })
+    await writer.close()
+    return storefronts
+
+async def seed_products(gen: Generator, count: int, storefronts, writer_args):
+    writer = BatchWriter("products", *writer_args)
+    pick_status = weighted_picker(gen.rng, STATUS_WEIGHTS)
+    sellable = []
+    for _ in range(count):
+        # Some storefronts are much busier than others
+        storefront_id, kid_id, parent_id = storefronts[skewed_index(gen.rng, len(storefronts), 0.5)]
+        product_status = pick_status()
+        _id = gen.object_id(gen.end - timedelta(days=gen.rng.randint(1, 365)))
+        name = gen.product_name()
+        price = round(gen.rng.choice([1, 2, 3, 5, 8, 10, 12, 15, 20, 25, 40]) - gen.rng.choice([0, 0.01, 0.5]), 2)
+        product = {
+            "_id": _id,
+            "name": name,
+            "description": gen.sentence(20),
+            "price": price,
+            "quantity": 0 if product_status == ProductStatus.SOLD_OUT else gen.rng.randint(1, 30),
+            "images": [f"/static/uploads/seed-{gen.rng.randint(1, 500)}.jpg"],
+            "image_names": ["photo.jpg"],
+            "size": gen.rng.choice([None, "small", "medium", "large"]),
+            "materials": gen.rng.choice([None, "beads, string", "clay", "yarn", "paper", "wax"]),
+            "time_required": gen.rng.choice([None, "1 hour", "an afternoon", "2 days"]),
+            "storefront_id": storefront_id,
+            "status": product_status.value,
+            "kid_id": kid_id,
+            "parent_id": parent_id
+        }
+        if product_status in (ProductStatus.ACTIVE, ProductStatus.SOLD_OUT):
+            sellable.append((str(_id), price, name, storefront_id))
+        await writer.add(product)
+    await writer.close()
+    return sellable
+
+def order_time(gen: Generator, days: int) -> datetime:
+    # Growth over the period (more recent days are busier) plus an hour-of-day profile
+    day = int(days * (1 - gen.rng.random() ** 0.7))
+    hour = bisect.bisect(HOURLY_CUMULATIVE, gen.rng.random() * HOURLY_CUMULATIVE[-1])
+    moment = gen.end - timedelta(days=day + 1) + timedelta(hours=hour, seconds=gen.rng.randrange(3600))
+    # Millisecond precision, as stored by the API
+    return moment.replace(microsecond=gen.rng.randrange(1000) * 1000)
+
+async def seed_orders(gen: Generator, count: int, days: int, buyers, sellable, writer_args):
+    writer = BatchWriter("orders", *writer_args)
+    pick_size = weighted_picker(gen.rng, ITEMS_PER_ORDER)
+    for _ in range(count):
+        created_at = order_time(gen, days)
+        items = {}
+        for _ in range(min(pick_size(), len(sellable))):
+            product_id, price, name, storefront_id = sellable[skewed_index(gen.rng, len(sellable))]
+            items[product_id] = {
+                "product_id": product_id,
+                "quantity": 1 if gen.rng.random() < 0.8 else gen.rng.randint(2, 4),
+                "price": price,
+                "product_name": name,
+                "storefront_id": storefront_id
+            }
+        items = list(items.values())
+        await writer.add({
+            "_id": gen.object_id(created_at),
+            "buyer_id": gen.rng.choice(buyers),
+            "items": items,
+            "total": round(sum(item["price"] * item["quantity"] for item in items), 2),
+            "status": "completed" if gen.rng.random() < 0.97 else "pending",
+            "created_at": created_at
+        })
+    return await writer.close()
+
+async def main(args):
+    from auth import get_password_hash
+    from main import ensure_all_indexes
+
+    end = datetime.fromisoformat(args.end).replace(tzinfo=timezone.utc) if args.end else \
+        datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    gen = Generator(args.seed, end)
+    writer_args = (args.batch_size, args.concurrency)
+    scaled = lambda n: max(1, int(n * args.scale))
+
+    if args.drop:
+        # Everything derived from the old data too, or stale outbox leases and archived
+        # orders would point at users that no longer exist
+        for name in (
+            "users", "storefronts", "products", "orders", "orders_archive", "outbox", "seller_notifications",
+            "sales_rollups", "rollup_applied", "product_related", "job_state"
+        ):
+            await db[name].drop()
+
+    # One bcrypt hash for everyone: hashing per user would dominate the run time
+    password_hash = get_password_hash(PASSWORD)
+
+    started = time.perf_counter()
+    def step(label, n):
+        print(f"{label:<12} {n:>10,}  ({time.perf_counter() - started:.1f}s)")
+
+    kid_parents, buyers = await seed_users(gen, scaled(args.users), password_hash, writer_args)
+    step("users", scaled(args.users))
+    storefronts = await seed_storefronts(gen, scaled(args.storefronts), kid_parents, writer_args)
+    step("storefronts", len(storefronts))
+    sellable = await seed_products(gen, scaled(args.products), storefronts, writer_args)
+    step("products", scaled(args.products))
+    orders = await seed_orders(gen, scaled(args.orders), args.days, buyers, sellable, writer_args) if sellable else 0
+    step("orders", orders)
+
+    # Indexes after the bulk load: building once is cheaper than maintaining them per insert
+    await ensure_all_indexes()
+    step("indexes", 0)
+    print("Next: python rollups.py backfill && python recommendations.py --full")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-generate synthetic marketplace data")
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--storefronts", type=int, default=10_000)
+    parser.add_argument("--products", type=int, default=200_000)
+    parser.add_argument("--orders", type=int, default=2_000_000)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every volume, e.g. 0.01 for a quick run")
+    parser.add_argument("--days", type=int, default=365, help="Spread orders over this many days before --end")
+    parser.add_argument("--end", help="Last day of order history (YYYY-MM-DD, UTC); defaults to today")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=4, help="insert_many batches in flight")
+    parser.add_argument("--drop", action="store_true", help="Drop the seeded collections first")
+    args = parser.parse_args()
+    if args.storefronts > args.users * 3 // 10:
+        print("Note: one storefront per kid; storefronts are capped at 30% of --users")
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -0,0 +1,31 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+class SingleFlight:
+    # Coalesces identical concurrent reads: while a call for a key is in flight, later
+    # callers with the same key await its result instead of running their own query.
+    # Results are shared, so callers must not mutate them (or must copy first).
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(self._run(key, fn))
+        # Shielded: one caller going away (client disconnect) doesn't cancel the rest
+        return await asyncio.shield(task)
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable]):
+        try:
+            return await fn()
+        finally:
+            if self._calls.get(key) is asyncio.current_task():
+                del self._calls[key]
+
+    def forget(self, key: Optional[Hashable] = None):
+        # After a write: callers arriving from now on start a fresh call instead of
+        # joining one that may have read the old data
+        if key is None:
+            self._calls.clear()
+        else:
+            self._calls.pop(key, None)
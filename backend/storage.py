@@ -0,0 +1,153 @@
+import hashlib
+import hmac
+import os
+import shutil
+import time
+from typing import BinaryIO, Optional
+from urllib.parse import quote, urlencode
+from config import settings
+
+# Where product images live. Browsers upload straight to the backend with a short-lived
+# presigned request; the API only hands out the ticket and stores the resulting URL.
+#   local: files under backend/static (served by the /static mount); the "presigned"
+#          URL points at our own PUT endpoint and is signed with SECRET_KEY
+#   s3:    any S3-compatible store (AWS, MinIO, R2, ...) through boto3, with a presigned
+#          POST whose policy enforces the content type and UPLOAD_MAX_BYTES
+
+# Stored keys take their extension from the validated content type, never from the
+# client's filename: files are served from our own origin, so "x.html" would be XSS
+EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif"
+}
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BACKEND_DIR, "static")
+UPLOAD_DIR = os.path.join(STATIC_DIR, "uploads")
+
+class LocalStorage:
+    def __init__(self, root: str, upload_endpoint: str):
+        self.root = root
+        self.upload_endpoint = upload_endpoint
+
+    def path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError("Invalid storage key")
+        return path
+
+    def public_url(self, key: str) -> str:
+        return f"/static/{key}"
+
+    def _signature(self, key: str, content_type: str, expires: int) -> str:
+        message = f"{key}\n{content_type}\n{expires}".encode()
+        return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+    def presign_upload(self, key: str, content_type: str, expires_in: int) -> dict:
+        # The receiving endpoint enforces UPLOAD_MAX_BYTES while streaming
+        expires = int(time.time()) + expires_in
+        query = urlencode({"expires": expires, "signature": self._signature(key, content_type, expires)})
+        return {
+            "method": "PUT",
+            "upload_url": f"{self.upload_endpoint}/{quote(key)}?{query}",
+            "headers": {"Content-Type": content_type},
+            "fields": {}
+        }
+
+    def verify(self, key: str, content_type: str, expires: int, signature: str) -> bool:
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._signature(key, content_type, expires), signature)
+
+    def save(self, key: str, fileobj: BinaryIO, content_type: str):
+        # Blocking; callers run it in a worker thread
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as buffer:
+            shutil.copyfileobj(fileobj, buffer)
+
+    def open_for_write(self, key: str) -> BinaryIO:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open(path, "wb")
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+class S3Storage:
+    def __init__(self, bucket: str, endpoint_url: Optional[str], region: Optional[str],
+                 access_key_id: Optional[str], secret_access_key: Optional[str], public_base_url: Optional[str]):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+
+        self.bucket = bucket
+        # Path-style addressing works with MinIO and other self-hosted stand-ins
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path" if endpoint_url else "auto"})
+        )
+        if public_base_url:
+            self.public_base_url = public_base_url.rstrip("/")
+        elif endpoint_url:
+            self.public_base_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.public_base_url = f"https://{bucket}.s3.{region or 'us-east-1'}.amazonaws.com"
+
+    def public_url(self, key: str) -> str:
+        return f"{self.public_base_url}/{quote(key)}"
+
+    def presign_upload(self, key: str, content_type: str, expires_in: int) -> dict:
+        # A presigned PUT can't bound the body size; a POST policy can. The browser sends
+        # a multipart form with `fields` followed by the file (as the last field, "file").
+        post = self.client.generate_presigned_post(
+            self.bucket,
+            key,
+            Fields={"Content-Type": content_type},
+            Conditions=[
+                {"Content-Type": content_type},
+                ["content-length-range", 1, settings.UPLOAD_MAX_BYTES]
+            ],
+            ExpiresIn=expires_in
+        )
+        return {"method": "POST", "upload_url": post["url"], "headers": {}, "fields": post["fields"]}
+
+    def save(self, key: str, fileobj: BinaryIO, content_type: str):
+        # Blocking; callers run it in a worker thread
+        self.client.upload_fileobj(fileobj, self.bucket, key, ExtraArgs={"ContentType": content_type})
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+_storage = None
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        if settings.STORAGE_BACKEND == "s3":
+            _storage = S3Storage(
+                settings.S3_BUCKET,
+                settings.S3_ENDPOINT_URL,
+                settings.S3_REGION,
+                settings.S3_ACCESS_KEY_ID,
+                settings.S3_SECRET_ACCESS_KEY,
+                settings.STORAGE_PUBLIC_BASE_URL
+            )
+        else:
+            _storage = LocalStorage(STATIC_DIR, "/api/v1/products/uploads")
+    return _storage
+
+def new_upload_key(content_type: str) -> str:
+    # content_type must already be one of UPLOAD_CONTENT_TYPES
+    return f"uploads/{os.urandom(16).hex()}{EXTENSIONS.get(content_type, '')}"
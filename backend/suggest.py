@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from typing import List, Optional, Tuple
+from bson import ObjectId
+import changefeed
+from changefeed import Change
+from database import db
+from models import ProductStatus, StorefrontStatus
+
+logger = logging.getLogger(__name__)
+
+PRODUCT = "product"
+STOREFRONT = "storefront"
+
+# Fields whose change can add, rename or remove an index entry
+INDEXED_FIELDS = {"name", "display_name", "status"}
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+def _tokens(name: str) -> List[str]:
+    # Every word start plus every word-suffix of the name, so both "bracelet" and
+    # "rainbow br" hit "Rainbow Bracelet"
+    words = normalize(name).split()
+    return sorted(set(" ".join(words[i:]) for i in range(len(words))))
+
+class PrefixIndex:
+    # A sorted array of (token, kind, id) answers a prefix query with one bisect and
+    # a short forward scan; incremental edits are insort/del on the same list.
+    def __init__(self):
+        self._keys: List[Tuple[str, str, str]] = []
+        self._entries = {} # (kind, id) -> (name, tokens)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def build(cls, entries) -> "PrefixIndex":
+        index = cls()
+        for kind, doc_id, name in entries:
+            tokens = _tokens(name)
+            index._entries[(kind, doc_id)] = (name, tokens)
+            index._keys.extend((token, kind, doc_id) for token in tokens)
+        index._keys.sort()
+        return index
+
+    def upsert(self, kind: str, doc_id: str, name: str):
+        current = self._entries.get((kind, doc_id))
+        if current and current[0] == name:
+            return
+        self.remove(kind, doc_id)
+        tokens = _tokens(name)
+        self._entries[(kind, doc_id)] = (name, tokens)
+        for token in tokens:
+            insort(self._keys, (token, kind, doc_id))
+
+    def remove(self, kind: str, doc_id: str):
+        current = self._entries.pop((kind, doc_id), None)
+        if not current:
+            return
+        for token in current[1]:
+            position = bisect_left(self._keys, (token, kind, doc_id))
+            if position < len(self._keys) and self._keys[position] == (token, kind, doc_id):
+                del self._keys[position]
+
+    def suggest(self, prefix: str, limit: int, max_scan: int = 1000) -> List[dict]:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        position = bisect_left(self._keys, (prefix,))
+        end = min(len(self._keys), position + max_scan)
+        while position < end and len(results) < limit:
+            token, kind, doc_id = self._keys[position]
+            if not token.startswith(prefix):
+                break
+            if (kind, doc_id) not in seen:
+                seen.add((kind, doc_id))
+                results.append({"type": kind, "id": doc_id, "name": self._entries[(kind, doc_id)][0]})
+            position += 1
+        return results
+
+class SuggestIndex:
+    def __init__(self):
+        self.index = PrefixIndex()
+        self._rebuild_task = None
+        self._fetches = set() # in-flight refresh tasks, referenced so they aren't collected
+        self._changed_during_rebuild = None # collection -> ids, while a rebuild is scanning
+        changefeed.subscribe("products", self._on_product_change)
+        changefeed.subscribe("storefronts", self._on_storefront_change)
+
+    def suggest(self, prefix: str, limit: int) -> List[dict]:
+        return self.index.suggest(prefix, limit)
+
+    async def rebuild(self):
+        self._changed_during_rebuild = {"products": set(), "storefronts": set()}
+        try:
+            products = db.products.find({"status": ProductStatus.ACTIVE.value}, {"name": 1})
+            storefronts = db.storefronts.find({"status": StorefrontStatus.ACTIVE.value}, {"display_name": 1})
+            entries = [(PRODUCT, str(p["_id"]), p.get("name", "")) async for p in products]
+            entries += [(STOREFRONT, str(s["_id"]), s.get("display_name", "")) async for s in storefronts]
+            index = PrefixIndex.build(entries)
+            # The scan may have missed writes made while it ran; re-read those (and any
+            # made during the re-read) until nothing is left to catch up on
+            while any(self._changed_during_rebuild.values()):
+                changed, self._changed_during_rebuild = self._changed_during_rebuild, {"products": set(), "storefronts": set()}
+                for collection, ids in changed.items():
+                    if not ids:
+                        continue
+                    found = {
+                        str(doc["_id"]): doc
+                        async for doc in db[collection].find({"_id": {"$in": [ObjectId(i) for i in ids]}})
+                    }
+                    apply = self._apply_product if collection == "products" else self._apply_storefront
+                    for doc_id in ids:
+                        apply(doc_id, found.get(doc_id), index)
+            # Swap in the finished index; queries never see a half-built one
+            self.index = index
+        finally:
+            self._changed_during_rebuild = None
+        logger.info("Suggest index rebuilt with %d entries", len(self.index))
+
+    async def run(self, rebuild_seconds: float):
+        # Change events keep the index current; the periodic rebuild repairs any drift
+        while True:
+            try:
+                await self.rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Suggest index rebuild failed: %s", e)
+            await asyncio.sleep(rebuild_seconds)
+
+    def _apply_product(self, doc_id: str, doc, index: Optional[PrefixIndex] = None):
+        index = self.index if index is None else index
+        if doc and doc.get("status") == ProductStatus.ACTIVE.value:
+            index.upsert(PRODUCT, doc_id, doc.get("name", ""))
+        else:
+            index.remove(PRODUCT, doc_id)
+
+    def _apply_storefront(self, doc_id: str, doc, index: Optional[PrefixIndex] = None):
+        index = self.index if index is None else index
+        if doc and doc.get("status") == StorefrontStatus.ACTIVE.value:
+            index.upsert(STOREFRONT, doc_id, doc.get("display_name", ""))
+        else:
+            index.remove(STOREFRONT, doc_id)
+
+    def _handle(self, change: Change, collection: str, apply):
+        if change.operation == "invalidate":
+            if not self._rebuild_task or self._rebuild_task.done():
+                self._rebuild_task = asyncio.create_task(self.rebuild())
+            return
+        if self._changed_during_rebuild is not None:
+            self._changed_during_rebuild[collection].add(change.document_id)
+
+        if change.operation == "delete":
+            apply(change.document_id, None)
+        elif change.document is not None:
+            apply(change.document_id, change.document)
+        elif change.operation == "insert" or change.updated_fields & INDEXED_FIELDS:
+            task = asyncio.create_task(self._fetch_and_apply(collection, change.document_id, apply))
+            self._fetches.add(task)
+            task.add_done_callback(self._fetches.discard)
+
+    async def _fetch_and_apply(self, collection: str, doc_id: str, apply):
+        try:
+            doc = await db[collection].find_one({"_id": ObjectId(doc_id)})
+        except Exception as e:
+            logger.warning("Suggest index refresh for %s %s failed: %s", collection, doc_id, e)
+            return
+        apply(doc_id, doc)
+
+    def _on_product_change(self, change: Change):
+        self._handle(change, "products", self._apply_product)
+
+    def _on_storefront_change(self, change: Change):
+        self._handle(change, "storefronts", self._apply_storefront)
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+import time
+
+# Checks for the blocking-call detector, and that the handlers' known-slow work (bcrypt)
+# stays off the event loop. Run directly (python test_blocking.py) or under pytest.
+# No database needed.
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from auth import get_password_hash, get_password_hash_async, verify_password_async
+from blocking import BlockingRouteMiddleware, detect_blocking
+
+THRESHOLD_MS = 20
+
+def probe_app():
+    app = FastAPI()
+    app.add_middleware(BlockingRouteMiddleware)
+
+    @app.get("/sleepy/{n}")
+    async def sleepy(n: int):
+        time.sleep(0.1)  # the kind of call the detector is for
+        return {"n": n}
+
+    @app.get("/fine")
+    async def fine():
+        await asyncio.sleep(0.1)
+        return {}
+
+    return app
+
+def test_reports_blocking_handler_with_route_and_stack():
+    client = TestClient(probe_app())
+    with detect_blocking(THRESHOLD_MS) as detector:
+        client.get("/sleepy/1")
+    assert len(detector.reports) == 1, [r.format() for r in detector.reports]
+    report = detector.reports[0]
+    assert report.route == "GET /sleepy/{n}", report.route
+    assert any("time.sleep(0.1)" in line for line in report.stack), report.format()
+
+def test_awaiting_is_not_reported():
+    client = TestClient(probe_app())
+    with detect_blocking(THRESHOLD_MS) as detector:
+        client.get("/fine")
+    detector.assert_no_blocking()
+
+def test_password_hashing_stays_off_the_loop():
+    async def login_like():
+        hashed = await get_password_hash_async("password123")
+        assert await verify_password_async("password123", hashed)
+
+    with detect_blocking(THRESHOLD_MS) as detector:
+        asyncio.run(login_like())
+    detector.assert_no_blocking()
+
+    # Sanity check: the same work done inline is caught
+    async def inline():
+        get_password_hash("password123")
+
+    with detect_blocking(THRESHOLD_MS) as detector:
+        asyncio.run(inline())
+    assert detector.reports, "inline bcrypt should have been reported"
+
+if __name__ == "__main__":
+    tests = [name for name in dir() if name.startswith("test_")]
+    failed = 0
+    for name in tests:
+        try:
+            globals()[name]()
+            print(f"PASS {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {name}\n{e}")
+    sys.exit(1 if failed else 0)
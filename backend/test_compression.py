@@ -0,0 +1,113 @@
+from contextlib import contextmanager
+from testing import run_tests
+
+# Response compression: Accept-Encoding negotiation, the fallback to gzip when the
+# optional codecs aren't installed, and the responses left alone (small, already
+# encoded, streamed, and server-sent events).
+import gzip
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+import compression
+from compression import CompressionMiddleware, build_codecs, choose_encoding
+
+SERVER_ORDER = ("zstd", "br", "gzip")
+BIG = {"items": ["handmade bracelet"] * 200}
+
+@contextmanager
+def without_optional_codecs():
+    saved = compression.brotli, compression.zstandard
+    compression.brotli = compression.zstandard = None
+    try:
+        yield
+    finally:
+        compression.brotli, compression.zstandard = saved
+
+def client(codecs=None) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/big")
+    def big():
+        return BIG
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/encoded")
+    def encoded():
+        return Response(gzip.compress(b"x" * 4096), media_type="text/plain", headers={"content-encoding": "gzip"})
+
+    @app.get("/image")
+    def image():
+        return Response(b"\x89PNG" + b"\0" * 4096, media_type="image/png")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"a" * 2048, b"b" * 2048]), media_type="text/plain")
+
+    @app.get("/events")
+    def events():
+        # One complete body, so only the content type keeps it from being compressed
+        return Response(b"data: 1\n\n" * 300, media_type="text/event-stream")
+
+    middleware = CompressionMiddleware(app, minimum_size=1024)
+    if codecs is not None:
+        middleware.codecs = codecs
+    return TestClient(middleware)
+
+def test_negotiation_honours_q_values_and_server_preference():
+    assert choose_encoding("gzip, br, zstd", SERVER_ORDER) == "zstd"
+    assert choose_encoding("gzip;q=1.0, br;q=0.9", SERVER_ORDER) == "gzip"
+    assert choose_encoding("br;q=0.5, *;q=0.8", SERVER_ORDER) == "zstd"
+    assert choose_encoding("*;q=0.2, gzip;q=0", SERVER_ORDER) == "zstd"
+    assert choose_encoding("GZIP", SERVER_ORDER) == "gzip"
+    assert choose_encoding("identity", SERVER_ORDER) is None
+    assert choose_encoding("gzip;q=0, zstd;q=oops", SERVER_ORDER) is None
+
+def test_falls_back_to_gzip_without_optional_codecs():
+    with without_optional_codecs():
+        codecs = build_codecs()
+    assert list(codecs) == ["gzip"]
+    assert choose_encoding("zstd, br, gzip;q=0.1", codecs) == "gzip"
+    assert choose_encoding("zstd, br", codecs) is None
+
+def test_large_json_is_compressed():
+    with without_optional_codecs():
+        response = client(build_codecs()).get("/big", headers={"accept-encoding": "br, gzip;q=0.5"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert response.json() == BIG
+
+def test_no_accept_encoding_means_no_compression():
+    response = client().get("/big", headers={"accept-encoding": ""})
+    assert "content-encoding" not in response.headers
+    assert response.json() == BIG
+
+def test_small_encoded_and_binary_bodies_pass_through():
+    http = client()
+    small = http.get("/small", headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    # Still varies: a bigger body from the same URL would be compressed
+    assert small.headers["vary"] == "Accept-Encoding"
+
+    encoded = http.get("/encoded", headers={"accept-encoding": "gzip, br"})
+    assert encoded.headers["content-encoding"] == "gzip"
+    assert encoded.content == b"x" * 4096
+
+    image = http.get("/image", headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in image.headers and "vary" not in image.headers
+
+def test_streamed_responses_and_events_are_not_buffered():
+    http = client()
+    stream = http.get("/stream", headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in stream.headers
+    assert stream.content == b"a" * 2048 + b"b" * 2048
+
+    events = http.get("/events", headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in events.headers and "vary" not in events.headers
+    assert events.text.startswith("data: 1\n\n")
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,79 @@
+import asyncio
+from testing import memory_db, run_tests
+
+# The live product feed: which product changes become events, replay by Last-Event-ID,
+# and removal events when a listed product is rejected.
+from bson import ObjectId
+from changefeed import Change
+from events import EventBroker, product_event
+from models import UserResponse
+
+def product(status: str = "active", quantity: int = 3) -> dict:
+    return {
+        "_id": ObjectId(), "name": "Bracelet", "description": "Beads", "price": 4.5, "quantity": quantity,
+        "storefront_id": str(ObjectId()), "status": status
+    }
+
+def change(doc: dict, *fields, operation: str = "update") -> Change:
+    return Change("products", operation, str(doc["_id"]), document=doc, updated_fields=set(fields))
+
+def test_only_active_products_are_announced():
+    assert product_event(change(product("pending_approval", quantity=0), "quantity")) is None
+    assert product_event(change(product("pending_approval"), "name")) is None
+
+    event, data = product_event(change(product(quantity=0), "quantity"))
+    assert event == "product.stock" and data["sold_out"] is True
+    assert product_event(change(product(), "status"))[0] == "product.approved"
+    assert product_event(change(product(), "name", "price"))[0] == "product.updated"
+
+def test_leaving_active_is_announced_as_unlisted():
+    rejected = product("rejected")
+    event, data = product_event(change(rejected, "status"))
+    assert event == "product.unlisted"
+    assert data == {"_id": str(rejected["_id"]), "status": "rejected"}
+    # A later edit to the hidden product stays quiet
+    assert product_event(change(rejected, "name")) is None
+
+def test_deletes_are_announced_unless_never_listed():
+    doc = product()
+    assert product_event(change(doc, operation="delete")) == ("product.deleted", {"_id": str(doc["_id"])})
+    assert product_event(Change("products", "delete", str(doc["_id"]))) == ("product.deleted", {"_id": str(doc["_id"])})
+    assert product_event(change(product("pending_approval"), operation="delete")) is None
+
+def test_parent_rejecting_a_live_product_unlists_it():
+    from events import product_events
+    from routers.parent import approve_reject_product
+
+    db = memory_db()
+    parent = UserResponse(_id=str(ObjectId()), email="parent@example.com", display_name="Parent", role="parent_guardian")
+    doc = {**product(), "parent_id": parent.id}
+    subscriber = product_events.subscribe()
+
+    async def reject():
+        await db.products.insert_one(doc)
+        await approve_reject_product(str(doc["_id"]), "reject", current_user=parent, loaders=None)
+
+    try:
+        asyncio.run(reject())
+        frames = b"".join(subscriber.queue).decode()
+    finally:
+        product_events.unsubscribe(subscriber)
+    assert "event: product.unlisted" in frames, frames
+    assert str(doc["_id"]) in frames
+
+def test_replay_and_resync():
+    broker = EventBroker(buffer_size=10, replay_size=3)
+    for i in range(5):
+        broker.publish("x", {"i": i})
+    last_id = f"{broker._epoch}-3"
+
+    replayed = broker.subscribe(last_id)
+    assert not replayed.overflowed
+    assert [frame.split(b"\n")[0] for frame in replayed.queue] == [f"id: {broker._epoch}-{i}".encode() for i in (4, 5)]
+
+    # Older than the replay window, from another process, or not an id at all
+    for unknown in (f"{broker._epoch}-1", "0a1b2c3d-4", "4"):
+        assert broker.subscribe(unknown).overflowed, unknown
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+# Import-time budget for cold starts, measured with `python -X importtime` in a fresh
+# interpreter. Run directly (python test_import_time.py) or under pytest.
+# Budgets are in milliseconds and can be overridden for slower machines.
+IMPORT_MAIN_BUDGET_MS = float(os.environ.get("IMPORT_MAIN_BUDGET_MS", 300))
+CREATE_APP_BUDGET_MS = float(os.environ.get("CREATE_APP_BUDGET_MS", 2000))
+
+# Must not be loaded just to build the app: heavy, and only needed by background jobs
+# (NumPy/SciPy) or on first database use (Motor)
+FORBIDDEN_MODULES = ("numpy", "scipy", "motor")
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def measure(code: str):
+    env = {**os.environ, "MONGODB_URI": os.environ.get("MONGODB_URI", "mongodb://localhost:27017")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    # Lines look like: "import time:  self [us] | cumulative | imported package"
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    total_ms = sum(self_us for self_us, _ in modules.values()) / 1000
+    return total_ms, modules
+
+def report(label: str, total_ms: float, modules: dict, budget_ms: float):
+    print(f"{label}: {total_ms:.0f} ms (budget {budget_ms:.0f} ms)")
+    slowest = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)[:10]
+    for name, (_, cumulative_us) in slowest:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+def test_import_main_is_cheap():
+    total_ms, modules = measure("import main")
+    report("import main", total_ms, modules, IMPORT_MAIN_BUDGET_MS)
+    assert total_ms <= IMPORT_MAIN_BUDGET_MS, f"import main took {total_ms:.0f} ms"
+    for name in ("fastapi", "pymongo", "routers"):
+        assert name not in modules, f"import main loaded {name}"
+
+def test_create_app_within_budget():
+    total_ms, modules = measure("import main; main.create_app()")
+    report("create_app()", total_ms, modules, CREATE_APP_BUDGET_MS)
+    assert total_ms <= CREATE_APP_BUDGET_MS, f"create_app() imports took {total_ms:.0f} ms"
+    for name in FORBIDDEN_MODULES:
+        assert name not in modules, f"create_app() loaded {name}"
+
+if __name__ == "__main__":
+    try:
+        test_import_main_is_cheap()
+        test_create_app_within_budget()
+    except AssertionError as e:
+        print(f"Import-time budget exceeded: {e}")
+        sys.exit(1)
+    print("Import-time budget OK")
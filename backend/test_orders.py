@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from testing import memory_db, run_tests
+
+# Order history paging: cursors round-trip, and pages walk through orders whose
+# created_at is a real date and legacy ones still holding an ISO string.
+from bson import ObjectId
+from fastapi import HTTPException, Response
+from models import UserResponse
+from routers.orders import _decode_cursor, _encode_cursor, get_my_orders
+
+BUYER = UserResponse(_id=str(ObjectId()), email="buyer@example.com", display_name="Buyer", role="buyer")
+
+def order(created_at) -> dict:
+    return {"_id": ObjectId(), "buyer_id": BUYER.id, "items": [], "total": 1.0, "status": "completed", "created_at": created_at}
+
+async def all_pages(limit: int):
+    pages, cursor = [], None
+    while True:
+        response = Response()
+        page = await get_my_orders(response, limit=limit, cursor=cursor, current_user=BUYER)
+        pages.append([o.id for o in page])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+def test_cursor_round_trip():
+    at = datetime(2026, 5, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+    dated = order(at)
+    assert _decode_cursor(_encode_cursor(dated)) == (at, dated["_id"])
+    legacy = order("2024-02-03T04:05:06")
+    assert _decode_cursor(_encode_cursor(legacy)) == ("2024-02-03T04:05:06", legacy["_id"])
+
+def test_invalid_cursor_is_rejected():
+    for cursor in ("not-a-cursor", _encode_cursor(order(datetime.now(timezone.utc)))[:-4]):
+        try:
+            _decode_cursor(cursor)
+        except HTTPException as e:
+            assert e.status_code == 400
+        else:
+            raise AssertionError(f"{cursor!r} was accepted")
+
+def test_pages_cover_dated_and_legacy_orders():
+    db = memory_db()
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    dated = [order(now - timedelta(hours=hours)) for hours in range(3)]
+    # Two orders at the same instant: the _id breaks the tie
+    dated.append(order(dated[-1]["created_at"]))
+    legacy = [order(f"2024-01-0{day}T10:00:00") for day in (3, 2, 1)]
+    someone_else = {**order(now), "buyer_id": str(ObjectId())}
+
+    async def run():
+        await db.orders.insert_many(dated + legacy + [someone_else])
+        return await all_pages(limit=2)
+
+    pages = asyncio.run(run())
+    # Newest first; Mongo sorts string dates after every real one
+    expected = [dated[0], dated[1], dated[3], dated[2]] + legacy
+    assert [order_id for page in pages for order_id in page] == [str(o["_id"]) for o in expected], pages
+    assert [len(page) for page in pages] == [2, 2, 2, 1], pages
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from testing import memory_db, override_settings, run_tests
+
+# The post-checkout outbox: one entry per handler, leases that expire so a dead
+# worker's entry is picked up again, retries with backoff, and workers that survive
+# a failure while recording a delivery.
+import outbox
+from outbox import OutboxStatus, OutboxWorkerPool
+
+calls = []
+failures = {"flaky": 0}
+
+@outbox.handler("test.event", "record")
+async def record(payload: dict):
+    calls.append(payload)
+
+@outbox.handler("test.event", "flaky")
+async def flaky(payload: dict):
+    if failures["flaky"]:
+        failures["flaky"] -= 1
+        raise RuntimeError("downstream unavailable")
+
+def setup():
+    calls.clear()
+    failures["flaky"] = 0
+    return memory_db()
+
+def past(seconds: float = 1) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=seconds)
+
+def test_enqueue_creates_one_entry_per_handler():
+    db = setup()
+
+    async def run():
+        await outbox.enqueue("test.event", {"order_id": "o1"})
+        await outbox.enqueue("nobody.listens", {})
+        return await db.outbox.find({}).to_list(length=None)
+
+    entries = asyncio.run(run())
+    assert sorted(e["handler"] for e in entries) == ["flaky", "record"]
+    assert all(e["status"] == OutboxStatus.PENDING and e["attempts"] == 0 for e in entries)
+
+def test_claim_leases_until_expiry():
+    db = setup()
+
+    async def run():
+        await db.outbox.insert_many(outbox.build_entries("test.event", {}))
+        first, second = await outbox._claim(), await outbox._claim()
+        # Both leased: nothing left to claim until a lease runs out
+        assert await outbox._claim() is None
+        await db.outbox.update_one({"_id": first["_id"]}, {"$set": {"lease_expires_at": past()}})
+        again = await outbox._claim()
+        return first, second, again
+
+    with override_settings(OUTBOX_LEASE_SECONDS=60):
+        first, second, again = asyncio.run(run())
+    assert first["status"] == OutboxStatus.PROCESSING and first["attempts"] == 1
+    assert first["_id"] != second["_id"]
+    assert again["_id"] == first["_id"] and again["attempts"] == 2
+
+def test_failed_delivery_is_retried_with_backoff_then_given_up():
+    db = setup()
+    failures["flaky"] = 5
+
+    async def attempt():
+        await db.outbox.update_many({}, {"$set": {"next_attempt_at": past()}})
+        entry = await outbox._claim()
+        await outbox._deliver(entry)
+        return await db.outbox.find_one({"_id": entry["_id"]})
+
+    async def run():
+        await db.outbox.insert_many([e for e in outbox.build_entries("test.event", {}) if e["handler"] == "flaky"])
+        return [await attempt() for _ in range(3)]
+
+    with override_settings(OUTBOX_MAX_ATTEMPTS=3, OUTBOX_BASE_BACKOFF_SECONDS=10):
+        before = datetime.now(timezone.utc)
+        first, second, last = asyncio.run(run())
+    assert first["status"] == OutboxStatus.PENDING and first["last_error"] == "downstream unavailable"
+    assert "lease_expires_at" not in first
+    # Backoff doubles, with jitter in [0.5, 1.0) of it
+    assert before + timedelta(seconds=5) <= first["next_attempt_at"] <= before + timedelta(seconds=11)
+    assert second["next_attempt_at"] >= before + timedelta(seconds=10)
+    assert last["status"] == OutboxStatus.FAILED and last["attempts"] == 3
+
+def test_entry_without_a_handler_is_not_lost():
+    db = setup()
+
+    async def run():
+        entry = {**outbox.build_entries("test.event", {})[0], "handler": "removed"}
+        await db.outbox.insert_one(entry)
+        await outbox._deliver(await outbox._claim())
+        return await db.outbox.find_one({"_id": entry["_id"]})
+
+    entry = asyncio.run(run())
+    assert entry["status"] == OutboxStatus.PENDING
+    assert "No outbox handler 'removed'" in entry["last_error"]
+
+def test_workers_deliver_and_survive_recording_failures():
+    db = setup()
+    deliver = outbox._deliver
+    broken = {"left": 1}
+
+    async def sometimes_broken(entry):
+        # e.g. the status update after delivery hits a primary stepdown
+        if broken["left"]:
+            broken["left"] -= 1
+            raise ConnectionError("not primary")
+        await deliver(entry)
+
+    async def run():
+        pool = OutboxWorkerPool()
+        pool.start(1)
+        try:
+            await outbox.enqueue("test.event", {"order_id": "o2"})
+            outbox.wake()
+            for _ in range(100):
+                if await db.outbox.count_documents({"status": OutboxStatus.DONE}) == 2:
+                    break
+                await asyncio.sleep(0.02)
+            alive = not pool._tasks[0].done()
+        finally:
+            await pool.stop()
+        return alive, await db.outbox.find({}).to_list(length=None)
+
+    outbox._deliver = sometimes_broken
+    try:
+        # A zero lease lets the entry whose outcome wasn't recorded be claimed again at once
+        with override_settings(OUTBOX_LEASE_SECONDS=0, OUTBOX_POLL_SECONDS=0.01):
+            alive, entries = asyncio.run(run())
+    finally:
+        outbox._deliver = deliver
+    assert alive
+    assert [e["status"] for e in entries] == [OutboxStatus.DONE] * 2, entries
+    assert calls and all(payload == {"order_id": "o2"} for payload in calls)
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,95 @@
+import asyncio
+from testing import memory_db, override_settings, run_tests
+
+# Bulk approve/reject: one round trip for the valid items, and a per-item result that
+# reports every failure without failing the rest.
+from bson import ObjectId
+from fastapi import HTTPException
+from loaders import Loaders
+from models import BulkApprovalItem, BulkApprovalRequest, UserResponse
+from routers.parent import bulk_approve_reject_products
+
+def parent() -> UserResponse:
+    return UserResponse(_id=str(ObjectId()), email="parent@example.com", display_name="Parent", role="parent_guardian")
+
+def pending(parent_id: str) -> dict:
+    return {
+        "_id": ObjectId(), "name": "Bracelet", "description": "Beads", "price": 4.5, "quantity": 2,
+        "storefront_id": str(ObjectId()), "status": "pending_approval", "parent_id": parent_id
+    }
+
+def bulk(current_user: UserResponse, *items):
+    request = BulkApprovalRequest(items=[BulkApprovalItem(product_id=p, action=a) for p, a in items])
+    return bulk_approve_reject_products(request, current_user=current_user, loaders=Loaders())
+
+def test_bulk_applies_valid_items_and_reports_the_rest():
+    db = memory_db()
+    me = parent()
+    approve, reject, not_mine = pending(me.id), pending(me.id), pending(str(ObjectId()))
+    missing = str(ObjectId())
+
+    async def run():
+        await db.products.insert_many([approve, reject, not_mine])
+        results = await bulk(
+            me,
+            (str(approve["_id"]), "approve"),
+            (str(reject["_id"]), "reject"),
+            (str(not_mine["_id"]), "approve"),
+            (missing, "approve"),
+            ("not-an-id", "approve"),
+            (str(approve["_id"]), "reject"),
+            (str(reject["_id"]) + "0", "publish")
+        )
+        statuses = {doc["_id"]: doc["status"] async for doc in db.products.find({})}
+        return results, statuses
+
+    results, statuses = asyncio.run(run())
+    assert [(r.success, r.status and r.status.value) for r in results[:2]] == [(True, "active"), (True, "rejected")]
+    assert [r.detail for r in results[2:]] == [
+        "You are not the parent of this seller",
+        "Product not found",
+        "Invalid Product ID",
+        "Duplicate product ID in request",
+        "Action must be 'approve' or 'reject'"
+    ], results
+    # Results line up with the request, and failures left their products alone
+    assert [r.product_id for r in results][:2] == [str(approve["_id"]), str(reject["_id"])]
+    assert statuses == {approve["_id"]: "active", reject["_id"]: "rejected", not_mine["_id"]: "pending_approval"}
+
+def test_bulk_approval_stamps_the_approver():
+    db = memory_db()
+    me = parent()
+    doc = pending(me.id)
+
+    async def run():
+        await db.products.insert_one(doc)
+        await bulk(me, (str(doc["_id"]), "approve"))
+        return await db.products.find_one({"_id": doc["_id"]})
+
+    approved = asyncio.run(run())
+    assert approved["parent_approved_by_user_id"] == me.id
+    assert approved["parent_approval_date"]
+
+def test_bulk_request_size_is_capped():
+    memory_db()
+    items = [(str(ObjectId()), "approve") for _ in range(3)]
+    with override_settings(BULK_APPROVAL_MAX_ITEMS=2):
+        try:
+            asyncio.run(bulk(parent(), *items))
+        except HTTPException as e:
+            assert e.status_code == 400
+        else:
+            raise AssertionError("an oversized request was accepted")
+
+def test_only_parents_can_bulk_approve():
+    memory_db()
+    kid = UserResponse(_id=str(ObjectId()), email="kid@example.com", display_name="Kid", role="kid_seller")
+    try:
+        asyncio.run(bulk(kid, (str(ObjectId()), "approve")))
+    except HTTPException as e:
+        assert e.status_code == 403
+    else:
+        raise AssertionError("a kid could approve products")
+
+if __name__ == "__main__":
+    run_tests(globals())
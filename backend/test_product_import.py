@@ -0,0 +1,106 @@
+import asyncio
+import io
+from testing import memory_db, override_settings, run_tests
+
+# Bulk product import: bad rows are reported by row number without stopping the rest,
+# the row limit is reported separately from failures, and a file that can't be decoded
+# keeps the rows read before the damage.
+from bson import ObjectId
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+from models import UserResponse
+from routers.products import import_products
+
+def kid() -> UserResponse:
+    return UserResponse(
+        _id=str(ObjectId()), email="kid@example.com", display_name="Kid", role="kid_seller", parent_id=str(ObjectId())
+    )
+
+def upload(filename: str, content: bytes, content_type: str = "application/octet-stream") -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename, headers=Headers({"content-type": content_type}))
+
+def run_import(db, user: UserResponse, file: UploadFile):
+    async def run():
+        await db.storefronts.insert_one({"_id": ObjectId(), "kid_id": user.id, "name": "Shop"})
+        result = await import_products(file, current_user=user)
+        return result, await db.products.find({}).to_list(length=None)
+
+    return asyncio.run(run())
+
+CSV = b"""name,description,price,quantity,images
+Bracelet,Beads,4.50,2,a.jpg|b.jpg
+Mug,,3,1,
+Kite,Paper,cheap,1,
+Card,Hand drawn,1.25,10,
+"""
+
+def test_csv_rows_with_errors_are_reported_and_the_rest_imported():
+    db = memory_db()
+    user = kid()
+    result, products = run_import(db, user, upload("items.csv", CSV))
+
+    assert (result.inserted, result.failed, result.truncated, result.notice) == (2, 2, False, None)
+    assert [e.row for e in result.errors] == [3, 4]
+    assert "description" in result.errors[0].error and "price" in result.errors[1].error
+    assert sorted(p["name"] for p in products) == ["Bracelet", "Card"]
+    bracelet = next(p for p in products if p["name"] == "Bracelet")
+    assert bracelet["images"] == ["a.jpg", "b.jpg"]
+    assert (bracelet["kid_id"], bracelet["parent_id"], bracelet["status"]) == (user.id, user.parent_id, "pending_approval")
+
+def test_jsonl_reports_invalid_json_by_line():
+    db = memory_db()
+    lines = [
+        b'{"name": "Bracelet", "description": "Beads", "price": 4.5, "quantity": 2}',
+        b"",
+        b'{"name": "Mug", "description": "Clay"',
+        b'{"name": "Kite", "description": "Paper", "price": 2, "quantity": "many"}',
+        b'{"name": "Card", "description": "Drawn", "price": 1, "quantity": 5}'
+    ]
+    result, products = run_import(db, kid(), upload("items.txt", b"\n".join(lines), "application/x-ndjson"))
+
+    assert (result.inserted, result.failed) == (2, 2)
+    assert [e.row for e in result.errors] == [3, 4]
+    assert result.errors[0].error.startswith("Invalid JSON")
+    assert len(products) == 2
+
+def test_row_limit_is_a_notice_not_a_failure():
+    db = memory_db()
+    rows = b"".join(b"Item %d,Thing,1,1\n" % i for i in range(7))
+    with override_settings(PRODUCT_IMPORT_MAX_ROWS=5, PRODUCT_IMPORT_BATCH_SIZE=2):
+        result, products = run_import(db, kid(), upload("items.csv", b"name,description,price,quantity\n" + rows))
+
+    assert (result.inserted, result.failed, result.errors, result.truncated) == (5, 0, [], True)
+    assert "5 rows" in result.notice
+    assert sorted(p["name"] for p in products) == [f"Item {i}" for i in range(5)]
+
+def test_a_file_that_fits_exactly_is_not_truncated():
+    db = memory_db()
+    rows = b"".join(b"Item %d,Thing,1,1\n" % i for i in range(4))
+    with override_settings(PRODUCT_IMPORT_MAX_ROWS=4, PRODUCT_IMPORT_BATCH_SIZE=2):
+        result, _ = run_import(db, kid(), upload("items.csv", b"name,description,price,quantity\n" + rows))
+    assert (result.inserted, result.truncated, result.notice) == (4, False, None)
+
+def test_undecodable_file_keeps_earlier_rows():
+    db = memory_db()
+    good = b"".join(b'{"name": "Item %d", "description": "Thing", "price": 1, "quantity": 1}\n' % i for i in range(3))
+    with override_settings(PRODUCT_IMPORT_BATCH_SIZE=2):
+        result, products = run_import(db, kid(), upload("items.jsonl", good + b'{"name": "\xff\xfe"}\n'))
+
+    assert result.inserted == 3 and len(products) == 3
+    assert result.failed == 1
+    assert result.errors[0].row == 4 and result.errors[0].error.startswith("Could not parse file")
+
+def test_unknown_format_and_missing_storefront_are_rejected():
+    memory_db()
+    user = kid()
+    for file in (upload("items.xlsx", CSV), upload("items.csv", CSV)):
+        try:
+            # Neither request gets as far as reading rows
+            asyncio.run(import_products(file, current_user=user))
+        except HTTPException as e:
+            assert e.status_code == 400
+        else:
+            raise AssertionError(f"{file.filename} was imported")
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from testing import memory_db, override_settings, run_tests
+
+# Login throttling: token buckets, the per-account/per-IP throttle in front of
+# /auth/login, and which X-Forwarded-For hop is believed to be the client.
+from fastapi.testclient import TestClient
+import main
+import rate_limit
+import routers.auth
+from rate_limit import LoginThrottle, TokenBucketLimiter, client_ip
+
+@contextmanager
+def frozen_clock(start: float = 1000.0):
+    clock = SimpleNamespace(now=start)
+    real = time.monotonic
+    time.monotonic = lambda: clock.now
+    try:
+        yield clock
+    finally:
+        time.monotonic = real
+
+def request(peer: str, forwarded: str = None):
+    headers = {"x-forwarded-for": forwarded} if forwarded else {}
+    return SimpleNamespace(client=SimpleNamespace(host=peer), headers=headers)
+
+@contextmanager
+def trusted(*proxies):
+    with override_settings(TRUSTED_PROXIES=list(proxies)):
+        rate_limit._trusted_networks.cache_clear()
+        try:
+            yield
+        finally:
+            rate_limit._trusted_networks.cache_clear()
+
+def test_bucket_allows_a_burst_then_refills():
+    with frozen_clock() as clock:
+        limiter = TokenBucketLimiter(capacity=3, refill_per_second=0.5, max_keys=10)
+        assert [limiter.consume("k")[0] for _ in range(4)] == [True, True, True, False]
+        allowed, retry_after = limiter.consume("k")
+        assert not allowed and retry_after == 2.0
+
+        clock.now += 2
+        assert limiter.consume("k")[0]
+        assert not limiter.consume("k")[0]
+        # Refill never exceeds the burst
+        clock.now += 3600
+        assert [limiter.consume("k")[0] for _ in range(4)] == [True, True, True, False]
+
+def test_bucket_evicts_least_recently_used_keys():
+    limiter = TokenBucketLimiter(capacity=1, refill_per_second=0.001, max_keys=2)
+    for key in ("a", "b", "c"):
+        limiter.consume(key)
+    assert list(limiter._buckets) == ["b", "c"]
+
+def test_throttle_checks_ip_and_normalized_account():
+    with override_settings(LOGIN_RATE_LIMIT_BACKEND="memory", LOGIN_ACCOUNT_BURST=2, LOGIN_IP_BURST=3):
+        throttle = LoginThrottle()
+        throttle._configure()
+
+    async def attempts():
+        results = [await throttle.check(" Kid@Example.com", "1.1.1.1") for _ in range(2)]
+        # Same account however it's typed, from another address
+        results.append(await throttle.check("kid@example.com ", "2.2.2.2"))
+        # Another account from the first address: its bucket has one attempt left
+        results.append(await throttle.check("other@example.com", "1.1.1.1"))
+        results.append(await throttle.check("third@example.com", "1.1.1.1"))
+        return [allowed for allowed, _ in results]
+
+    assert asyncio.run(attempts()) == [True, True, False, True, False]
+
+def test_login_is_throttled_before_the_password_check():
+    memory_db()
+    client = TestClient(main.create_app())
+    with override_settings(LOGIN_ACCOUNT_BURST=2, LOGIN_ACCOUNT_PER_MINUTE=1):
+        throttle = LoginThrottle()
+        throttle._configure()
+    shared = routers.auth.login_throttle
+    routers.auth.login_throttle = throttle
+    try:
+        responses = [
+            client.post("/api/v1/auth/login", data={"username": "nobody@example.com", "password": "wrong"})
+            for _ in range(3)
+        ]
+    finally:
+        routers.auth.login_throttle = shared
+    assert [r.status_code for r in responses] == [401, 401, 429]
+    assert int(responses[-1].headers["retry-after"]) >= 1
+
+def test_forwarded_for_is_ignored_from_untrusted_peers():
+    with trusted():
+        assert client_ip(request("10.0.0.1", "6.6.6.6")) == "10.0.0.1"
+    with trusted("10.0.0.0/8"):
+        assert client_ip(request("203.0.113.9", "6.6.6.6")) == "203.0.113.9"
+
+def test_forwarded_for_walks_back_through_trusted_proxies():
+    with trusted("10.0.0.0/8"):
+        assert client_ip(request("10.0.0.1", "198.51.100.7")) == "198.51.100.7"
+        # A spoofed entry to the left of the real client is never reached
+        assert client_ip(request("10.0.0.1", "6.6.6.6, 198.51.100.7, 10.0.0.2")) == "198.51.100.7"
+        # Only proxies in the header: the leftmost is as far as we can see
+        assert client_ip(request("10.0.0.1", "10.0.0.3, 10.0.0.2")) == "10.0.0.3"
+
+def test_wildcard_trusts_only_the_direct_peer():
+    with trusted("*"):
+        assert client_ip(request("172.16.0.1", "6.6.6.6, 198.51.100.7")) == "198.51.100.7"
+        assert client_ip(request("172.16.0.1")) == "172.16.0.1"
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from testing import memory_db, run_tests
+
+# Sales rollups: replaying an order never counts it twice, marketplace totals count an
+# order once however many storefronts it spans, the historical backfill runs once, and
+# series come back dense.
+from bson import ObjectId
+from database import db
+import rollups
+from rollups import DAY, HOUR, MARKETPLACE, apply_orders, backfill_once, query_series
+
+AT = datetime(2026, 3, 14, 9, 26, tzinfo=timezone.utc)
+
+def order(*items, created_at=AT, status: str = "completed") -> dict:
+    return {
+        "_id": ObjectId(), "status": status, "created_at": created_at,
+        "items": [{"storefront_id": s, "product_id": p, "price": price, "quantity": qty} for s, p, price, qty in items]
+    }
+
+async def row(storefront_id: str, product_id=None, granularity: str = DAY, bucket: datetime = AT) -> dict:
+    bucket = rollups.bucket_start(bucket, granularity)
+    return await db.sales_rollups.find_one({"_id": rollups.rollup_id(granularity, storefront_id, product_id, bucket)})
+
+def test_replayed_orders_are_counted_once():
+    memory_db()
+    first = order(("s1", "p1", 2.5, 2))
+    second = order(("s1", "p1", 2.5, 1))
+
+    async def run():
+        counted = [await apply_orders([first]), await apply_orders([first, second]), await apply_orders([second, second])]
+        return counted, await row("s1"), await row("s1", "p1", HOUR)
+
+    counted, storefront, product = asyncio.run(run())
+    assert counted == [1, 1, 0]
+    assert (storefront["units"], storefront["revenue"], storefront["orders"]) == (3, 7.5, 2)
+    assert (product["units"], product["orders"], product["bucket"]) == (3, 2, AT.replace(minute=0))
+
+def test_an_order_counts_once_per_storefront_product_and_marketplace():
+    memory_db()
+    mixed = order(("s1", "p1", 1.0, 1), ("s1", "p1", 1.0, 2), ("s1", "p2", 4.0, 1), ("s2", "p3", 10.0, 1))
+
+    async def run():
+        await apply_orders([mixed])
+        return [await row(*key) for key in ((MARKETPLACE,), ("s1",), ("s1", "p1"), ("s2",))]
+
+    marketplace, s1, p1, s2 = asyncio.run(run())
+    assert (marketplace["orders"], marketplace["units"], marketplace["revenue"]) == (1, 5, 17.0)
+    assert (s1["orders"], s1["units"], s1["revenue"]) == (1, 4, 7.0)
+    assert (p1["orders"], p1["units"]) == (1, 3)
+    assert (s2["orders"], s2["revenue"]) == (1, 10.0)
+
+def test_backfill_runs_once_and_skips_incomplete_orders():
+    memory_db()
+    legacy = order(("s1", "p1", 3.0, 1), created_at=AT.isoformat())
+    archived = order(("s1", "p1", 3.0, 2))
+
+    async def run():
+        await db.orders.insert_many([legacy, order(("s1", "p1", 3.0, 5), status="pending")])
+        await db.orders_archive.insert_one(archived)
+        # An order the checkout already rolled up isn't counted again
+        await apply_orders([archived])
+        applied = [await backfill_once(), await backfill_once()]
+        return applied, await row("s1"), await db.job_state.find_one({"_id": rollups.BACKFILL_JOB_ID})
+
+    applied, storefront, state = asyncio.run(run())
+    assert applied == [1, 0]
+    assert (storefront["units"], storefront["orders"]) == (3, 2)
+    assert state["completed_at"] and "locked_until" not in state
+
+def test_backfill_in_progress_is_not_started_twice():
+    memory_db()
+
+    async def run():
+        locked = datetime.now(timezone.utc) + timedelta(minutes=5)
+        await db.job_state.insert_one({"_id": rollups.BACKFILL_JOB_ID, "locked_until": locked})
+        return await backfill_once()
+
+    assert asyncio.run(run()) == 0
+
+def test_series_are_dense():
+    memory_db()
+
+    async def run():
+        await apply_orders([order(("s1", "p1", 2.0, 1)), order(("s1", "p1", 2.0, 3), created_at=AT + timedelta(days=2))])
+        return await query_series("s1", DAY, AT - timedelta(days=1), AT + timedelta(days=2))
+
+    series = asyncio.run(run())
+    day = rollups.bucket_start(AT, DAY)
+    assert [point["bucket"] for point in series] == [day + timedelta(days=n) for n in range(-1, 3)]
+    assert [point["units"] for point in series] == [0, 1, 0, 3]
+    assert series[0] == {"bucket": day - timedelta(days=1), "units": 0, "revenue": 0.0, "orders": 0}
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,90 @@
+import asyncio
+from testing import run_tests
+
+# Single-flight reads: concurrent callers with one key share one call, errors reach
+# every waiter, forget() starts fresh calls after a write, and a cancelled caller
+# doesn't take the shared call down with it.
+from singleflight import SingleFlight
+
+class Source:
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def read(self):
+        self.calls += 1
+        call = self.calls
+        await self.release.wait()
+        return {"call": call}
+
+def test_concurrent_callers_share_one_call():
+    async def run():
+        flight, source = SingleFlight(), Source()
+        waiters = [asyncio.ensure_future(flight.do("k", source.read)) for _ in range(5)]
+        other = asyncio.ensure_future(flight.do("other", source.read))
+        await asyncio.sleep(0)
+        source.release.set()
+        results = await asyncio.gather(*waiters, other)
+        # Finished calls aren't kept around
+        later = await flight.do("k", source.read)
+        return source.calls, results, later, flight._calls
+
+    calls, results, later, in_flight = asyncio.run(run())
+    assert calls == 3
+    assert results[:5] == [{"call": 1}] * 5 and results[5] == {"call": 2}
+    assert later == {"call": 3} and in_flight == {}
+
+def test_errors_reach_every_waiter():
+    async def run():
+        flight, release = SingleFlight(), asyncio.Event()
+
+        async def fail():
+            await release.wait()
+            raise LookupError("gone")
+
+        waiters = [asyncio.ensure_future(flight.do("k", fail)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*waiters, return_exceptions=True), flight._calls
+
+    errors, in_flight = asyncio.run(run())
+    assert all(isinstance(e, LookupError) for e in errors) and in_flight == {}
+
+def test_forget_starts_a_fresh_call():
+    async def run():
+        flight, source = SingleFlight(), Source()
+        before = asyncio.ensure_future(flight.do("k", source.read))
+        other = asyncio.ensure_future(flight.do("other", source.read))
+        await asyncio.sleep(0)
+        flight.forget("k")
+        after = asyncio.ensure_future(flight.do("k", source.read))
+        await asyncio.sleep(0)
+        flight.forget()
+        everything = [asyncio.ensure_future(flight.do(key, source.read)) for key in ("k", "other")]
+        await asyncio.sleep(0)
+        source.release.set()
+        results = await asyncio.gather(before, other, after, *everything)
+        return source.calls, results, flight._calls
+
+    calls, results, in_flight = asyncio.run(run())
+    assert calls == 5
+    assert [r["call"] for r in results] == [1, 2, 3, 4, 5]
+    # Forgotten calls finishing late leave nothing behind
+    assert in_flight == {}
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    async def run():
+        flight, source = SingleFlight(), Source()
+        leaving = asyncio.ensure_future(flight.do("k", source.read))
+        staying = asyncio.ensure_future(flight.do("k", source.read))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        source.release.set()
+        return source.calls, leaving.cancelled(), await staying
+
+    calls, cancelled, result = asyncio.run(run())
+    assert (calls, cancelled, result) == (1, True, {"call": 1})
+
+if __name__ == "__main__":
+    run_tests(globals())
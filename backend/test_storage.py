@@ -0,0 +1,105 @@
+import base64
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from testing import override_settings, run_tests
+
+# Storage backends and the local presigned-upload endpoint. S3 runs against moto's
+# in-memory stand-in (requirements-dev.txt); moto doesn't enforce POST policies, so the
+# size cap is checked on the signed policy itself.
+from fastapi.testclient import TestClient
+import storage
+from storage import LocalStorage, S3Storage, new_upload_key
+
+ENDPOINT = "/api/v1/products/uploads"
+
+@contextmanager
+def local_storage():
+    root = tempfile.mkdtemp()
+    previous = storage._storage
+    storage._storage = LocalStorage(root, ENDPOINT)
+    try:
+        yield storage._storage
+    finally:
+        storage._storage = previous
+        shutil.rmtree(root)
+
+def client():
+    import main
+    return TestClient(main.create_app())
+
+def put(test_client, ticket, body: bytes):
+    return test_client.put(ticket["upload_url"], content=body, headers=ticket["headers"])
+
+def test_upload_key_extension_comes_from_content_type():
+    assert new_upload_key("image/png").endswith(".png")
+    assert new_upload_key("image/jpeg").endswith(".jpg")
+    assert "." not in new_upload_key("text/html").split("/")[-1]
+
+def test_local_signed_put_stores_the_file():
+    with local_storage() as local:
+        key = new_upload_key("image/png")
+        response = put(client(), local.presign_upload(key, "image/png", 60), b"PNGdata")
+        assert response.status_code == 204, response.text
+        with open(local.path(key), "rb") as stored:
+            assert stored.read() == b"PNGdata"
+
+def test_local_put_rejects_a_bad_signature():
+    with local_storage() as local:
+        key = new_upload_key("image/png")
+        ticket = local.presign_upload(key, "image/png", 60)
+        ticket["upload_url"] = ticket["upload_url"].replace("signature=", "signature=0")
+        assert put(client(), ticket, b"PNGdata").status_code == 403
+        # Signed for one content type, sent as another
+        ticket = local.presign_upload(key, "image/png", 60)
+        ticket["headers"] = {"Content-Type": "text/html"}
+        assert put(client(), ticket, b"<script>").status_code == 403
+        assert not os.path.exists(local.path(key))
+
+def test_local_put_rejects_an_expired_url():
+    with local_storage() as local:
+        key = new_upload_key("image/png")
+        response = put(client(), local.presign_upload(key, "image/png", -1), b"PNGdata")
+        assert response.status_code == 403
+        assert not os.path.exists(local.path(key))
+
+def test_local_put_rejects_an_oversized_body():
+    with local_storage() as local, override_settings(UPLOAD_MAX_BYTES=16):
+        key = new_upload_key("image/png")
+        response = put(client(), local.presign_upload(key, "image/png", 60), b"x" * 17)
+        assert response.status_code == 413
+        # The partial file is removed
+        assert not os.path.exists(local.path(key))
+
+def test_s3_presigned_post_enforces_type_and_size():
+    from moto import mock_aws
+    import boto3
+    import requests
+
+    with mock_aws(), override_settings(UPLOAD_MAX_BYTES=1024):
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="images")
+        s3 = S3Storage("images", None, "us-east-1", "testing", "testing", None)
+        key = new_upload_key("image/png")
+        ticket = s3.presign_upload(key, "image/png", 60)
+
+        assert ticket["method"] == "POST"
+        assert ticket["fields"]["key"] == key
+        assert ticket["fields"]["Content-Type"] == "image/png"
+        policy = json.loads(base64.b64decode(ticket["fields"]["policy"]))
+        assert ["content-length-range", 1, 1024] in policy["conditions"], policy
+        assert {"Content-Type": "image/png"} in policy["conditions"], policy
+
+        # The ticket is a complete browser form: fields first, the file last
+        response = requests.post(
+            ticket["upload_url"], data=ticket["fields"], files={"file": ("a.png", b"PNGdata", "image/png")}
+        )
+        assert response.status_code == 204, response.text
+        stored = s3.client.head_object(Bucket="images", Key=key)
+        assert stored["ContentLength"] == 7
+        assert stored["ContentType"] == "image/png"
+        assert s3.public_url(key) == f"https://images.s3.us-east-1.amazonaws.com/{key}"
+
+if __name__ == "__main__":
+    run_tests(globals())
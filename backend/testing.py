@@ -0,0 +1,55 @@
+import os
+import sys
+from contextlib import contextmanager
+
+# Shared helpers for the test_*.py files. Tests run directly (python test_x.py) or
+# under pytest; database-backed ones use an in-memory mongomock-motor database, so
+# nothing needs a server (pip install -r requirements-dev.txt).
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+
+@contextmanager
+def override_settings(**values):
+    from config import get_settings
+    current = get_settings()
+    saved = {name: getattr(current, name) for name in values}
+    for name, value in values.items():
+        setattr(current, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(current, name, value)
+
+def _accept_bulk_sort():
+    # pymongo 4.x passes `sort` for UpdateOne/ReplaceOne in bulk_write; mongomock's
+    # builder predates it. Dropping it is harmless for the single-document filters used.
+    import mongomock.collection as collection
+    builder = collection.BulkOperationBuilder
+    if getattr(builder, "_accepts_sort", False):
+        return
+    add_update, add_replace = builder.add_update, builder.add_replace
+    builder.add_update = lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs)
+    builder.add_replace = lambda self, *args, sort=None, **kwargs: add_replace(self, *args, **kwargs)
+    builder._accepts_sort = True
+
+def memory_db():
+    # A fresh, empty database behind database.db (and so every module's `db` handle).
+    # mongomock has no sessions, so transactions are reported as unavailable.
+    from mongomock_motor import AsyncMongoMockClient
+    import database
+    _accept_bulk_sort()
+    database._db = AsyncMongoMockClient(tz_aware=True)["test"]
+    database._transactions = False
+    return database._db
+
+def run_tests(namespace: dict):
+    # The __main__ runner shared by the test files
+    failed = 0
+    for name in [name for name in namespace if name.startswith("test_")]:
+        try:
+            namespace[name]()
+            print(f"PASS {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {name}\n{e}")
+    sys.exit(1 if failed else 0)